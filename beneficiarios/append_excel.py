@@ -1,101 +1,149 @@
+import numpy as np
 import pandas as pd
 import os
+import time
 
-def limpar_numero(valor):
-    """
-    Converte strings numéricas no formato brasileiro (1.234,56) 
-    para float no formato Python (1234.56)
-    """
-    if isinstance(valor, str):
-        # Remove pontos (separadores de milhares) e substitui vírgula por ponto
-        return float(valor.replace('.', '').replace(',', '.'))
-    return float(valor)
+from comum.armazenamento import RECUSAR, abrir_base, gravar_fluxo, gravar_lotes
+from comum.competencia import tipar_datas
+from comum.duplicidade import formatar_chaves
+from comum.extracao import converter_coluna
+from comum.valores import tipar_valores, valores_para_planilha
 
-def limpar_porcentagem(valor):
-    """
-    Converte porcentagens string (ex: "12,34%") para decimal (0.1234)
-    """
-    if isinstance(valor, str):
-        # Remove % e converte vírgula para ponto, depois divide por 100
-        return float(valor.replace('%', '').replace(',', '.')) / 100
-    return float(valor)
+# Categoriza as colunas por tipo de dados para aplicar formatação correta
+COLUNAS_INT = ['certificado', 'codigodepend', 'qteventos', 'contrato']      # Números inteiros
+COLUNAS_FLOAT = ['valorliq', 'inss', 'valortotal', 'valorcopart', 'valorrecebido']  # Números decimais
+COLUNAS_PORC = ['porcqteventos', 'porcvalortotal', 'porcvalorcopart']       # Porcentagens
 
-def limpar_inteiro(valor):
+def preparar_dados(dados) -> pd.DataFrame:
     """
-    Converte valores para inteiro, tratando formato brasileiro
+    Converte os registros lidos para os tipos da base (DataFrame), com os
+    avisos da conversão e o tempo gasto em attrs ('avisos', 'preparo').
     """
-    if isinstance(valor, str):
-        return int(float(valor.replace(',', '.')))
-    return int(valor)
+    inicio = time.perf_counter()
+    avisos = []
+    df_novos = pd.DataFrame(dados)
+
+    # Colunas que já chegam tipadas do leitor são usadas como estão; textos no
+    # formato brasileiro passam pelo conversor vetorizado de comum.extracao
+    for col in COLUNAS_INT:
+        df_novos[col] = np.trunc(converter_coluna(df_novos[col], padrao_br=True, avisos=avisos)).astype('Int64')
+
+    for col in COLUNAS_FLOAT:
+        if not pd.api.types.is_numeric_dtype(df_novos[col]):
+            df_novos[col] = converter_coluna(df_novos[col], padrao_br=True, avisos=avisos)
 
-def append_to_excel_formatado(caminho_arquivo: str, dados: list):
+    for col in COLUNAS_PORC:
+        if not pd.api.types.is_numeric_dtype(df_novos[col]):
+            df_novos[col] = converter_coluna(df_novos[col], padrao_br=True, escala=100, avisos=avisos)
+
+    # Dinheiro em centavos e percentuais em pontos-base (comum.valores)
+    tipar_valores(df_novos, COLUNAS_FLOAT, COLUNAS_PORC)
+
+    # Competências e períodos como datas (textos de listas de registros também)
+    df_novos = tipar_datas(df_novos)
+
+    # Avisos da conversão e tempo do preparo seguem com os registros até o
+    # resultado da gravação (comum.armazenamento)
+    df_novos.attrs.update(avisos=avisos, preparo=round(time.perf_counter() - inicio, 3))
+    return df_novos
+
+def append_to_excel_formatado(caminho_arquivo: str, dados: list, materializar: bool = True, politica: str = RECUSAR,
+                              origem: str = '', log=print) -> dict:
     """
     Função principal que adiciona dados formatados à planilha Excel.
     
     Funcionalidades principais:
-    1. Converte dados para os tipos corretos (int, float, porcentagem)
-    2. Verifica duplicatas baseado em contrato + competência
-    3. Aplica formatação profissional no Excel
+    1. Converte dados para os tipos corretos (int, float, porcentagem);
+       colunas que já chegam tipadas do leitor (DataFrame) não são reconvertidas
+    2. Verifica duplicatas baseado em contrato + competência; as chaves já
+       gravadas seguem a `politica` (RECUSAR, IGNORAR_EXISTENTES ou SUBSTITUIR)
+    3. Grava o lote como partição da base, com o número da ingestão de
+       `origem` (o relatório lido), e aplica formatação profissional
+       na planilha Excel (com materializar=False, a planilha só é regerada
+       depois, por materializar_excel)
     4. Evita adicionar dados já existentes
+
+    Retorna o resultado da gravação (resultado_arquivo, de
+    comum.armazenamento): status, linhas lidas e gravadas, chaves
+    repetidas, avisos da conversão e tempo de cada etapa. As mensagens
+    vão para `log` (print, por padrão).
     """
     
-    # Categoriza as colunas por tipo de dados para aplicar formatação correta
-    colunas_int = ['certificado', 'codigodepend', 'qteventos', 'contrato']      # Números inteiros
-    colunas_float = ['valorliq', 'inss', 'valortotal', 'valorcopart', 'valorrecebido']  # Números decimais
-    colunas_porc = ['porcqteventos', 'porcvalortotal', 'porcvalorcopart']       # Porcentagens
-
-    df_novos = pd.DataFrame(dados)
+    df_novos = preparar_dados(dados)
+
+    # Base particionada: cada chave do lote vira uma partição em
+    # databases/<nome>.partes/ e a planilha é gerada a partir delas
+    base = abrir_base(caminho_arquivo)
+    planilha_nova = not os.path.exists(caminho_arquivo)
+
+    # Verificação de duplicatas pelas chaves (contrato + competência) já
+    # gravadas, sem precisar abrir a planilha
+    # As chaves repetidas seguem a política: RECUSAR (padrão) não grava nada,
+    # IGNORAR_EXISTENTES grava só as novas e SUBSTITUIR troca as gravadas
+    gravado = gravar_lotes(
+        base, [(origem, df_novos)], _formatar_base, exibir=_exibir_base,
+        politica=politica, materializar=materializar,
+    )[0]
+    for aviso in gravado['avisos']:
+        log(f"⚠️ {aviso}")
 
-    # Aplica as funções de limpeza/conversão para cada tipo de coluna
-    for col in colunas_int:
-        df_novos[col] = df_novos[col].apply(limpar_inteiro)
+    # Se encontrou duplicatas, não adiciona nada e informa o usuário
+    if gravado['status'] == 'duplicado':
+        log(f"⚠️ Dados já existentes para os contratos/competências: {formatar_chaves(gravado['chaves'])}. Nenhum dado foi adicionado.")
+        return gravado
+    if gravado['ignoradas']:
+        log(f"⚠️ Dados já existentes mantidos para os contratos/competências: {formatar_chaves(gravado['ignoradas'])}; as demais chaves foram adicionadas.")
+    if gravado['substituidas']:
+        log(f"♻️ Dados substituídos para os contratos/competências: {formatar_chaves(gravado['substituidas'])}.")
+
+    if planilha_nova and materializar:
+        log("✅ Planilha criada com os dados formatados.")
+    else:
+        log("✅ Dados adicionados com sucesso, sem duplicações.")
+    return gravado
+
+def gravar_lote(caminho_arquivo: str, lotes: list, politica: str = RECUSAR) -> list:
+    """
+    Grava de uma vez os registros de vários arquivos, dados como pares
+    (arquivo de origem, registros lidos). Chaves já existentes na base ou
+    repetidas no lote seguem a `politica` (por padrão, recusam o arquivo
+    inteiro); os demais viram partições numa única gravação e a planilha é
+    regerada uma só vez. Retorna o resultado de cada arquivo, na ordem
+    recebida.
+    """
+    preparados = [
+        (origem, preparar_dados(dados) if dados is not None and len(dados) > 0 else None)
+        for origem, dados in lotes
+    ]
+    return gravar_lotes(abrir_base(caminho_arquivo), preparados, _formatar_base, exibir=_exibir_base, politica=politica)
 
-    for col in colunas_float:
-        df_novos[col] = df_novos[col].apply(limpar_numero)
+def gravar_em_lotes(caminho_arquivo: str, lotes, origem='', materializar=True, politica: str = RECUSAR) -> dict:
+    """
+    Grava um arquivo lido em lotes (ler_em_lotes do leitor): cada lote é
+    convertido e gravado assim que chega, sem esperar o fim da leitura.
+    Chaves já existentes na base seguem a `politica` (por padrão, recusam o
+    arquivo inteiro). Retorna o resultado no mesmo formato de gravar_lote.
+    """
+    preparados = (preparar_dados(dados) for dados in lotes)
+    return gravar_fluxo(
+        abrir_base(caminho_arquivo), origem, preparados, _formatar_base, materializar, exibir=_exibir_base,
+        politica=politica,
+    )
 
-    for col in colunas_porc:
-        df_novos[col] = df_novos[col].apply(limpar_porcentagem)
-
-    # Se o arquivo não existir, cria um novo com formatação
-    if not os.path.exists(caminho_arquivo):
-        with pd.ExcelWriter(caminho_arquivo, engine="xlsxwriter") as writer:
-            df_novos.to_excel(writer, sheet_name="Dados", index=False)
-            aplicar_formatacao(writer, df_novos, colunas_float, colunas_porc)
-        print("✅ Planilha criada com os dados formatados.")
-        return
-
-    # Se já existe, lê os dados existentes
-    df_existente = pd.read_excel(caminho_arquivo)
-
-    # Sistema de verificação de duplicatas sofisticado
-    # Verifica se já existem dados para a mesma combinação de contrato + competência
-    duplicados = []
-    
-    for _, linha in df_novos.iterrows():
-        contrato = str(linha['contrato'])
-        competencia = str(linha['dtcompetde'])
-    
-        # Busca no DataFrame existente por registros com mesmo contrato e competência
-        existe = df_existente[
-            (df_existente['contrato'].astype(str) == contrato) &
-            (df_existente['dtcompetde'].astype(str) == competencia)
-        ]
-    
-        if not existe.empty:
-            duplicados.append((contrato, competencia))
-    
-    # Se encontrou duplicatas, não adiciona nada e informa o usuário
-    if duplicados:
-        print(f"⚠️ Dados já existentes para os contratos/competências: {duplicados[0]}. Nenhum dado foi adicionado.")
-        return    # Combina dados existentes com novos dados
-    df_final = pd.concat([df_existente, df_novos], ignore_index=True)
+def materializar_excel(caminho_arquivo: str):
+    """
+    Regera a planilha formatada a partir das partições gravadas, se houver
+    lotes ainda não refletidos nela.
+    """
+    base = abrir_base(caminho_arquivo)
+    if base.pendente():
+        base.materializar(_formatar_base, exibir=_exibir_base)
 
-    # Salva a planilha completa com formatação profissional
-    with pd.ExcelWriter(caminho_arquivo, engine="xlsxwriter") as writer:
-        df_final.to_excel(writer, sheet_name="Dados", index=False)
-        aplicar_formatacao(writer, df_final, colunas_float, colunas_porc)
+def _formatar_base(writer, df: pd.DataFrame):
+    aplicar_formatacao(writer, df, COLUNAS_FLOAT, COLUNAS_PORC)
 
-    print("✅ Dados adicionados com sucesso, sem duplicações.")
+def _exibir_base(df: pd.DataFrame) -> pd.DataFrame:
+    return valores_para_planilha(df, COLUNAS_FLOAT, COLUNAS_PORC)
 
 def aplicar_formatacao(writer, df: pd.DataFrame, colunas_float: list, colunas_porc: list):
     """
@@ -104,6 +152,8 @@ def aplicar_formatacao(writer, df: pd.DataFrame, colunas_float: list, colunas_po
     - Números decimais: formato #,##0.00 (ex: 1.234,56)
     - Porcentagens: formato 0.00% (ex: 12.34%)
     - Define largura adequada para as colunas
+    - Valores em centavos/pontos-base chegam aqui já em reais/fração
+      (_exibir_base, comum.valores)
     """
     workbook = writer.book
     worksheet = writer.sheets['Dados']
@@ -51,6 +51,7 @@ def exibir_informacoes():
     print("📁 ESTRUTURA DE ARQUIVOS:")
     print("   • main.py - Interface gráfica")
     print("   • terminal_code.py - Interface terminal")
+    print("   • ingerir.py - Ingestão em lote sem interação (agendamentos; --vigiar para pastas de entrada)")
     print("   • databases/ - Planilhas de saída")
     print("   • beneficiarios/ - Módulos de beneficiários")
     print("   • prestadores/ - Módulos de prestadores")
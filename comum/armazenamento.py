@@ -0,0 +1,662 @@
+import json
+import os
+import re
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from comum.competencia import tipar_datas
+from comum.duplicidade import (
+    CHAVE_PADRAO, chaves_distintas, competencias_do_contrato, linhas_das_chaves, valor_chave, valores_chave,
+)
+from comum.ingestao import assinatura_arquivo
+from comum.memoria import compactar, concatenar
+from comum.valores import COLUNAS_MOEDA, COLUNAS_PORCENTAGEM, tipar_valores
+
+# Armazenamento das bases em partições somente de acréscimo.
+#
+# Cada base (ex.: databases/despesas.xlsx) tem uma pasta ao lado
+# (databases/despesas.partes/) com um arquivo por chave gravada
+# (contrato + competência) e um manifesto.json que lista as partições na
+# ordem em que foram gravadas. Gravar um lote custa apenas o tamanho do lote;
+# a planilha .xlsx formatada é uma visão gerada a partir das partições,
+# quando pedida (fim do lote/pasta, ou gravação de um arquivo avulso).
+#
+# As partições são DataFrames serializados com pickle, que preserva os tipos
+# das colunas (Int64, float64, datetime64) e não exige dependências além do
+# pandas; cada partição é gravada compacta (comum.memoria) e a leitura junta
+# as categorias de todas. As chaves do manifesto são as de `valores_chave` (competência como
+# inteiro AAAAMMDD); manifestos antigos, com as chaves em texto, são
+# convertidos na abertura.
+#
+# Cada materialização grava também um consolidado (consolidado_NNNNNN.pkl na
+# mesma pasta): a base inteira, já tipada e compacta, num único pickle. A
+# leitura parte dele e junta só as partições gravadas depois, em vez de abrir
+# uma partição por chave (400 partições, 80 mil linhas: de 1,5 s para alguns
+# milissegundos). O manifesto registra quantas partições o
+# consolidado cobre e o nome da última delas; se a lista de partições não
+# bate (reimportação da planilha editada à mão, gravação descartada), o
+# consolidado é ignorado e a base volta a ser lida das partições.
+#
+# Linhagem: cada arquivo de origem gravado recebe um número de ingestão,
+# registrado no manifesto (arquivo, SHA-256, tamanho, data) e gravado em
+# todas as suas linhas (coluna COLUNA_INGESTAO) e nas suas partições. Como
+# uma partição tem uma única chave e uma única ingestão, o manifesto serve de
+# índice das linhas de cada ingestão: desfazer uma é retirar as partições
+# dela, sem reescrever as demais.
+VERSAO_ARMAZENAMENTO = 1
+EXTENSAO_PASTA = '.partes'
+NOME_MANIFESTO = 'manifesto.json'
+PREFIXO_CONSOLIDADO = 'consolidado'
+COLUNA_INGESTAO = 'ingestao'
+
+# Formato das datas (competências) na planilha gerada
+FORMATO_DATA = 'dd/mm/yyyy'
+
+# O que fazer com as chaves de um arquivo que já estão na base
+RECUSAR = 'recusar'              # o arquivo inteiro é recusado (padrão)
+IGNORAR_EXISTENTES = 'ignorar'   # só as linhas das chaves novas são gravadas
+SUBSTITUIR = 'substituir'        # as linhas do arquivo substituem as gravadas com a mesma chave
+POLITICAS = (RECUSAR, IGNORAR_EXISTENTES, SUBSTITUIR)
+
+
+def pasta_particoes(caminho_base):
+    """Pasta das partições da base (mesmo nome, extensão .partes)."""
+    return os.path.splitext(caminho_base)[0] + EXTENSAO_PASTA
+
+
+def _nome_particao(sequencia, chave):
+    partes = [re.sub(r'[^0-9A-Za-z]+', '-', str(v)).strip('-') or 'vazio' for v in chave]
+    return f"{sequencia:06d}_{'_'.join(partes)}.pkl"
+
+
+def _gravar_atomico(caminho, gravar):
+    temporario = caminho + '.tmp'
+    gravar(temporario)
+    os.replace(temporario, caminho)
+
+
+class BaseParticionada:
+    """
+    Base de dados gravada em partições (uma por chave) com a planilha .xlsx
+    como visão materializada.
+
+    Use `abrir_base` para obter a instância; na primeira abertura de uma base
+    que só existe como .xlsx, as linhas da planilha são importadas como
+    partições.
+    """
+
+    def __init__(self, caminho_base, colunas=CHAVE_PADRAO):
+        self.caminho_base = caminho_base
+        self.colunas = tuple(colunas)
+        self.pasta = pasta_particoes(caminho_base)
+        # Arquivos que saíram da base, apagados depois de salvo o manifesto
+        self._a_apagar = []
+        self.manifesto = {
+            'versao': VERSAO_ARMAZENAMENTO,
+            'colunas': list(self.colunas),
+            'sequencia': 0,
+            'particoes': [],
+            'materializado': None,
+            'consolidado': None,
+            'ingestoes': [],
+            'ultima_ingestao': 0,
+        }
+
+    @property
+    def particoes(self):
+        return self.manifesto['particoes']
+
+    def _chaves(self):
+        return {tuple(p['chave']) for p in self.particoes}
+
+    def __len__(self):
+        return sum(p['linhas'] for p in self.particoes)
+
+    def contem(self, *chave):
+        """Indica se a chave (ex.: contrato, competência) já está na base."""
+        return tuple(valor_chave(v) for v in chave) in self._chaves()
+
+    def competencias(self, contrato, de=None, ate=None):
+        """Competências (AAAAMMDD) já gravadas para o contrato, opcionalmente de `de` até `ate`."""
+        return competencias_do_contrato(self._chaves(), contrato, de, ate)
+
+    def conflitos(self, df_novos: pd.DataFrame) -> list:
+        """Chaves do lote `df_novos` que já existem na base, em ordem de aparição."""
+        existentes = self._chaves()
+        if not existentes or df_novos.empty:
+            return []
+        return [chave for chave in chaves_distintas(df_novos, self.colunas) if tuple(chave) in existentes]
+
+    def pendente(self):
+        """Indica se a planilha .xlsx está desatualizada em relação às partições."""
+        materializado = self.manifesto.get('materializado')
+        if not os.path.exists(self.caminho_base):
+            return bool(self.particoes)
+        return materializado is None or materializado.get('sequencia') != self.manifesto['sequencia']
+
+    def _salvar_manifesto(self):
+        os.makedirs(self.pasta, exist_ok=True)
+
+        def gravar(destino):
+            with open(destino, 'w', encoding='utf-8') as f:
+                json.dump(self.manifesto, f, ensure_ascii=False)
+
+        _gravar_atomico(os.path.join(self.pasta, NOME_MANIFESTO), gravar)
+        for nome in self._a_apagar:
+            try:
+                os.remove(os.path.join(self.pasta, nome))
+            except OSError:
+                pass
+        self._a_apagar = []
+
+    def _carregar_manifesto(self):
+        try:
+            with open(os.path.join(self.pasta, NOME_MANIFESTO), encoding='utf-8') as f:
+                manifesto = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if manifesto.get('versao') != VERSAO_ARMAZENAMENTO or tuple(manifesto.get('colunas', ())) != self.colunas:
+            return False
+        particoes = manifesto['particoes']
+        if particoes:
+            # Chaves em texto (manifestos antigos) passam a int/AAAAMMDD, uma coluna de cada vez
+            chaves = pd.DataFrame([p['chave'] for p in particoes], dtype=object)
+            chaves = pd.DataFrame({c: valores_chave(chaves[c]) for c in chaves.columns})
+            for particao, chave in zip(particoes, chaves.itertuples(index=False, name=None)):
+                particao['chave'] = list(chave)
+        # Manifestos anteriores à linhagem
+        manifesto.setdefault('ingestoes', [])
+        manifesto.setdefault('ultima_ingestao', 0)
+        self.manifesto = manifesto
+        return True
+
+    def _planilha_alterada_fora(self):
+        """A planilha foi modificada depois da última materialização?"""
+        materializado = self.manifesto.get('materializado')
+        if materializado is None or not os.path.exists(self.caminho_base):
+            return False
+        atual = assinatura_arquivo(self.caminho_base, com_hash=False)
+        return (atual['mtime_ns'], atual['tamanho']) != (materializado.get('mtime_ns'), materializado.get('tamanho'))
+
+    def nova_ingestao(self, origem) -> int:
+        """Registra no manifesto a ingestão do arquivo `origem` e devolve o número dela."""
+        self.manifesto['ultima_ingestao'] += 1
+        entrada = {
+            'ingestao': self.manifesto['ultima_ingestao'],
+            'arquivo': os.path.abspath(origem) if origem else '',
+            'sha256': None,
+            'tamanho': None,
+            'registrado_em': datetime.now().isoformat(timespec='seconds'),
+        }
+        if origem and os.path.isfile(origem):
+            assinatura = assinatura_arquivo(origem)
+            entrada.update(sha256=assinatura['sha256'], tamanho=assinatura['tamanho'])
+        self.manifesto['ingestoes'].append(entrada)
+        return entrada['ingestao']
+
+    def ingestoes(self) -> list:
+        """Ingestões registradas na base, cada uma com as 'linhas' que ainda estão nela."""
+        linhas = {}
+        for particao in self.particoes:
+            if particao.get('ingestao') is not None:
+                linhas[particao['ingestao']] = linhas.get(particao['ingestao'], 0) + particao['linhas']
+        return [dict(entrada, linhas=linhas.get(entrada['ingestao'], 0)) for entrada in self.manifesto['ingestoes']]
+
+    def gravar(self, df_novos: pd.DataFrame, salvar_manifesto=True, ingestao=None) -> list:
+        """
+        Acrescenta o lote como novas partições (uma por chave) e retorna os
+        nomes dos arquivos criados. Não verifica duplicidade: chame
+        `conflitos` antes. Com `ingestao` (ver `nova_ingestao`), as linhas
+        recebem o número na coluna COLUNA_INGESTAO; sem ele, vale o número
+        que a coluna já trouxer (lotes de vários arquivos, planilha importada).
+        """
+        if df_novos.empty:
+            return []
+        os.makedirs(self.pasta, exist_ok=True)
+
+        df_novos = df_novos.reset_index(drop=True)
+        # Avisos e tempos do preparo (attrs) ficam no resultado, não nas partições
+        df_novos.attrs = {}
+        if ingestao is not None:
+            df_novos[COLUNA_INGESTAO] = ingestao
+        # Colunas da base, para a planilha de uma base que ficou vazia
+        self.manifesto['campos'] = list(df_novos.columns)
+        textos = pd.DataFrame({
+            c: (valores_chave(df_novos[c]) if c in df_novos.columns else pd.Series('', index=df_novos.index))
+            for c in self.colunas
+        })
+        # Uma partição por chave e ingestão (0: linhas sem ingestão registrada)
+        textos[COLUNA_INGESTAO] = (
+            pd.to_numeric(df_novos[COLUNA_INGESTAO], errors='coerce').fillna(0).astype('int64')
+            if COLUNA_INGESTAO in df_novos.columns else 0
+        )
+        criadas = []
+        agora = datetime.now().isoformat(timespec='seconds')
+        grupos = textos.groupby(list(textos.columns), sort=False).indices
+        for grupo in textos.drop_duplicates().itertuples(index=False, name=None):
+            linhas = grupos[grupo]
+            chave, numero = grupo[:-1], grupo[-1]
+            self.manifesto['sequencia'] += 1
+            nome = _nome_particao(self.manifesto['sequencia'], chave)
+            parte = compactar(df_novos.iloc[linhas].reset_index(drop=True))
+            _gravar_atomico(os.path.join(self.pasta, nome), lambda destino: parte.to_pickle(destino, compression=None))
+            self.particoes.append({
+                'arquivo': nome,
+                'chave': list(chave),
+                'linhas': len(parte),
+                'gravado_em': agora,
+                'ingestao': int(numero) or None,
+            })
+            criadas.append(nome)
+
+        if salvar_manifesto:
+            self._salvar_manifesto()
+        return criadas
+
+    def remover_chaves(self, chaves, salvar_manifesto=True) -> int:
+        """
+        Retira da base as partições das chaves dadas e retorna quantas linhas
+        saíram. Os arquivos só são apagados depois de salvo o manifesto.
+        """
+        chaves = {tuple(chave) for chave in chaves}
+        return self._retirar(
+            [posicao for posicao, p in enumerate(self.particoes) if tuple(p['chave']) in chaves], salvar_manifesto,
+        )
+
+    def desfazer_ingestao(self, numero, salvar_manifesto=True) -> int:
+        """
+        Retira da base as linhas gravadas pela ingestão `numero` (ver
+        `ingestoes`) e retorna quantas saíram; a planilha fica pendente.
+        """
+        entrada = next((e for e in self.manifesto['ingestoes'] if e['ingestao'] == numero), None)
+        if entrada is None:
+            raise ValueError(f"Ingestão {numero} não encontrada na base {os.path.basename(self.caminho_base)}")
+        entrada['desfeita_em'] = datetime.now().isoformat(timespec='seconds')
+        linhas = self._retirar(
+            [posicao for posicao, p in enumerate(self.particoes) if p.get('ingestao') == numero], False,
+        )
+        if salvar_manifesto:
+            self._salvar_manifesto()
+        return linhas
+
+    def _retirar(self, removidas, salvar_manifesto):
+        """Retira as partições nas posições `removidas` (em ordem crescente) e retorna as linhas que saíram."""
+        if not removidas:
+            return 0
+        consolidado = self.manifesto.get('consolidado')
+        if consolidado and removidas[0] < consolidado['particoes']:
+            self._descartar_consolidado()
+        linhas = 0
+        for posicao in reversed(removidas):
+            particao = self.particoes.pop(posicao)
+            self._a_apagar.append(particao['arquivo'])
+            linhas += particao['linhas']
+        # A planilha fica pendente mesmo sem novas partições
+        self.manifesto['sequencia'] += 1
+        if salvar_manifesto:
+            self._salvar_manifesto()
+        return linhas
+
+    def estado(self):
+        """Partições, consolidado e ingestões atuais, para `restaurar` se a gravação seguinte falhar."""
+        return {
+            'particoes': list(self.particoes),
+            'consolidado': self.manifesto.get('consolidado'),
+            'sequencia': self.manifesto['sequencia'],
+            'ingestoes': list(self.manifesto['ingestoes']),
+            'ultima_ingestao': self.manifesto['ultima_ingestao'],
+        }
+
+    def restaurar(self, estado):
+        """
+        Volta a base ao `estado` (gravação interrompida ou recusada): apaga as
+        partições criadas depois dele e desfaz as remoções ainda não salvas.
+        """
+        particoes, consolidado = estado['particoes'], estado['consolidado']
+        anteriores = {p['arquivo'] for p in particoes}
+        for particao in self.particoes:
+            if particao['arquivo'] not in anteriores:
+                try:
+                    os.remove(os.path.join(self.pasta, particao['arquivo']))
+                except OSError:
+                    pass
+        self.manifesto.update(estado, particoes=list(particoes), ingestoes=list(estado['ingestoes']))
+        if consolidado:
+            anteriores.add(consolidado['arquivo'])
+        self._a_apagar = [nome for nome in self._a_apagar if nome not in anteriores]
+
+    def importar_planilha(self):
+        """Recria as partições a partir da planilha .xlsx existente."""
+        for particao in self.particoes:
+            try:
+                os.remove(os.path.join(self.pasta, particao['arquivo']))
+            except OSError:
+                pass
+        self.manifesto['particoes'] = []
+        self._descartar_consolidado()
+        # A planilha traz dinheiro em reais e percentuais como fração
+        df = tipar_valores(tipar_datas(pd.read_excel(self.caminho_base)), COLUNAS_MOEDA, COLUNAS_PORCENTAGEM)
+        self.gravar(df, salvar_manifesto=False)
+        self._registrar_materializacao()
+        self._salvar_manifesto()
+        return len(df)
+
+    def _consolidado_valido(self):
+        """Entrada do consolidado no manifesto, se ele cobrir o início da lista de partições atual."""
+        consolidado = self.manifesto.get('consolidado')
+        if not consolidado:
+            return None
+        cobertas = consolidado['particoes']
+        if cobertas > len(self.particoes) or (cobertas and self.particoes[cobertas - 1]['arquivo'] != consolidado['ultima']):
+            return None
+        if not os.path.exists(os.path.join(self.pasta, consolidado['arquivo'])):
+            return None
+        return consolidado
+
+    def _descartar_consolidado(self):
+        consolidado = self.manifesto.get('consolidado')
+        self.manifesto['consolidado'] = None
+        if consolidado:
+            self._a_apagar.append(consolidado['arquivo'])
+
+    def _gravar_consolidado(self, df: pd.DataFrame):
+        """Grava `df` (a base inteira) como o novo consolidado; o anterior sai ao salvar o manifesto."""
+        anterior = self.manifesto.get('consolidado')
+        nome = f"{PREFIXO_CONSOLIDADO}_{self.manifesto['sequencia']:06d}.pkl"
+        self._a_apagar = [arquivo for arquivo in self._a_apagar if arquivo != nome]
+        if anterior and anterior['arquivo'] != nome:
+            self._a_apagar.append(anterior['arquivo'])
+        os.makedirs(self.pasta, exist_ok=True)
+        _gravar_atomico(os.path.join(self.pasta, nome), lambda destino: df.to_pickle(destino, compression=None))
+        self.manifesto['consolidado'] = {
+            'arquivo': nome,
+            'particoes': len(self.particoes),
+            'ultima': self.particoes[-1]['arquivo'] if self.particoes else None,
+            'linhas': len(df),
+        }
+
+    def ler(self) -> pd.DataFrame:
+        """Todas as linhas da base, na ordem de gravação (dinheiro em centavos, datas em datetime64)."""
+        partes = []
+        inicio = 0
+        consolidado = self._consolidado_valido()
+        if consolidado is not None:
+            partes.append(pd.read_pickle(os.path.join(self.pasta, consolidado['arquivo']), compression=None))
+            inicio = consolidado['particoes']
+        for particao in self.particoes[inicio:]:
+            parte = pd.read_pickle(os.path.join(self.pasta, particao['arquivo']), compression=None)
+            # Partições antigas trazem valores em reais/fração
+            partes.append(tipar_valores(parte, COLUNAS_MOEDA, COLUNAS_PORCENTAGEM))
+        if not partes:
+            return pd.DataFrame(columns=self.manifesto.get('campos', []))
+        if len(partes) == 1 and consolidado is not None:
+            return partes[0]
+        # Partições antigas trazem as competências em texto (e não têm a
+        # coluna de ingestão, que não pode virar float na junção)
+        df = tipar_datas(concatenar(partes))
+        if COLUNA_INGESTAO in df.columns:
+            df[COLUNA_INGESTAO] = df[COLUNA_INGESTAO].astype('Int32')
+        return df
+
+    def _registrar_materializacao(self):
+        assinatura = assinatura_arquivo(self.caminho_base, com_hash=False)
+        self.manifesto['materializado'] = {
+            'sequencia': self.manifesto['sequencia'],
+            'mtime_ns': assinatura['mtime_ns'],
+            'tamanho': assinatura['tamanho'],
+        }
+
+    def materializar(self, formatar=None, formato_data=FORMATO_DATA, exibir=None):
+        """
+        Regera a planilha .xlsx a partir das partições.
+
+        `exibir(df)` leva a base aos valores mostrados na planilha (ex.:
+        centavos em reais), `formatar(writer, df)` aplica a formatação da base
+        (a mesma usada pelo append_excel do tipo) e `formato_data` é o formato
+        das colunas de data. O consolidado é atualizado junto.
+        """
+        df = self.ler()
+        planilha = exibir(df) if exibir is not None else df
+        pasta = os.path.dirname(self.caminho_base)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with pd.ExcelWriter(
+            self.caminho_base, engine='xlsxwriter', datetime_format=formato_data, date_format=formato_data,
+        ) as writer:
+            planilha.to_excel(writer, sheet_name='Dados', index=False)
+            if formatar is not None:
+                formatar(writer, planilha)
+
+        if df.empty:
+            self._descartar_consolidado()
+        else:
+            self._gravar_consolidado(compactar(df))
+        self._registrar_materializacao()
+        self._salvar_manifesto()
+        return len(df)
+
+
+def resultado_arquivo(origem, status, linhas=0, chaves=None, linhas_lidas=0) -> dict:
+    """
+    Resultado da gravação de um arquivo: 'arquivo', 'status', 'linhas'
+    gravadas, 'linhas_lidas', 'chaves', 'ignoradas', 'substituidas',
+    'ingestao', 'avisos' (da conversão dos registros) e 'segundos' (tempo de
+    cada etapa).
+    """
+    return {
+        'arquivo': origem, 'status': status, 'linhas': linhas, 'linhas_lidas': linhas_lidas, 'chaves': chaves or [],
+        'ignoradas': [], 'substituidas': [], 'ingestao': None, 'avisos': [], 'segundos': {},
+    }
+
+
+def _anotar_preparo(resultado, df):
+    """
+    Copia para o resultado os avisos e o tempo da conversão dos registros,
+    deixados em `df.attrs` pelo `preparar_dados` dos appends.
+    """
+    resultado['avisos'].extend(df.attrs.get('avisos', ()))
+    if 'preparo' in df.attrs:
+        resultado['segundos']['preparo'] = round(resultado['segundos'].get('preparo', 0) + df.attrs['preparo'], 3)
+
+
+def _conferir_politica(politica):
+    if politica not in POLITICAS:
+        raise ValueError(f"Política de duplicidade desconhecida: {politica!r} (use uma de {', '.join(POLITICAS)})")
+
+
+def gravar_lotes(
+    base: BaseParticionada, lotes: list, formatar=None, formato_data=FORMATO_DATA, exibir=None,
+    politica=RECUSAR, materializar=True,
+) -> list:
+    """
+    Grava na base, numa única escrita, os lotes de vários arquivos.
+
+    `lotes` é a lista de pares (arquivo de origem, DataFrame já tipado), na
+    ordem em que devem entrar na base. A duplicidade é checada contra a base
+    e contra os lotes anteriores da mesma lista, chave a chave, e resolvida
+    pela `politica`:
+
+    - RECUSAR: um arquivo com qualquer chave repetida é recusado por inteiro;
+    - IGNORAR_EXISTENTES: as linhas das chaves repetidas ficam de fora e as
+      das chaves novas são gravadas;
+    - SUBSTITUIR: as linhas das chaves repetidas (na base ou num arquivo
+      anterior da lista) são trocadas pelas do arquivo, ex.: um relatório
+      reemitido pela operadora.
+
+    Cada arquivo aceito recebe um número de ingestão (`nova_ingestao`). Os
+    aceitos são gravados juntos e a planilha é materializada uma única vez
+    (com `materializar` False, fica pendente para `BaseParticionada.materializar`).
+
+    Retorna um dicionário por arquivo com 'arquivo', 'status' ('gravado',
+    'duplicado' ou 'vazio'), 'linhas' gravadas, 'linhas_lidas' (as do
+    lote recebido), 'chaves' (as gravadas ou, se duplicado, as que já
+    existiam), 'ignoradas', 'substituidas', 'ingestao' (o número, se
+    gravado), 'avisos' e 'segundos'. Os avisos e o 'preparo' (tempo da
+    conversão) vêm de `df.attrs`, onde o `preparar_dados` dos appends os
+    deixa; 'gravacao' e 'planilha' são os tempos da escrita conjunta, os
+    mesmos em todos os arquivos da lista.
+    """
+    _conferir_politica(politica)
+    inicio = time.perf_counter()
+    resultados = []
+    aceitos = []
+    existentes = base._chaves()
+    # Chave -> posição, em `aceitos`, do arquivo da lista que a trouxe
+    vistas = {}
+    substituir = set()
+    for origem, df in lotes:
+        if df is None or df.empty:
+            resultados.append(resultado_arquivo(origem, 'vazio'))
+            continue
+        chaves = [tuple(chave) for chave in chaves_distintas(df, base.colunas)]
+        repetidas = [chave for chave in chaves if chave in existentes or chave in vistas]
+        resultado = resultado_arquivo(origem, 'gravado', linhas_lidas=len(df))
+        _anotar_preparo(resultado, df)
+        if repetidas and (politica == RECUSAR or (politica == IGNORAR_EXISTENTES and len(repetidas) == len(chaves))):
+            resultado.update(status='duplicado', chaves=repetidas)
+            resultados.append(resultado)
+            continue
+        if repetidas and politica == IGNORAR_EXISTENTES:
+            df = df[~linhas_das_chaves(df, repetidas, base.colunas)]
+            chaves = [chave for chave in chaves if chave not in set(repetidas)]
+            resultado['ignoradas'] = repetidas
+        elif repetidas:
+            for chave in repetidas:
+                if chave in vistas:
+                    anterior = aceitos[vistas[chave]]
+                    anterior[1] = anterior[1][~linhas_das_chaves(anterior[1], [chave], base.colunas)]
+                    anterior[0]['linhas'] = len(anterior[1])
+                    anterior[0]['chaves'].remove(chave)
+                if chave in existentes:
+                    substituir.add(chave)
+            resultado['substituidas'] = repetidas
+        for chave in chaves:
+            vistas[chave] = len(aceitos)
+        resultado.update(linhas=len(df), chaves=chaves)
+        aceitos.append([resultado, df])
+        resultados.append(resultado)
+
+    if substituir:
+        base.remover_chaves(substituir, salvar_manifesto=False)
+    gravar = []
+    for resultado, df in aceitos:
+        if not df.empty:
+            resultado['ingestao'] = base.nova_ingestao(resultado['arquivo'])
+            gravar.append(df.assign(**{COLUNA_INGESTAO: resultado['ingestao']}))
+    if gravar:
+        base.gravar(concatenar(gravar))
+    elif substituir:
+        base._salvar_manifesto()
+    segundos = {'gravacao': round(time.perf_counter() - inicio, 3)}
+    if materializar and (aceitos or base.pendente()):
+        inicio = time.perf_counter()
+        base.materializar(formatar, formato_data, exibir)
+        segundos['planilha'] = round(time.perf_counter() - inicio, 3)
+    for resultado in resultados:
+        resultado['segundos'].update(segundos)
+    return resultados
+
+
+def gravar_fluxo(
+    base: BaseParticionada, origem, lotes, formatar=None, materializar=True, formato_data=FORMATO_DATA, exibir=None,
+    politica=RECUSAR,
+) -> dict:
+    """
+    Grava na base um arquivo lido em lotes, à medida que os lotes chegam.
+
+    `lotes` é um iterável de DataFrames já tipados (ex.: o `ler_em_lotes` do
+    tipo passado pelo `preparar_dados` do append), consumido um por vez. As
+    chaves que já estavam na base seguem a `politica` de `gravar_lotes`; com
+    RECUSAR, o arquivo é recusado por inteiro e as partições dele gravadas
+    até ali são descartadas, assim como numa falha de leitura no meio do
+    arquivo (que também desfaz as substituições). O arquivo recebe um número
+    de ingestão no primeiro lote gravado.
+
+    Retorna o dicionário do arquivo no mesmo formato de `gravar_lotes`; a
+    'gravacao' em 'segundos' inclui a leitura dos lotes, que chegam durante
+    a gravação.
+    """
+    _conferir_politica(politica)
+    inicio = time.perf_counter()
+    existentes = base._chaves()
+    estado = base.estado()
+    resultado = resultado_arquivo(origem, 'gravado')
+    vistas = set()
+
+    def sem_gravacao(status, chaves=()):
+        # Arquivo sem linhas gravadas: mantém os avisos, o preparo e as linhas lidas
+        resultado.update(status=status, linhas=0, chaves=list(chaves), ignoradas=[], substituidas=[], ingestao=None)
+        resultado['segundos']['gravacao'] = round(time.perf_counter() - inicio, 3)
+        return resultado
+
+    try:
+        for df in lotes:
+            if df is None or df.empty:
+                continue
+            resultado['linhas_lidas'] += len(df)
+            _anotar_preparo(resultado, df)
+            novas = [tuple(chave) for chave in chaves_distintas(df, base.colunas)]
+            repetidas = [chave for chave in novas if chave in existentes]
+            if repetidas and politica == RECUSAR:
+                base.restaurar(estado)
+                return sem_gravacao('duplicado', repetidas)
+            if repetidas and politica == IGNORAR_EXISTENTES:
+                df = df[~linhas_das_chaves(df, repetidas, base.colunas)]
+                novas = [chave for chave in novas if chave not in set(repetidas)]
+                resultado['ignoradas'].extend(chave for chave in repetidas if chave not in resultado['ignoradas'])
+            elif repetidas:
+                # Só na primeira vez: depois a chave já tem as linhas deste arquivo
+                primeiras = [chave for chave in repetidas if chave not in resultado['substituidas']]
+                base.remover_chaves(primeiras, salvar_manifesto=False)
+                resultado['substituidas'].extend(primeiras)
+            if df.empty:
+                continue
+            if resultado['ingestao'] is None:
+                resultado['ingestao'] = base.nova_ingestao(origem)
+            base.gravar(df, salvar_manifesto=False, ingestao=resultado['ingestao'])
+            for chave in novas:
+                if chave not in vistas:
+                    vistas.add(chave)
+                    resultado['chaves'].append(chave)
+            resultado['linhas'] += len(df)
+    except BaseException:
+        base.restaurar(estado)
+        raise
+
+    if not resultado['linhas']:
+        if resultado['ignoradas']:
+            return sem_gravacao('duplicado', resultado['ignoradas'])
+        return sem_gravacao('vazio')
+    base._salvar_manifesto()
+    resultado['segundos']['gravacao'] = round(time.perf_counter() - inicio, 3)
+    if materializar:
+        inicio = time.perf_counter()
+        base.materializar(formatar, formato_data, exibir)
+        resultado['segundos']['planilha'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def abrir_base(caminho_base, colunas=CHAVE_PADRAO) -> BaseParticionada:
+    """
+    Base particionada de `caminho_base`.
+
+    Se ainda não houver partições e a planilha existir, as linhas dela são
+    importadas. Se a planilha tiver sido editada fora do sistema depois da
+    última materialização e não houver partições pendentes, ela é
+    reimportada; havendo pendências, as partições prevalecem e a planilha
+    será regravada na próxima materialização.
+    """
+    base = BaseParticionada(caminho_base, colunas)
+    if not base._carregar_manifesto():
+        if os.path.exists(caminho_base):
+            base.importar_planilha()
+        return base
+
+    if base._planilha_alterada_fora():
+        if base.pendente():
+            print(f"Aviso: {os.path.basename(caminho_base)} foi alterada fora do sistema e será regravada a partir das partições.")
+        else:
+            base.importar_planilha()
+    return base
@@ -0,0 +1,139 @@
+import unicodedata
+
+import pandas as pd
+
+from comum.planilha import abrir_planilha
+
+# Identificação do tipo de relatório pelas primeiras linhas da primeira aba
+# (ou da primeira reconhecida, quando o arquivo começa por uma capa).
+#
+# Cada tipo tem uma assinatura com:
+# - 'titulo':    termos do título (primeiras linhas, ex.: "RANKING DE BENEFICIÁRIOS")
+# - 'cabecalho': termos esperados na linha de cabeçalho da tabela
+# - 'linha':     linha (base zero) em que o cabeçalho costuma estar
+# - 'contrato':  célula (linha, coluna) em que o número do contrato costuma estar
+# Os termos são comparados sem acentos e em minúsculas.
+ASSINATURAS = {
+    'beneficiarios': {
+        'titulo': ('beneficiar',),
+        'cabecalho': ('certificado', 'beneficiario', 'dependente', 'vigente', 'copart'),
+        'linha': 14, 'contrato': (3, 3),
+    },
+    'prestadores': {
+        'titulo': ('prestador',),
+        'cabecalho': ('codigo', 'prestador', 'uf', 'custo medio'),
+        'linha': 12, 'contrato': (3, 3),
+    },
+    'procedimentos': {
+        'titulo': ('procediment',),
+        'cabecalho': ('codigo', 'procedimento', 'custo medio', 'part. beneficiario'),
+        'linha': 13, 'contrato': (3, 3),
+    },
+    'consultas': {
+        'titulo': ('consulta',),
+        'cabecalho': ('codigo', 'especialidade', 'qtd eventos', 'part. beneficiario'),
+        'linha': 11, 'contrato': (2, 3),
+    },
+    'diagnosticos': {
+        'titulo': ('diagnost',),
+        'cabecalho': ('diagnostico', 'internac', 'pacientes', 'custo medio'),
+        'linha': 13, 'contrato': (2, 3),
+    },
+    'exames': {
+        'titulo': ('exame',),
+        'cabecalho': ('grupo de exames', 'qtd eventos', 'valor liq', 'custo medio'),
+        'linha': 11, 'contrato': (2, 3),
+    },
+    'terapias': {
+        'titulo': ('terapia',),
+        'cabecalho': ('grupo de terapias', 'qtd eventos', 'valor liq', 'part. beneficiario'),
+        'linha': 11, 'contrato': (2, 3),
+    },
+    'sinistralidade': {
+        'titulo': ('sinistral',),
+        'cabecalho': ('mes', 'faturamento', 'evento', 'vidas', 'per capita'),
+        'linha': 8, 'contrato': (2, 3),
+    },
+}
+
+# Pesos de cada parte da assinatura na confiança (somam 1)
+PESO_TITULO = 0.45
+PESO_CABECALHO = 0.40
+PESO_LAYOUT = 0.15
+
+# Abaixo desta confiança o arquivo é considerado de tipo desconhecido
+CONFIANCA_MINIMA = 0.5
+
+LINHAS_SONDA = 20
+
+# Abas sondadas quando a primeira não é reconhecida: os relatórios
+# consolidados (um contrato por aba) podem começar por uma capa ou resumo
+MAX_ABAS_SONDADAS = 5
+
+
+def _normalizar(valor) -> str:
+    if pd.isna(valor):
+        return ''
+    texto = unicodedata.normalize('NFKD', str(valor))
+    return ''.join(ch for ch in texto if not unicodedata.combining(ch)).strip().lower()
+
+
+def _pontuar(assinatura, titulo, linhas, sonda):
+    """Confiança (0 a 1) de que a sonda corresponde à assinatura."""
+    pontos = PESO_TITULO if any(termo in titulo for termo in assinatura['titulo']) else 0.0
+
+    termos = assinatura['cabecalho']
+    melhor, linha_cabecalho = 0, None
+    for indice, celulas in enumerate(linhas):
+        encontrados = sum(1 for termo in termos if any(termo in celula for celula in celulas))
+        if encontrados > melhor:
+            melhor, linha_cabecalho = encontrados, indice
+    pontos += PESO_CABECALHO * melhor / len(termos)
+
+    layout = 0.0
+    if linha_cabecalho is not None:
+        distancia = abs(linha_cabecalho - assinatura['linha'])
+        layout += 0.5 if distancia == 0 else 0.25 if distancia == 1 else 0.0
+    linha, coluna = assinatura['contrato']
+    if linha < sonda.shape[0] and coluna < sonda.shape[1] and not pd.isna(sonda.iat[linha, coluna]):
+        layout += 0.5
+    return pontos + PESO_LAYOUT * layout
+
+
+def classificar_sonda(sonda: pd.DataFrame) -> dict:
+    """
+    Classifica as primeiras linhas (header=None) de um relatório.
+
+    Retorna {'tipo': tipo mais provável ou None, 'confianca': 0 a 1,
+    'pontuacoes': {tipo: confiança}} para todos os tipos.
+    """
+    linhas = [[c for c in (_normalizar(v) for v in linha) if c] for linha in sonda.itertuples(index=False, name=None)]
+    titulo = ' '.join(' '.join(celulas) for celulas in linhas[:3])
+
+    pontuacoes = {tipo: round(_pontuar(assinatura, titulo, linhas, sonda), 3) for tipo, assinatura in ASSINATURAS.items()}
+    tipo = max(pontuacoes, key=pontuacoes.get)
+    confianca = pontuacoes[tipo]
+    if confianca < CONFIANCA_MINIMA:
+        tipo = None
+    return {'tipo': tipo, 'confianca': confianca, 'pontuacoes': pontuacoes}
+
+
+def classificar_arquivo(arquivo) -> dict:
+    """
+    Classifica o relatório pelo início da primeira aba (ver `classificar_sonda`).
+
+    Se a primeira aba não atingir CONFIANCA_MINIMA (capa, resumo), as
+    seguintes são sondadas, até MAX_ABAS_SONDADAS, e vale a primeira
+    reconhecida; sem nenhuma, volta a classificação de maior confiança.
+    Só as primeiras linhas de cada aba são lidas; a planilha fica no cache e
+    é reaproveitada se o arquivo for lido em seguida.
+    """
+    planilha = abrir_planilha(arquivo)
+    melhor = None
+    for aba in planilha.sheet_names[:MAX_ABAS_SONDADAS] or [0]:
+        classificacao = classificar_sonda(planilha.sonda(aba, nrows=LINHAS_SONDA))
+        if classificacao['tipo'] is not None:
+            return classificacao
+        if melhor is None or classificacao['confianca'] > melhor['confianca']:
+            melhor = classificacao
+    return melhor
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+# Competências e datas de período gravadas como datas (datetime64) nas bases.
+#
+# Os relatórios trazem o período como texto ("01/01/2024 a 31/01/2024") ou o
+# mês da competência ("03/2024", às vezes uma célula de data do Excel). O
+# texto é interpretado uma vez por aba (período) ou uma vez por coluna (mês
+# de cada linha), sem chamada de pd.to_datetime por linha. Nas chaves de
+# duplicidade uma data vale o inteiro AAAAMMDD (ver `numeros_das_datas`),
+# então comparar e ordenar competências é comparar inteiros.
+
+# Formatos aceitos nos textos, na ordem em que são tentados
+FORMATOS_DATA = ('%d/%m/%Y', '%m/%Y', '%Y-%m-%d', '%Y-%m-%d %H:%M:%S')
+
+# Colunas de data das bases e, entre elas, as de mês (competência mensal:
+# sempre o dia 1 do mês)
+COLUNAS_DATA = ('dtcompetde', 'dtcompetate', 'periodo_referencia_de', 'periodo_referencia_ate', 'competencia')
+COLUNAS_MES = ('competencia',)
+
+
+def _datas_de_celulas(celulas: pd.Series) -> pd.Series:
+    """Datas de uma coluna object (textos, datas do Excel, vazios)."""
+    e_texto = celulas.map(type).eq(str).to_numpy()
+    datas = pd.Series(pd.NaT, index=celulas.index, dtype='datetime64[ns]')
+
+    # Células que já são datas (Timestamp, datetime, date)
+    outras = ~e_texto & celulas.notna().to_numpy()
+    if outras.any():
+        datas[outras] = pd.to_datetime(celulas[outras], errors='coerce')
+
+    # Textos: cada formato é aplicado de uma vez ao que ainda falta converter
+    faltam = e_texto.copy()
+    if not faltam.any():
+        return datas
+    textos = celulas[faltam].str.strip()
+    for formato in FORMATOS_DATA:
+        convertidas = pd.to_datetime(textos, format=formato, errors='coerce')
+        datas[faltam] = datas[faltam].fillna(convertidas)
+        textos = textos[convertidas.isna().to_numpy()]
+        faltam[faltam] = convertidas.isna().to_numpy()
+        if not faltam.any():
+            return datas
+    meses = textos.str.extract(r'(\d{2}/\d{4})', expand=False)
+    datas[faltam] = pd.to_datetime(meses, format='%m/%Y', errors='coerce')
+    return datas
+
+
+def converter_datas(serie: pd.Series, mensal=False) -> pd.Series:
+    """
+    Converte uma coluna de datas (textos nos FORMATOS_DATA, datas do Excel ou
+    datetime64) para datetime64[ns] sem horário; inválido ou vazio vira NaT.
+
+    Com `mensal=True` cada data vira o dia 1 do seu mês. Textos fora dos
+    formatos que contêm um "MM/AAAA" usam esse mês.
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        datas = serie.dt.tz_localize(None) if serie.dt.tz is not None else serie
+        datas = datas.astype('datetime64[ns]')
+    else:
+        datas = _datas_de_celulas(serie.astype(object))
+    datas = datas.dt.normalize()
+    if mensal:
+        datas = datas.dt.to_period('M').dt.to_timestamp()
+    return datas.rename(serie.name)
+
+
+def data_competencia(valor, mensal=False) -> pd.Timestamp:
+    """`converter_datas` de um único valor (ex.: a competência da aba); NaT se inválido."""
+    return converter_datas(pd.Series([valor], dtype=object), mensal=mensal).iloc[0]
+
+
+def datas_do_periodo(periodo):
+    """
+    (início, fim) do texto de período "DE a ATE" do cabeçalho do relatório,
+    como Timestamp; (NaT, NaT) se o valor não trouxer um período.
+    """
+    if not isinstance(periodo, str):
+        return pd.NaT, pd.NaT
+    partes = periodo.split()
+    if len(partes) < 3:
+        return pd.NaT, pd.NaT
+    return data_competencia(partes[0]), data_competencia(partes[2])
+
+
+def tipar_datas(df: pd.DataFrame) -> pd.DataFrame:
+    """Converte as COLUNAS_DATA presentes em `df` (no lugar) e devolve `df`."""
+    for coluna in COLUNAS_DATA:
+        if coluna in df.columns:
+            df[coluna] = converter_datas(df[coluna], mensal=coluna in COLUNAS_MES)
+    return df
+
+
+def numeros_das_datas(serie: pd.Series) -> np.ndarray:
+    """Datas (datetime64) como inteiros AAAAMMDD; NaT vira -1."""
+    datas = serie.dt
+    numeros = (datas.year * 10000 + datas.month * 100 + datas.day).to_numpy(dtype=float, na_value=np.nan)
+    return np.where(np.isnan(numeros), -1, numeros).astype('int64')
+
+
+def texto_da_data(numero) -> str:
+    """Data AAAAMMDD das chaves como texto ("31/01/2024"), para as mensagens."""
+    numero = int(numero)
+    return f"{numero % 100:02d}/{numero // 100 % 100:02d}/{numero // 10000}"
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+from comum.competencia import converter_datas, numeros_das_datas, texto_da_data
+
+# Chave usada por todas as bases para impedir que o mesmo relatório
+# (contrato + competência) seja gravado duas vezes.
+CHAVE_PADRAO = ('contrato', 'dtcompetde')
+
+
+def valores_chave(serie: pd.Series) -> pd.Series:
+    """
+    Valores usados na comparação de chaves (object: int ou texto).
+
+    Datas (competências) viram o inteiro AAAAMMDD e números inteiros viram
+    int, inclusive quando gravados como float (coluna com vazios lida do
+    Excel) ou como texto ("123", "01/01/2024" de bases antigas), para que a
+    mesma chave seja reconhecida independentemente do tipo da coluna e a
+    comparação seja entre inteiros. Vazio vira ''; o resto, o próprio texto.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # Só as categorias são convertidas; as linhas reaproveitam pelos códigos
+        categorias = valores_chave(pd.Series(serie.cat.categories, dtype=object)).to_numpy()
+        codigos = serie.cat.codes.to_numpy()
+        saida = np.where(codigos < 0, '', categorias[codigos] if len(categorias) else '')
+        return pd.Series(saida, index=serie.index, dtype=object)
+
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        numeros = numeros_das_datas(serie)
+        return pd.Series(np.where(numeros < 0, '', numeros.astype(object)), index=serie.index, dtype=object)
+
+    if pd.api.types.is_bool_dtype(serie.dtype):
+        return serie.astype(str).astype(object)
+    valores = pd.to_numeric(serie, errors='coerce') if serie.dtype == object else serie.astype(float)
+    valores = valores.astype(float)
+    inteiros = (valores.notna() & (valores % 1 == 0)).to_numpy()
+    saida = serie.astype(object).where(serie.notna(), '').astype(str).astype(object)
+    saida[inteiros] = valores[inteiros].astype('int64').astype(object)
+
+    # Textos restantes que são datas (bases gravadas com a competência em texto)
+    textos = (~inteiros & (saida != '').to_numpy() & (serie.dtype == object))
+    if textos.any():
+        datas = converter_datas(serie[textos])
+        validas = datas.notna().to_numpy()
+        if validas.any():
+            posicoes = np.flatnonzero(textos)[validas]
+            saida.iloc[posicoes] = numeros_das_datas(datas[validas]).astype(object)
+    return saida
+
+
+def valor_chave(valor):
+    """`valores_chave` de um único valor (ex.: uma chave lida de um JSON)."""
+    return valores_chave(pd.Series([valor], dtype=object)).iloc[0]
+
+
+def chaves_distintas(df: pd.DataFrame, colunas=CHAVE_PADRAO) -> pd.MultiIndex:
+    """Chaves (ver `valores_chave`) distintas presentes em `df`; coluna ausente conta como vazia."""
+    partes = [valores_chave(df[c]) if c in df.columns else pd.Series('', index=df.index) for c in colunas]
+    return pd.MultiIndex.from_arrays(partes, names=list(colunas)).unique()
+
+
+def linhas_das_chaves(df: pd.DataFrame, chaves, colunas=CHAVE_PADRAO) -> np.ndarray:
+    """Máscara (um bool por linha) das linhas de `df` cuja chave está em `chaves`."""
+    partes = [valores_chave(df[c]) if c in df.columns else pd.Series('', index=df.index) for c in colunas]
+    return pd.MultiIndex.from_arrays(partes).isin([tuple(chave) for chave in chaves])
+
+
+def formatar_chaves(chaves: list) -> str:
+    """
+    Lista de chaves para as mensagens ("(123, '01/01/2024'), (123, '01/02/2024')");
+    a competência (AAAAMMDD) aparece como data.
+    """
+    def texto(chave):
+        partes = [chave[0]] + [
+            texto_da_data(v) if isinstance(v, (int, np.integer)) and not isinstance(v, bool) else v for v in chave[1:]
+        ]
+        return str(tuple(partes))
+
+    return ', '.join(texto(chave) for chave in chaves)
+
+
+def competencias_do_contrato(chaves, contrato, de=None, ate=None) -> list:
+    """
+    Competências (AAAAMMDD) das chaves (contrato, competência) do contrato,
+    em ordem, opcionalmente só as de `de` até `ate` (datas ou textos como
+    "01/01/2024"; limites inclusivos).
+    """
+    contrato = valor_chave(contrato)
+    inicio = -1 if de is None else valor_chave(de)
+    fim = 99999999 if ate is None else valor_chave(ate)
+    return sorted({
+        chave[1] for chave in chaves
+        if chave[0] == contrato and isinstance(chave[1], int) and inicio <= chave[1] <= fim
+    })
@@ -0,0 +1,366 @@
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+# Tipos de campo aceitos pelos layouts posicionais:
+# - 'carregado':   código/certificado que só aparece na primeira linha do
+#                  grupo e vale para as linhas seguintes (forward-fill), inteiro
+# - 'texto':       texto sem espaços nas pontas
+# - 'bruto':       valor da célula sem conversão
+# - 'codigo':      código inteiro ("1.0" vira 1); vazio vira <NA>
+# - 'numero':      número (float64); vazio vira NaN
+# - 'numero_zero': igual a 'numero', mas célula vazia vira 0
+# - 'porcentagem': fração (0.1234 para 12,34%)
+
+# Linhas da planilha por lote na leitura sob demanda (extrair_em_lotes)
+TAMANHO_LOTE = 50_000
+
+
+# Textos que representam célula sem valor (não contam como erro de conversão)
+TEXTOS_VAZIOS = ('', '-', 'nan')
+
+
+def _substituir(textos: np.ndarray, antigo: str, novo: str) -> np.ndarray:
+    """np.strings.replace, pulado quando nenhum texto contém `antigo`."""
+    if not (np.strings.find(textos, antigo) >= 0).any():
+        return textos
+    return np.strings.replace(textos, antigo, novo)
+
+
+def _termos_numericos(textos: np.ndarray, padrao_br: bool) -> np.ndarray:
+    """
+    Normaliza, de uma vez, os textos de números no formato brasileiro para o
+    formato do float() do Python: primeiro termo ("3 eventos" vira "3"), sem
+    "R$" e "%", sem separador de milhar e com ponto decimal.
+    """
+    textos = _substituir(textos, '\xa0', ' ')
+    textos = np.strings.strip(_substituir(textos, 'R$', ''))
+    if (np.strings.find(textos, ' ') >= 0).any():
+        textos = np.strings.partition(textos, ' ')[0]
+    textos = _substituir(textos, '%', '')
+    if padrao_br:
+        textos = _substituir(textos, '.', '')
+    else:
+        milhar = np.strings.find(textos, ',') >= 0
+        if milhar.any():
+            textos = np.where(milhar, np.strings.replace(textos, '.', ''), textos)
+    return _substituir(textos, ',', '.')
+
+
+def _numeros_simples(textos: np.ndarray, padrao_br: bool):
+    """
+    Converte, sem passar por texto intermediário, os textos no formato
+    comum dos relatórios: sinal opcional, dígitos com separadores de milhar e
+    decimal, '%' opcional, e o restante depois do primeiro espaço ignorado
+    ("-1.234,56", "12,5%", "3 eventos").
+
+    Os caracteres são lidos como uma matriz de códigos e percorridos uma
+    posição por vez, com todos os textos da coluna avançando juntos; o
+    número é montado a partir dos dígitos (mantissa inteira dividida por
+    10^casas decimais, o mesmo float que float("1234.56") produziria).
+    Retorna (valores, convertidos); os textos fora desse formato (ou com
+    mais de 15 dígitos) ficam com convertidos=False para o caminho geral.
+    """
+    quantidade = len(textos)
+    largura = textos.dtype.itemsize // 4
+    valores = np.full(quantidade, np.nan)
+    if quantidade == 0 or largura == 0:
+        return valores, np.zeros(quantidade, dtype=bool)
+    posicoes = np.ascontiguousarray(np.ascontiguousarray(textos).view(np.uint32).reshape(quantidade, largura).T)
+
+    mantissa = np.zeros(quantidade, dtype=np.int64)
+    digitos = np.zeros(quantidade, dtype=np.int64)
+    virgulas = np.zeros(quantidade, dtype=np.int64)
+    pontos = np.zeros(quantidade, dtype=np.int64)
+    casas_virgula = np.zeros(quantidade, dtype=np.int64)
+    casas_ponto = np.zeros(quantidade, dtype=np.int64)
+    iniciado = np.zeros(quantidade, dtype=bool)
+    terminado = np.zeros(quantidade, dtype=bool)
+    negativo = np.zeros(quantidade, dtype=bool)
+    porcento = np.zeros(quantidade, dtype=bool)
+    invalido = np.zeros(quantidade, dtype=bool)
+
+    for car in posicoes:
+        if (terminado | (car == 0)).all():
+            break
+        espaco = (car == 32) | (car == 0)
+        primeiro = ~iniciado & ~espaco
+        terminado |= iniciado & espaco
+        iniciado |= primeiro
+        no_termo = iniciado & ~terminado
+
+        digito = no_termo & (car >= 48) & (car <= 57)
+        virgula = no_termo & (car == 44)
+        ponto = no_termo & (car == 46)
+        menos = no_termo & (car == 45)
+        simbolo = no_termo & (car == 37)
+        invalido |= (no_termo & porcento) | (menos & ~primeiro)
+        invalido |= no_termo & ~(digito | virgula | ponto | menos | simbolo)
+
+        mantissa = np.where(digito, mantissa * 10 + (car.astype(np.int64) - 48), mantissa)
+        digitos += digito
+        casas_virgula += digito & (virgulas > 0)
+        casas_ponto += digito & (pontos > 0)
+        virgulas += virgula
+        pontos += ponto
+        negativo |= menos
+        porcento |= simbolo
+
+    if padrao_br:
+        casas, separadores_ok = casas_virgula, virgulas <= 1
+    else:
+        # Com vírgula, ela é o decimal e os pontos são milhar; sem, o ponto é o decimal
+        casas = np.where(virgulas > 0, casas_virgula, casas_ponto)
+        separadores_ok = np.where(virgulas > 0, virgulas == 1, pontos <= 1)
+    convertidos = ~invalido & (digitos > 0) & (digitos <= 15) & separadores_ok
+
+    numeros = mantissa / 10.0 ** casas
+    valores[convertidos] = np.where(negativo, -numeros, numeros)[convertidos]
+    return valores, convertidos
+
+
+def _para_float(termos: np.ndarray):
+    """Converte os termos normalizados; retorna (valores, erros)."""
+    vazios = np.isin(termos, TEXTOS_VAZIOS)
+    try:
+        # Caminho rápido: todos os termos são números (ou vazios)
+        valores = np.where(vazios, 'nan', termos).astype(object).astype(float)
+        return valores, np.zeros(len(termos), dtype=bool)
+    except ValueError:
+        valores = pd.to_numeric(termos.astype(object), errors='coerce').astype(float)
+    invalidos = np.isnan(valores) & ~vazios
+    if invalidos.any():
+        invalidos[invalidos] = np.strings.lower(termos[invalidos]) != 'nan'
+    return valores, invalidos
+
+
+def analisar_numeros(serie: pd.Series, padrao_br=False, escala=None):
+    """
+    Converte uma coluna inteira de células numéricas e/ou textos para float64.
+
+    Retorna (valores, erros), dois arrays NumPy do tamanho da coluna: os
+    valores (NaN quando vazio ou inválido) e a máscara das células que tinham
+    conteúdo mas não puderam ser convertidas.
+
+    Células numéricas do Excel são mantidas como estão. Textos usam apenas o
+    primeiro termo, sem "R$" e "%", com vírgula decimal; com `padrao_br=True`
+    o ponto é sempre separador de milhar ("1.234" vira 1234), senão só quando
+    há vírgula ("1.234,56" vira 1234.56, "1.5" vira 1.5). Vazio, "-" e "nan"
+    viram NaN sem erro.
+
+    Com `escala`, a coluna é de percentuais e os valores saem como fração:
+    números e textos sem '%' são divididos por `escala` (1 quando o relatório
+    já traz a fração, 100 quando traz 0-100); textos com '%' sempre são
+    divididos por 100 ("12,5%" vira 0.125).
+
+    Os textos são convertidos com operações NumPy sobre a coluna inteira,
+    sem chamada Python por célula (ver `_numeros_simples`).
+    """
+    if pd.api.types.is_numeric_dtype(serie.dtype):
+        valores = serie.to_numpy(dtype=float, na_value=np.nan)
+        if escala is not None:
+            valores = valores / escala
+        return valores, np.zeros(len(valores), dtype=bool)
+
+    celulas = serie.to_numpy(dtype=object)
+    if pd.api.types.infer_dtype(celulas, skipna=True) == 'string':
+        texto = ~pd.isna(celulas)
+    else:
+        texto = np.fromiter((isinstance(v, str) for v in celulas), dtype=bool, count=len(celulas))
+    valores = np.full(len(celulas), np.nan)
+    erros = np.zeros(len(celulas), dtype=bool)
+    divisor = np.full(len(celulas), 1.0 if escala is None else float(escala))
+
+    outros = ~texto
+    if outros.any():
+        convertidos = pd.to_numeric(pd.Series(celulas[outros]), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        valores[outros] = convertidos
+        erros[outros] = np.isnan(convertidos) & ~pd.isna(celulas[outros])
+
+    if texto.any():
+        textos = celulas[texto].astype(str)
+        numeros, convertidos = _numeros_simples(textos, padrao_br)
+        erros_texto = np.zeros(len(textos), dtype=bool)
+        if not convertidos.all():
+            resto = ~convertidos
+            numeros[resto], erros_texto[resto] = _para_float(_termos_numericos(textos[resto], padrao_br))
+        valores[texto], erros[texto] = numeros, erros_texto
+        if escala is not None:
+            divisor[texto] = np.where(np.strings.find(textos, '%') >= 0, 100.0, divisor[texto])
+
+    if escala is not None:
+        valores = valores / divisor
+    return valores, erros
+
+
+def converter_numeros(serie: pd.Series, padrao_br=False) -> pd.Series:
+    """Converte uma coluna inteira para float64 (ver `analisar_numeros`); inválido vira NaN."""
+    valores, _ = analisar_numeros(serie, padrao_br=padrao_br)
+    return pd.Series(valores, index=serie.index, name=serie.name)
+
+
+def converter_porcentagens(serie: pd.Series, escala=1, padrao_br=False) -> pd.Series:
+    """Converte uma coluna de percentuais para fração (float64, ver `analisar_numeros`)."""
+    valores, _ = analisar_numeros(serie, padrao_br=padrao_br, escala=escala)
+    return pd.Series(valores, index=serie.index, name=serie.name)
+
+
+def converter_inteiros(serie: pd.Series, padrao_br=False) -> pd.Series:
+    """Converte para inteiro (Int64, sem parte decimal); vazio vira <NA>."""
+    return np.trunc(converter_numeros(serie, padrao_br=padrao_br)).astype('Int64')
+
+
+def converter_coluna(serie: pd.Series, padrao_br=False, escala=None, avisos=None) -> pd.Series:
+    """
+    `analisar_numeros` de uma coluna da base, avisando das células com
+    conteúdo que não puderam ser convertidas (ficam NaN): o aviso vai para a
+    lista `avisos`, se dada, ou para o console (print).
+    """
+    valores, erros = analisar_numeros(serie, padrao_br=padrao_br, escala=escala)
+    if erros.any():
+        exemplos = ', '.join(repr(v) for v in pd.unique(serie.to_numpy(dtype=object)[erros])[:3])
+        aviso = f"{int(erros.sum())} valor(es) não numérico(s) na coluna '{serie.name}' (ex.: {exemplos})"
+        if avisos is None:
+            print(f"⚠️ {aviso}")
+        else:
+            avisos.append(aviso)
+    return pd.Series(valores, index=serie.index, name=serie.name)
+
+
+def contrato_tipado(valor):
+    """Número do contrato como inteiro quando for numérico; senão o texto."""
+    if pd.isna(valor):
+        return ''
+    texto = str(valor).strip()
+    try:
+        numero = float(texto)
+    except ValueError:
+        return texto
+    return int(numero) if numero.is_integer() else texto
+
+
+def periodo_do_relatorio(valor):
+    """Texto "DE a ATE" da célula de período, ou None se a célula não trouxer um período."""
+    if not isinstance(valor, str) or len(valor.split(' ')) < 3:
+        return None
+    return valor
+
+
+def coluna_ou_vazia(table: pd.DataFrame, col) -> pd.Series:
+    """Coluna `col` da tabela, ou coluna vazia quando o cabeçalho não foi encontrado."""
+    if col is None:
+        return pd.Series(np.nan, index=table.index, dtype=object)
+    return table[col]
+
+
+def linhas_de_total(serie: pd.Series, prefixos=('TOTAL',)) -> pd.Series:
+    """Marca linhas vazias ou de totais/subtotais (texto começando por `prefixos`)."""
+    texto = serie.astype(str).str.strip().str.upper()
+    return texto.str.startswith(tuple(prefixos)) | (texto == '') | (texto == 'NAN')
+
+
+def marcar_leitura(df: pd.DataFrame, caminho_arquivo: str, inicio: float, abas: int) -> pd.DataFrame:
+    """
+    Registra em df.attrs['leitura'] o resumo da leitura do relatório:
+    'arquivo', 'linhas' lidas, 'abas' com dados e 'segundos' desde `inicio`
+    (time.perf_counter()). Devolve `df`.
+    """
+    df.attrs['leitura'] = {
+        'arquivo': caminho_arquivo, 'linhas': len(df), 'abas': abas,
+        'segundos': round(time.perf_counter() - inicio, 3),
+    }
+    return df
+
+
+def _carregado(serie: pd.Series) -> pd.Series:
+    """Código que vale até a próxima célula preenchida."""
+    return converter_inteiros(serie).ffill()
+
+
+def colunas_do_layout(coluna_nome: int, campos: list) -> list:
+    """Posições das colunas da planilha lidas por um layout posicional."""
+    return sorted({coluna_nome} | {indice for _, indice, _ in campos})
+
+
+def extrair_registros(table: pd.DataFrame, coluna_nome: int, campos: list) -> pd.DataFrame:
+    """
+    Extrai os registros de uma tabela posicional coluna a coluna.
+
+    `table` tem as colunas rotuladas pela posição na planilha (como as de
+    PastaTrabalho.colunas ou de uma leitura com header=None). `coluna_nome`
+    é a coluna que identifica uma linha de dados (linhas com ela vazia são
+    descartadas) e `campos` é a lista de tuplas (nome_saida, indice_coluna,
+    tipo), na ordem das colunas de saída.
+    As colunas numéricas já saem tipadas (float64/Int64, percentual como fração).
+    """
+    nomes = table[coluna_nome]
+    linhas = nomes.notna() & (nomes.astype(str).str.strip() != '')
+    dados = table[linhas.values]
+
+    saida = {}
+    for nome_saida, indice, tipo in campos:
+        coluna = dados[indice]
+        if tipo == 'carregado':
+            saida[nome_saida] = _carregado(coluna)
+        elif tipo == 'texto':
+            saida[nome_saida] = coluna.astype(str).str.strip()
+        elif tipo == 'bruto':
+            saida[nome_saida] = coluna
+        elif tipo == 'codigo':
+            saida[nome_saida] = converter_inteiros(coluna)
+        elif tipo == 'numero':
+            saida[nome_saida] = converter_numeros(coluna)
+        elif tipo == 'numero_zero':
+            saida[nome_saida] = converter_numeros(coluna).fillna(0.0)
+        elif tipo == 'porcentagem':
+            saida[nome_saida] = converter_porcentagens(coluna)
+        else:
+            raise ValueError(f"Tipo de campo desconhecido: {tipo}")
+
+    return pd.DataFrame(saida).reset_index(drop=True)
+
+
+def extrair_em_lotes(linhas, coluna_nome: int, campos: list, tamanho_lote=TAMANHO_LOTE):
+    """
+    Versão em lotes de `extrair_registros` para linhas lidas sob demanda.
+
+    `linhas` é um iterável de tuplas (as linhas de dados da aba, depois do
+    cabeçalho). A cada `tamanho_lote` linhas da planilha é produzido um
+    DataFrame com os registros extraídos, de modo que só um lote fica em
+    memória. Campos 'carregado' continuam valendo de um lote para o outro.
+    """
+    carregados = [nome for nome, _, tipo in campos if tipo == 'carregado']
+    ultimos = {}
+    posicoes = colunas_do_layout(coluna_nome, campos)
+
+    def extrair(bloco):
+        # Só as colunas do layout, com a mesma inferência de tipos de
+        # PastaTrabalho.colunas
+        table = TextParser(
+            [[linha[i] if i < len(linha) else None for i in posicoes] for linha in bloco],
+            header=None, skip_blank_lines=False,
+        ).read()
+        table.columns = posicoes
+        registros = extrair_registros(table, coluna_nome, campos)
+        for nome in carregados:
+            if nome in ultimos and len(registros):
+                registros[nome] = registros[nome].fillna(ultimos[nome])
+            preenchidos = registros[nome].dropna()
+            if len(preenchidos):
+                ultimos[nome] = preenchidos.iloc[-1]
+        return registros
+
+    bloco = []
+    for linha in linhas:
+        bloco.append(linha)
+        if len(bloco) >= tamanho_lote:
+            registros = extrair(bloco)
+            bloco = []
+            if len(registros):
+                yield registros
+    if bloco:
+        registros = extrair(bloco)
+        if len(registros):
+            yield registros
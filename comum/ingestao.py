@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+from comum.registro import PASTA_BASES
+
+# Livro de ingestão: um registro por relatório de origem já processado, com
+# o SHA-256, o tamanho e o mtime do arquivo, o tipo de relatório, as chaves
+# (contrato + competência), as linhas gravadas e o número da ingestão na
+# base (ver armazenamento.COLUNA_INGESTAO). É consultado antes da
+# leitura: um arquivo com o mesmo caminho, tamanho e mtime de um registro é
+# reconhecido sem abrir o arquivo; um arquivo copiado/renomeado é reconhecido
+# pelo SHA-256; um arquivo cujo conteúdo mudou desde a ingestão é sinalizado.
+VERSAO_LIVRO = 1
+NOME_LIVRO = 'ingestoes.json'
+
+# Situações retornadas por LivroIngestao.consultar
+NOVO = 'novo'
+INGERIDO = 'ingerido'
+ALTERADO = 'alterado'
+
+
+def caminho_livro(pasta_bases=PASTA_BASES):
+    """Caminho do livro de ingestão (databases/ingestoes.json)."""
+    return os.path.join(pasta_bases, NOME_LIVRO)
+
+
+def _sha256(caminho):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def assinatura_arquivo(caminho, com_hash=True):
+    """mtime (ns), tamanho e, opcionalmente, o SHA-256 do arquivo."""
+    stat = os.stat(caminho)
+    assinatura = {'mtime_ns': stat.st_mtime_ns, 'tamanho': stat.st_size}
+    if com_hash:
+        assinatura['sha256'] = _sha256(caminho)
+    return assinatura
+
+
+class LivroIngestao:
+    """
+    Relatórios já ingeridos, por SHA-256 do conteúdo.
+
+    Use `abrir_livro` para carregar o livro gravado em disco.
+    """
+
+    def __init__(self, caminho, entradas=None):
+        self.caminho = caminho
+        self.entradas = entradas if entradas is not None else {}
+        self._por_caminho = {e['arquivo']: sha for sha, e in self.entradas.items()}
+        self._assinaturas = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def consultar(self, arquivo, tipo=None, chave_presente=None):
+        """
+        Situação do arquivo no livro: (NOVO, None), (INGERIDO, registro) ou
+        (ALTERADO, registro anterior do mesmo caminho).
+
+        Com `tipo` None, vale o registro de qualquer tipo de relatório.
+        `chave_presente(tipo, chave)`, se dado, confere se as chaves do
+        registro ainda estão na base do tipo; se alguma tiver saído (base
+        apagada, reversão), o arquivo volta a ser tratado como novo.
+        """
+        caminho = os.path.abspath(arquivo)
+        stat = os.stat(caminho)
+        with self._lock:
+            anterior = self.entradas.get(self._por_caminho.get(caminho))
+
+        if (anterior is not None and tipo in (None, anterior['tipo'])
+                and (anterior['tamanho'], anterior['mtime_ns']) == (stat.st_size, stat.st_mtime_ns)):
+            entrada = anterior
+        else:
+            assinatura = assinatura_arquivo(caminho)
+            with self._lock:
+                self._assinaturas[caminho] = assinatura
+                entrada = self.entradas.get(assinatura['sha256'])
+            if entrada is None or tipo not in (None, entrada['tipo']):
+                return (ALTERADO, anterior) if anterior is not None else (NOVO, None)
+
+        if chave_presente is not None and not all(chave_presente(entrada['tipo'], chave) for chave in entrada['chaves']):
+            return NOVO, None
+        return INGERIDO, entrada
+
+    def registrar(self, arquivo, tipo, chaves, linhas, status='gravado', ingestao=None):
+        """
+        Registra a ingestão do arquivo (chamar depois de gravar a base);
+        `ingestao` é o número que a base deu às linhas gravadas.
+        """
+        caminho = os.path.abspath(arquivo)
+        with self._lock:
+            assinatura = self._assinaturas.pop(caminho, None)
+        if assinatura is None or assinatura_arquivo(caminho, com_hash=False)['mtime_ns'] != assinatura['mtime_ns']:
+            assinatura = assinatura_arquivo(caminho)
+        entrada = {
+            'arquivo': caminho,
+            'sha256': assinatura['sha256'],
+            'tamanho': assinatura['tamanho'],
+            'mtime_ns': assinatura['mtime_ns'],
+            'tipo': tipo,
+            'chaves': [list(chave) for chave in chaves],
+            'linhas': int(linhas),
+            'status': status,
+            'ingestao': ingestao,
+            'registrado_em': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            self.entradas[entrada['sha256']] = entrada
+            self._por_caminho[caminho] = entrada['sha256']
+        return entrada
+
+    def salvar(self):
+        """Grava o livro em disco."""
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with self._lock:
+            conteudo = {'versao': VERSAO_LIVRO, 'entradas': list(self.entradas.values())}
+            temporario = self.caminho + '.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(conteudo, f, ensure_ascii=False)
+            os.replace(temporario, self.caminho)
+
+
+def abrir_livro(caminho=None) -> LivroIngestao:
+    """Livro de ingestão gravado em `caminho` (vazio se não existir ou for de outra versão)."""
+    if caminho is None:
+        caminho = caminho_livro()
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            conteudo = json.load(f)
+    except (OSError, ValueError):
+        return LivroIngestao(caminho)
+    if conteudo.get('versao') != VERSAO_LIVRO:
+        return LivroIngestao(caminho)
+    return LivroIngestao(caminho, {e['sha256']: e for e in conteudo.get('entradas', [])})
@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from comum.registro import PASTA_BASES
+
+# Cache de layouts (databases/layouts.json): para cada layout de relatório já
+# visto, a linha do cabeçalho da tabela e o mapeamento das colunas resolvido
+# pelas heurísticas do leitor. A chave é a impressão digital do layout: o
+# tipo de relatório, a linha do cabeçalho e o texto de cada célula dela.
+# O topo do relatório (contrato, período, empresa) muda de um arquivo para
+# outro; o cabeçalho da tabela, não.
+#
+# Um leitor confere as linhas de cabeçalho dos layouts conhecidos do tipo na
+# sonda do topo da aba; se uma delas bater, usa o mapeamento guardado e não
+# percorre as linhas nem aplica as heurísticas. Layouts novos são guardados
+# na primeira leitura. Cada processo mantém o cache em memória e só relê o
+# arquivo quando ele muda; a gravação junta o que estiver em disco, então
+# processos de leitura diferentes podem aprender layouts ao mesmo tempo.
+# O cache fica na pasta das bases sendo gravadas: o pipeline de lote chama
+# `usar_pasta_bases` (em cada processo de leitura) antes de ler.
+VERSAO_LAYOUTS = 1
+NOME_LAYOUTS = 'layouts.json'
+
+
+def caminho_layouts(pasta_bases=PASTA_BASES):
+    """Caminho do cache de layouts (databases/layouts.json)."""
+    return os.path.join(pasta_bases, NOME_LAYOUTS)
+
+
+# Arquivo do cache (None desliga o cache)
+CAMINHO_LAYOUTS = caminho_layouts()
+
+_layouts = {}
+_layouts_mtime = None
+_layouts_lock = threading.Lock()
+
+
+def usar_pasta_bases(pasta_bases):
+    """
+    Passa a usar o cache da pasta de bases `pasta_bases`. Com o cache
+    desligado (CAMINHO_LAYOUTS None), continua desligado.
+    """
+    global CAMINHO_LAYOUTS, _layouts, _layouts_mtime
+    caminho = caminho_layouts(pasta_bases)
+    with _layouts_lock:
+        if CAMINHO_LAYOUTS is None or CAMINHO_LAYOUTS == caminho:
+            return
+        CAMINHO_LAYOUTS = caminho
+        _layouts, _layouts_mtime = {}, None
+
+
+def celulas_cabecalho(linha) -> list:
+    """Texto de cada célula da linha, sem as células vazias do fim."""
+    celulas = ['' if pd.isna(valor) else str(valor).strip() for valor in linha]
+    while celulas and not celulas[-1]:
+        celulas.pop()
+    return celulas
+
+
+def impressao_digital(tipo, linha, celulas) -> str:
+    """Impressão digital do layout: tipo, linha do cabeçalho e texto das células."""
+    conteudo = json.dumps([tipo, int(linha), list(celulas)], ensure_ascii=False)
+    return hashlib.sha1(conteudo.encode('utf-8')).hexdigest()
+
+
+def _carregar():
+    """Relê o arquivo do cache se ele mudou desde a última leitura."""
+    global _layouts, _layouts_mtime
+    try:
+        mtime = os.stat(CAMINHO_LAYOUTS).st_mtime_ns
+    except (OSError, TypeError):
+        return
+    if mtime == _layouts_mtime:
+        return
+    try:
+        with open(CAMINHO_LAYOUTS, encoding='utf-8') as f:
+            conteudo = json.load(f)
+    except (OSError, ValueError):
+        return
+    if conteudo.get('versao') == VERSAO_LAYOUTS:
+        _layouts = {e['impressao']: e for e in conteudo.get('layouts', [])}
+    _layouts_mtime = mtime
+
+
+def buscar_layout(tipo, topo: pd.DataFrame):
+    """
+    Layout conhecido do tipo cujo cabeçalho está no topo da aba (sonda com
+    header=None), ou None.
+
+    Retorna o registro guardado: {'linha': linha do cabeçalho, 'colunas':
+    mapeamento das colunas, ...}.
+    """
+    if CAMINHO_LAYOUTS is None:
+        return None
+    with _layouts_lock:
+        _carregar()
+        candidatos = [e for e in _layouts.values() if e['tipo'] == tipo]
+    for entrada in candidatos:
+        linha = entrada['linha']
+        if linha >= len(topo):
+            continue
+        if impressao_digital(tipo, linha, celulas_cabecalho(topo.iloc[linha].tolist())) == entrada['impressao']:
+            return entrada
+    return None
+
+
+def guardar_layout(tipo, topo: pd.DataFrame, linha, colunas: dict):
+    """
+    Guarda o layout do tipo com o cabeçalho na linha `linha` do topo da aba e
+    o mapeamento `colunas` (valores serializáveis em JSON).
+
+    O cache é só um atalho: falhas ao gravar são ignoradas.
+    """
+    global _layouts_mtime
+    if CAMINHO_LAYOUTS is None or linha >= len(topo):
+        return None
+    celulas = celulas_cabecalho(topo.iloc[linha].tolist())
+    entrada = {
+        'impressao': impressao_digital(tipo, linha, celulas),
+        'tipo': tipo,
+        'linha': int(linha),
+        'cabecalho': celulas,
+        'colunas': colunas,
+        'registrado_em': datetime.now().isoformat(timespec='seconds'),
+    }
+    with _layouts_lock:
+        _carregar()
+        _layouts[entrada['impressao']] = entrada
+        try:
+            pasta = os.path.dirname(CAMINHO_LAYOUTS)
+            if pasta:
+                os.makedirs(pasta, exist_ok=True)
+            temporario = f'{CAMINHO_LAYOUTS}.{os.getpid()}.tmp'
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump({'versao': VERSAO_LAYOUTS, 'layouts': list(_layouts.values())}, f, ensure_ascii=False)
+            os.replace(temporario, CAMINHO_LAYOUTS)
+            _layouts_mtime = os.stat(CAMINHO_LAYOUTS).st_mtime_ns
+        except OSError:
+            pass
+    return entrada
+
+
+def colunas_presentes(table: pd.DataFrame, colunas: dict) -> bool:
+    """Confere se todas as colunas mapeadas (exceto as não localizadas) existem na tabela."""
+    return all(col is None or col in table.columns for col in colunas.values())
@@ -0,0 +1,266 @@
+import os
+from collections import OrderedDict
+
+from comum.armazenamento import RECUSAR, abrir_base
+from comum.classificacao import classificar_arquivo
+from comum.duplicidade import formatar_chaves
+from comum.ingestao import ALTERADO, INGERIDO, abrir_livro, caminho_livro
+from comum.layouts import usar_pasta_bases
+from comum.paralelo import gravar_bases, ler_arquivos
+from comum.planilha import liberar_planilha
+from comum.registro import (
+    PASTA_BASES, TIPOS_RELATORIO, caminho_destino, colunas_chave, leitor_em_lotes, modulo_gravacao, validar_arquivo,
+)
+
+# Situações finais de cada arquivo de um lote
+GRAVADO = 'gravado'
+DUPLICADO = 'duplicado'
+VAZIO = 'vazio'
+JA_INGERIDO = 'ingerido'
+INCOMPATIVEL = 'incompativel'
+DESCONHECIDO = 'desconhecido'
+ERRO = 'erro'
+
+# Arquivos a partir deste tamanho são lidos e gravados em lotes (memória
+# constante), quando o tipo tem leitura sob demanda
+LIMITE_FLUXO_BYTES = 20 * 1024 * 1024
+
+
+def listar_arquivos_excel(pasta) -> list:
+    """Arquivos .xls/.xlsx de uma pasta (sem subpastas), em ordem de nome."""
+    try:
+        nomes = sorted(os.listdir(pasta))
+    except OSError:
+        return []
+    return [
+        os.path.join(pasta, nome) for nome in nomes
+        if nome.lower().endswith(('.xls', '.xlsx')) and os.path.isfile(os.path.join(pasta, nome))
+    ]
+
+
+def processar_arquivos(
+    arquivos, tipo=None, pasta_bases=PASTA_BASES, processos=None, log=print, progresso=None, politica=RECUSAR,
+):
+    """
+    Processa um lote de relatórios até as bases de destino.
+
+    1. arquivos já ingeridos (livro de ingestão) são ignorados sem leitura;
+    2. relatórios grandes (LIMITE_FLUXO_BYTES) de tipos com leitura sob
+       demanda são lidos e gravados em lotes, com memória constante;
+    3. os demais são lidos em paralelo; com `tipo` None, cada arquivo tem o
+       tipo identificado pela assinatura e vai para a base do seu tipo;
+    4. cada base recebe uma única gravação, com as bases gravadas em paralelo;
+    5. o resultado de cada arquivo é registrado no livro.
+
+    Chaves (contrato + competência) que já estão na base seguem a `politica`
+    (comum.armazenamento): RECUSAR recusa o arquivo inteiro,
+    IGNORAR_EXISTENTES grava só as chaves novas e SUBSTITUIR troca as linhas
+    gravadas pelas do arquivo (relatório reemitido).
+
+    `log(mensagem)` recebe as mensagens de andamento e `progresso(fração)`,
+    se dado, o avanço de 0 a 1. Retorna um dicionário por arquivo, na ordem
+    de `arquivos`, com 'arquivo', 'tipo', 'status' (GRAVADO, DUPLICADO,
+    VAZIO, JA_INGERIDO, INCOMPATIVEL, DESCONHECIDO ou ERRO), 'linhas',
+    'linhas_lidas', 'chaves', 'ignoradas', 'substituidas', 'ingestao'
+    (número da ingestão na base, se gravado; ver `desfazer_ingestao`),
+    'avisos', 'segundos' (ver comum.armazenamento.resultado_arquivo) e
+    'mensagem'.
+    """
+    def avancar(fracao):
+        if progresso is not None:
+            progresso(fracao)
+
+    resultados = OrderedDict(
+        (arquivo, {
+            'arquivo': arquivo, 'tipo': tipo, 'status': None, 'linhas': 0, 'linhas_lidas': 0, 'chaves': [],
+            'ignoradas': [], 'substituidas': [], 'ingestao': None, 'avisos': [], 'segundos': {}, 'mensagem': '',
+        })
+        for arquivo in arquivos
+    )
+
+    # 1. Arquivos já ingeridos não são lidos de novo
+    livro = abrir_livro(caminho_livro(pasta_bases))
+    bases = {}
+
+    def chave_presente(tipo_base, chave):
+        if tipo_base not in bases:
+            bases[tipo_base] = abrir_base(caminho_destino(tipo_base, pasta_bases), colunas_chave(tipo_base))
+        return bases[tipo_base].contem(*chave)
+
+    pendentes = []
+    for arquivo, resultado in resultados.items():
+        nome_base = os.path.basename(arquivo)
+        try:
+            situacao, entrada = livro.consultar(arquivo, tipo, chave_presente)
+        except OSError as erro:
+            resultado.update(status=ERRO, mensagem=str(erro))
+            log(f"❌ {nome_base}: {erro}")
+            continue
+        if situacao == INGERIDO:
+            resultado.update(status=JA_INGERIDO, tipo=entrada['tipo'], linhas=entrada['linhas'], chaves=entrada['chaves'])
+            log(f"⏭️ {nome_base}: já ingerido em {entrada['registrado_em']}, ignorado")
+            continue
+        if situacao == ALTERADO:
+            log(f"⚠️ {nome_base}: alterado desde a ingestão de {entrada['registrado_em']}, será processado novamente")
+        pendentes.append(arquivo)
+
+    # 2. Relatórios grandes: lidos e gravados em lotes, um de cada vez (o
+    # cache de layouts é o da pasta das bases, aqui e nos processos de leitura)
+    usar_pasta_bases(pasta_bases)
+    grandes = [arquivo for arquivo in pendentes if os.path.getsize(arquivo) >= LIMITE_FLUXO_BYTES]
+    em_fluxo = OrderedDict()
+    for arquivo in grandes:
+        tipo_arquivo = _tipo_para_fluxo(arquivo, tipo)
+        if tipo_arquivo is not None:
+            pendentes.remove(arquivo)
+            em_fluxo.setdefault(tipo_arquivo, []).append(arquivo)
+    for tipo_base, itens in em_fluxo.items():
+        destino = caminho_destino(tipo_base, pasta_bases)
+        os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+        gravacao = modulo_gravacao(tipo_base)
+        for arquivo in itens:
+            resultado = resultados[arquivo]
+            resultado['tipo'] = tipo_base
+            log(f"📥 {os.path.basename(arquivo)}: arquivo grande, lendo e gravando em lotes em {destino}...")
+            try:
+                gravado = gravacao.gravar_em_lotes(
+                    destino, leitor_em_lotes(tipo_base)(arquivo), arquivo, materializar=False, politica=politica,
+                )
+            except Exception as erro:
+                resultado.update(status=ERRO, mensagem=str(erro))
+                log(f"❌ Erro ao processar {os.path.basename(arquivo)}: {erro}")
+                continue
+            resultado.update(_campos_gravados(gravado))
+
+    # 3. Leitura dos demais em paralelo (pool de processos)
+    lotes = OrderedDict()
+    if pendentes:
+        log(f"Lendo {len(pendentes)} arquivo(s) em paralelo...")
+    for indice, lido in enumerate(ler_arquivos(tipo, pendentes, processos, pasta_bases), start=1):
+        resultado = resultados[lido['arquivo']]
+        resultado['tipo'] = lido['tipo']
+        nome_base = os.path.basename(lido['arquivo'])
+        prefixo = f"[{indice}/{len(pendentes)}]"
+        avancar(0.8 * indice / len(pendentes))
+
+        if lido['status'] != 'lido':
+            resultado.update(status=lido['status'], mensagem=lido['mensagem'])
+            if lido['status'] == INCOMPATIVEL:
+                log(f"{prefixo} Arquivo incompativel: {lido['mensagem']}")
+            elif lido['status'] == DESCONHECIDO:
+                log(f"{prefixo} {nome_base}: {lido['mensagem']}, ignorado")
+            else:
+                log(f"{prefixo} Erro ao ler {nome_base}: {lido['mensagem']}")
+            continue
+        if lido['mensagem']:
+            log(f"{prefixo} Aviso: {lido['mensagem']}")
+
+        dados = lido['dados']
+        quantidade = 0 if dados is None else len(dados)
+        rotulo = TIPOS_RELATORIO[lido['tipo']]['rotulo'].lower()
+        log(f"{prefixo} {quantidade} registros de {rotulo} lidos de {nome_base}")
+        lotes.setdefault(lido['tipo'], []).append((lido['arquivo'], dados))
+
+    # 4. Uma gravação por base de destino, bases em paralelo (a planilha das
+    # bases que só receberam relatórios grandes é regerada aqui)
+    for tipo_base in em_fluxo:
+        if tipo_base not in lotes:
+            modulo_gravacao(tipo_base).materializar_excel(caminho_destino(tipo_base, pasta_bases))
+    for tipo_base, itens in lotes.items():
+        destino = caminho_destino(tipo_base, pasta_bases)
+        os.makedirs(os.path.dirname(destino) or '.', exist_ok=True)
+        log(f"💾 Gravando {len(itens)} arquivo(s) em {destino}...")
+    avancar(0.9)
+    for tipo_base, gravados, erro in gravar_bases(lotes, pasta_bases, processos, politica):
+        if erro is not None:
+            log(f"❌ Erro ao gravar {caminho_destino(tipo_base, pasta_bases)}: {erro}")
+            for arquivo, _ in lotes[tipo_base]:
+                resultados[arquivo].update(status=ERRO, mensagem=str(erro))
+            continue
+        for gravado in gravados:
+            resultados[gravado['arquivo']].update(_campos_gravados(gravado))
+
+    # 5. Resultado de cada arquivo, registrado no livro de ingestão
+    registrados = False
+    for resultado in resultados.values():
+        if resultado['status'] not in (GRAVADO, DUPLICADO, VAZIO):
+            continue
+        nome_base = os.path.basename(resultado['arquivo'])
+        for aviso in resultado['avisos']:
+            log(f"⚠️ {nome_base}: {aviso}")
+        if resultado['status'] == GRAVADO:
+            log(f"✅ {nome_base}: {resultado['linhas']} registros gravados (ingestão {resultado['ingestao']})")
+            if resultado['ignoradas']:
+                log(f"⚠️ {nome_base}: dados já existentes mantidos para {formatar_chaves(resultado['ignoradas'])}")
+            if resultado['substituidas']:
+                log(f"♻️ {nome_base}: dados substituídos para {formatar_chaves(resultado['substituidas'])}")
+        elif resultado['status'] == DUPLICADO:
+            log(
+                f"🛡️ {nome_base}: Dados já existentes para os contratos/competências: "
+                f"{formatar_chaves(resultado['chaves'])}. Nenhum dado foi adicionado."
+            )
+        else:
+            log(f"⚠️ {nome_base}: nenhum dado encontrado no arquivo")
+            continue
+        livro.registrar(
+            resultado['arquivo'], resultado['tipo'], resultado['chaves'], resultado['linhas'], resultado['status'],
+            resultado['ingestao'],
+        )
+        registrados = True
+    if registrados:
+        livro.salvar()
+
+    avancar(1.0)
+    return list(resultados.values())
+
+
+def _campos_gravados(gravado):
+    """Campos do resultado de `gravar_lote`/`gravar_em_lotes` copiados para o resultado do arquivo."""
+    campos = ('status', 'linhas', 'linhas_lidas', 'chaves', 'ignoradas', 'substituidas', 'ingestao', 'avisos', 'segundos')
+    return {campo: gravado[campo] for campo in campos}
+
+
+def _tipo_para_fluxo(arquivo, tipo):
+    """
+    Tipo do relatório grande, se ele puder ser lido em lotes; senão None
+    (o arquivo segue pela leitura normal, que também valida/classifica).
+    """
+    try:
+        if tipo is None:
+            tipo = classificar_arquivo(arquivo)['tipo']
+        elif not validar_arquivo(arquivo, tipo)[0]:
+            return None
+    except Exception:
+        return None
+    finally:
+        liberar_planilha(arquivo)
+    if tipo is None or leitor_em_lotes(tipo) is None:
+        return None
+    return tipo
+
+
+def listar_ingestoes(tipo, pasta_bases=PASTA_BASES) -> list:
+    """Ingestões da base do tipo, da mais antiga à mais recente (ver BaseParticionada.ingestoes)."""
+    return abrir_base(caminho_destino(tipo, pasta_bases), colunas_chave(tipo)).ingestoes()
+
+
+def desfazer_ingestao(tipo, ingestao, pasta_bases=PASTA_BASES, log=print) -> int:
+    """
+    Retira da base do tipo as linhas gravadas pela ingestão `ingestao` (o
+    número da coluna 'ingestao' da planilha, também registrado no livro) e
+    regera a planilha. Só as partições da ingestão saem; as demais não são
+    reescritas. Retorna quantas linhas saíram.
+    """
+    destino = caminho_destino(tipo, pasta_bases)
+    linhas = abrir_base(destino, colunas_chave(tipo)).desfazer_ingestao(ingestao)
+    modulo_gravacao(tipo).materializar_excel(destino)
+    log(f"↩️ Ingestão {ingestao} desfeita em {destino}: {linhas} registro(s) removido(s)")
+    return linhas
+
+
+def contar_situacoes(resultados) -> dict:
+    """Quantidade de arquivos em cada situação."""
+    contagem = {}
+    for resultado in resultados:
+        contagem[resultado['status']] = contagem.get(resultado['status'], 0) + 1
+    return contagem
@@ -0,0 +1,256 @@
+import importlib
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import groupby, repeat
+
+from comum.armazenamento import RECUSAR
+from comum.classificacao import classificar_arquivo
+from comum.layouts import usar_pasta_bases
+from comum.memoria import concatenar
+from comum.planilha import liberar_planilha, nomes_abas
+from comum.registro import PASTA_BASES, TIPOS_RELATORIO, caminho_destino, leitor, modulo_gravacao, validar_arquivo
+
+# Leitura dos relatórios em processos separados.
+#
+# Interpretar um Excel com pandas ocupa um núcleo inteiro e não libera o GIL,
+# então uma pasta com dezenas de relatórios é lida em paralelo num pool de
+# processos; relatórios consolidados (um contrato por aba) têm cada aba lida
+# numa tarefa separada. O pool é criado uma vez e reaproveitado entre
+# execuções; cada processo já sobe com pandas e os leitores de todos os tipos
+# importados.
+# Os DataFrames voltam ao processo principal, que define a ordem de gravação
+# (a dos arquivos, não a de término). Cada base de destino tem um único
+# gravador; bases diferentes são arquivos independentes e, numa pasta com
+# vários tipos de relatório, são gravadas ao mesmo tempo no mesmo pool.
+
+# Processos de leitura (None = um por núcleo)
+PROCESSOS_LEITURA = None
+
+_pool = None
+_pool_processos = None
+_pool_lock = threading.Lock()
+
+
+def _iniciar_processo():
+    """Pré-importa pandas e os leitores no processo recém-criado."""
+    # Ctrl+C no terminal chega a todo o grupo de processos: quem decide parar
+    # é o processo principal, e uma base não fica gravada pela metade
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import pandas  # noqa: F401
+    for tipo in TIPOS_RELATORIO:
+        importlib.import_module(f'{tipo}.ler_excel')
+
+
+def _processos(processos):
+    if processos is None:
+        processos = PROCESSOS_LEITURA
+    return max(1, processos or os.cpu_count() or 1)
+
+
+def obter_pool(processos=None):
+    """Pool de leitura, criado na primeira chamada e mantido para as próximas."""
+    global _pool, _pool_processos
+    processos = _processos(processos)
+    with _pool_lock:
+        if _pool is not None and _pool_processos != processos:
+            _pool.shutdown(wait=False)
+            _pool = None
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo)
+            _pool_processos = processos
+        return _pool
+
+
+def aquecer_pool(processos=None):
+    """Sobe todos os processos do pool agora, para a primeira pasta não esperar por eles."""
+    pool = obter_pool(processos)
+    for futuro in [pool.submit(os.getpid) for _ in range(_processos(processos))]:
+        futuro.result()
+
+
+def encerrar_pool():
+    """Encerra o pool (ao fechar o programa)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def ler_arquivo(tipo, arquivo, aba=None, pasta_bases=PASTA_BASES, identificado=None):
+    """
+    Valida e lê um relatório (ou só a aba `aba` dele).
+
+    Com `tipo` None, o tipo é identificado pela assinatura do relatório;
+    `identificado` é o tipo já encontrado pela classificação (ler_arquivos),
+    que então não é refeita. O cache de layouts usado é o da pasta
+    `pasta_bases` (comum.layouts).
+    Retorna um dicionário com 'arquivo', 'tipo', 'status' ('lido',
+    'incompativel', 'desconhecido' ou 'erro', inclusive quando o leitor
+    devolve None), 'dados' (DataFrame ou None) e 'mensagem' (aviso da
+    validação, da classificação ou o erro de leitura).
+    """
+    usar_pasta_bases(pasta_bases)
+    if identificado is not None:
+        tipo, mensagem = identificado, ""
+    elif tipo is None:
+        try:
+            classificacao = classificar_arquivo(arquivo)
+        except Exception as erro:
+            return {'arquivo': arquivo, 'tipo': None, 'status': 'erro', 'dados': None, 'mensagem': str(erro)}
+        tipo = classificacao['tipo']
+        if tipo is None:
+            mensagem = f"Tipo de relatório não reconhecido (confiança {round(classificacao['confianca'] * 100)}%)"
+            return {'arquivo': arquivo, 'tipo': None, 'status': 'desconhecido', 'dados': None, 'mensagem': mensagem}
+        mensagem = ""
+    else:
+        aceito, mensagem = validar_arquivo(arquivo, tipo)
+        if not aceito:
+            return {'arquivo': arquivo, 'tipo': tipo, 'status': 'incompativel', 'dados': None, 'mensagem': mensagem}
+    try:
+        dados = leitor(tipo)(arquivo) if aba is None else leitor(tipo)(arquivo, abas=[aba])
+    except Exception as erro:
+        return {'arquivo': arquivo, 'tipo': tipo, 'status': 'erro', 'dados': None, 'mensagem': str(erro)}
+    if dados is None:
+        # Os leitores imprimem o erro e devolvem None (arquivo corrompido,
+        # formato inesperado): é falha de leitura, não relatório sem dados
+        falha = "O leitor não conseguiu ler o arquivo (veja as mensagens da leitura)"
+        mensagem = f"{falha}. {mensagem}" if mensagem else falha
+        return {'arquivo': arquivo, 'tipo': tipo, 'status': 'erro', 'dados': None, 'mensagem': mensagem}
+    return {'arquivo': arquivo, 'tipo': tipo, 'status': 'lido', 'dados': dados, 'mensagem': mensagem}
+
+
+def _tarefas_do_arquivo(tipo, arquivo):
+    """
+    Tarefas de leitura do arquivo, pares (aba, tipo identificado): uma por
+    aba, ou [(None, ...)] para ler o arquivo inteiro numa tarefa só (tipo
+    que não lê aba a aba, arquivo de uma aba ou .xls).
+
+    Só .xlsx é dividido: o openpyxl em modo read_only interpreta apenas a
+    aba pedida por cada tarefa, enquanto o xlrd interpreta a pasta inteira
+    ao abrir um .xls, o que se repetiria em todas as tarefas.
+
+    O tipo identificado vai para a tarefa, que então não classifica nem
+    valida o arquivo de novo. Com `tipo` dado, só a tarefa da primeira aba
+    valida o arquivo (uma recusa dela vale para o arquivo, ver
+    `_juntar_abas`). Com `tipo` None, um .xlsx de várias abas é classificado
+    aqui (só o topo das primeiras abas) para saber se o tipo dele lê aba a
+    aba; nos demais arquivos a leitura faz a classificação.
+    """
+    if arquivo.lower().endswith('.xls'):
+        return [(None, None)]
+    if tipo is not None and not hasattr(importlib.import_module(f'{tipo}.ler_excel'), 'ler_abas'):
+        return [(None, None)]
+    try:
+        abas = nomes_abas(arquivo)
+    except Exception:
+        return [(None, None)]
+    if len(abas) < 2:
+        return [(None, None)]
+    if tipo is not None:
+        return [(abas[0], None)] + [(aba, tipo) for aba in abas[1:]]
+    try:
+        identificado = classificar_arquivo(arquivo)['tipo']
+    except Exception:
+        return [(None, None)]
+    finally:
+        liberar_planilha(arquivo)
+    if identificado is None:
+        return [(None, None)]
+    if not hasattr(importlib.import_module(f'{identificado}.ler_excel'), 'ler_abas'):
+        return [(None, identificado)]
+    return [(aba, identificado) for aba in abas]
+
+
+def _juntar_abas(partes):
+    """Resultado do arquivo a partir dos resultados de cada aba, na ordem das abas."""
+    if len(partes) == 1:
+        return partes[0]
+    falha = next((parte for parte in partes if parte['status'] != 'lido'), None)
+    if falha is not None:
+        return falha
+    dados = [parte['dados'] for parte in partes if parte['dados'] is not None and len(parte['dados']) > 0]
+    resultado = dict(partes[0])
+    resultado['dados'] = concatenar(dados) if dados else partes[0]['dados']
+    return resultado
+
+
+def ler_arquivos(tipo, arquivos, processos=None, pasta_bases=PASTA_BASES):
+    """
+    Lê os relatórios em paralelo, devolvendo os resultados de `ler_arquivo`
+    na ordem de `arquivos`, à medida que ficam prontos.
+
+    Arquivos .xlsx com várias abas (relatórios consolidados, um contrato por
+    aba) de tipos que leem aba a aba têm cada aba lida numa tarefa separada
+    (ver `_tarefas_do_arquivo`).
+    Com um único processo (ou um único arquivo de uma aba) a leitura é feita
+    no próprio processo. Se o pool quebrar (processo morto pelo sistema, por
+    exemplo), os arquivos restantes são lidos sequencialmente.
+    """
+    global _pool
+    arquivos = list(arquivos)
+    if _processos(processos) == 1 or not arquivos:
+        for arquivo in arquivos:
+            yield ler_arquivo(tipo, arquivo, pasta_bases=pasta_bases)
+        return
+
+    tarefas = [
+        (arquivo, aba, identificado) for arquivo in arquivos for aba, identificado in _tarefas_do_arquivo(tipo, arquivo)
+    ]
+    if len(tarefas) < 2:
+        yield ler_arquivo(tipo, arquivos[0], pasta_bases=pasta_bases, identificado=tarefas[0][2])
+        return
+
+    entregues = 0
+    try:
+        resultados = obter_pool(processos).map(
+            ler_arquivo, repeat(tipo), [arquivo for arquivo, _, _ in tarefas], [aba for _, aba, _ in tarefas],
+            repeat(pasta_bases), [identificado for _, _, identificado in tarefas],
+        )
+        por_tarefa = zip(tarefas, resultados)
+        for _, grupo in groupby(por_tarefa, key=lambda item: item[0][0]):
+            yield _juntar_abas([resultado for _, resultado in grupo])
+            entregues += 1
+    except BrokenProcessPool:
+        with _pool_lock:
+            _pool = None
+        for arquivo in arquivos[entregues:]:
+            yield ler_arquivo(tipo, arquivo, pasta_bases=pasta_bases)
+
+
+def gravar_base(tipo, caminho_base, lotes, politica=RECUSAR):
+    """Grava os lotes de um tipo na sua base (`gravar_lote` do append_excel do tipo)."""
+    return modulo_gravacao(tipo).gravar_lote(caminho_base, lotes, politica)
+
+
+def gravar_bases(lotes_por_tipo, pasta_bases, processos=None, politica=RECUSAR):
+    """
+    Grava cada tipo na sua base, com as bases gravadas em paralelo.
+
+    `lotes_por_tipo` mapeia tipo -> lista de (arquivo, DataFrame) na ordem de
+    gravação; as chaves já gravadas seguem a `politica` (comum.armazenamento).
+    Devolve, na ordem de `lotes_por_tipo`, os trios (tipo, resultados de
+    `gravar_lote`, erro ou None).
+    """
+    tipos = list(lotes_por_tipo)
+    if _processos(processos) == 1 or len(tipos) < 2:
+        for tipo in tipos:
+            try:
+                yield tipo, gravar_base(tipo, caminho_destino(tipo, pasta_bases), lotes_por_tipo[tipo], politica), None
+            except Exception as erro:
+                yield tipo, [], erro
+        return
+
+    pool = obter_pool(processos)
+    futuros = [
+        (tipo, pool.submit(gravar_base, tipo, caminho_destino(tipo, pasta_bases), lotes_por_tipo[tipo], politica))
+        for tipo in tipos
+    ]
+    for tipo, futuro in futuros:
+        try:
+            yield tipo, futuro.result(), None
+        except Exception as erro:
+            yield tipo, [], erro
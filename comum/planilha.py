@@ -0,0 +1,254 @@
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import xlrd
+from openpyxl import load_workbook
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+
+# Quantidade de arquivos mantidos já interpretados em memória.
+# Validação, checagem do tipo e leitura do mesmo arquivo acontecem em
+# sequência, então poucos itens bastam para que todas reaproveitem a leitura.
+MAX_PLANILHAS_EM_CACHE = 2
+
+# Linhas do topo da aba lidas para os metadados (contrato, período); cobre
+# as células de todos os layouts e a sonda usada na classificação do tipo
+LINHAS_METADADOS = 20
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class PastaTrabalho:
+    """
+    Arquivo Excel (.xls/.xlsx) lido do disco uma única vez.
+
+    Metadados e cabeçalhos saem de uma sonda com as primeiras linhas da aba;
+    a tabela de dados é interpretada à parte, só a partir da sua linha de
+    cabeçalho e, nos layouts posicionais, só com as colunas extraídas. A aba
+    inteira (header=None) só é montada quando pedida por `folha`, e aí
+    sondas, células e tabelas passam a ser derivadas dela.
+    """
+
+    def __init__(self, caminho_arquivo):
+        self.caminho = caminho_arquivo
+        with open(caminho_arquivo, 'rb') as f:
+            self.conteudo = f.read()
+        self._xl = pd.ExcelFile(io.BytesIO(self.conteudo))
+        self.sheet_names = list(self._xl.sheet_names)
+        self._folhas = {}
+        self._sondas = {}
+        self._lock = threading.Lock()
+
+    def _nome_aba(self, sheet_name):
+        if isinstance(sheet_name, int):
+            return self.sheet_names[sheet_name]
+        return sheet_name
+
+    def folha(self, sheet_name=0):
+        """
+        Retorna a aba inteira como DataFrame sem cabeçalho, equivalente a
+        pd.read_excel(caminho, sheet_name=sheet_name, header=None).
+        """
+        sheet_name = self._nome_aba(sheet_name)
+        with self._lock:
+            if sheet_name not in self._folhas:
+                self._folhas[sheet_name] = self._xl.parse(sheet_name, header=None)
+            return self._folhas[sheet_name]
+
+    def sonda(self, sheet_name=0, nrows=15):
+        """
+        Primeiras `nrows` linhas da aba (para detecção de tipo/cabeçalho).
+
+        Se a aba ainda não foi interpretada, só essas linhas são lidas.
+        """
+        sheet_name = self._nome_aba(sheet_name)
+        with self._lock:
+            if sheet_name in self._folhas:
+                return self._folhas[sheet_name].head(nrows)
+            if self._sondas.get(sheet_name, (0, None))[0] < nrows:
+                self._sondas[sheet_name] = (nrows, self._xl.parse(sheet_name, header=None, nrows=nrows))
+            return self._sondas[sheet_name][1].head(nrows)
+
+    def celula(self, sheet_name, linha, coluna):
+        """
+        Valor da célula na posição (linha, coluna) da aba, base zero; NaN se
+        a célula estiver fora da aba.
+
+        Células de metadados (contrato, período) ficam nas primeiras linhas:
+        são lidas da sonda, sem interpretar a aba inteira.
+        """
+        sheet_name = self._nome_aba(sheet_name)
+        with self._lock:
+            bruto = self._folhas.get(sheet_name)
+        if bruto is None:
+            bruto = self.sonda(sheet_name, nrows=max(linha + 1, LINHAS_METADADOS))
+        if linha >= bruto.shape[0] or coluna >= bruto.shape[1]:
+            return np.nan
+        return bruto.iat[linha, coluna]
+
+    def tabela(self, sheet_name=0, header=0):
+        """
+        Tabela de dados cujo cabeçalho está na linha `header` da aba.
+
+        Equivale a pd.read_excel(caminho, sheet_name=..., header=header) e
+        também a pd.read_excel(..., skiprows=header): os nomes de coluna vêm da
+        linha indicada ("Unnamed: n" para vazias, ".1" para repetidas) e os
+        tipos das colunas são inferidos apenas a partir das linhas de dados.
+        As linhas acima do cabeçalho não são interpretadas.
+        """
+        sheet_name = self._nome_aba(sheet_name)
+        with self._lock:
+            bruto = self._folhas.get(sheet_name)
+        if bruto is None:
+            try:
+                return self._xl.parse(sheet_name, header=0, skiprows=header)
+            except EmptyDataError:
+                return pd.DataFrame()
+        if header >= len(bruto):
+            return pd.DataFrame()
+        linhas = bruto.iloc[header:].values.tolist()
+        linhas[0] = ['' if pd.isna(v) else v for v in linhas[0]]
+        return TextParser(linhas, header=0, skip_blank_lines=False).read()
+
+    def colunas(self, sheet_name, inicio, colunas):
+        """
+        Linhas da aba a partir de `inicio` (base zero), só com as colunas de
+        posição `colunas` (None: todas), sem cabeçalho.
+
+        As colunas são rotuladas pela posição na planilha (coluna 6 é
+        `tabela[6]`); posições além da última coluna da aba vêm vazias. Só as
+        colunas pedidas são convertidas em DataFrame, com os tipos inferidos
+        a partir das linhas de dados, como em `tabela`.
+        """
+        if colunas is not None:
+            colunas = sorted(set(colunas))
+            pedidas = set(colunas)
+        sheet_name = self._nome_aba(sheet_name)
+        with self._lock:
+            bruto = self._folhas.get(sheet_name)
+        if bruto is not None:
+            bruto = bruto.iloc[inicio:]
+            if colunas is not None:
+                bruto = bruto.reindex(columns=colunas)
+            linhas = bruto.values.tolist()
+            dados = TextParser(linhas, header=None, skip_blank_lines=False).read() if linhas else pd.DataFrame()
+            dados.columns = list(bruto.columns)[:dados.shape[1]]
+        else:
+            try:
+                dados = self._xl.parse(
+                    sheet_name, header=None, skiprows=inicio,
+                    usecols=None if colunas is None else (lambda c: c in pedidas),
+                )
+            except EmptyDataError:
+                dados = pd.DataFrame()
+        return dados if colunas is None else dados.reindex(columns=colunas)
+
+
+def abrir_planilha(caminho_arquivo):
+    """
+    Retorna a PastaTrabalho do arquivo, reaproveitando a leitura anterior
+    enquanto o arquivo não tiver sido alterado (mesmo mtime e tamanho).
+    """
+    chave = os.path.abspath(caminho_arquivo)
+    stat = os.stat(caminho_arquivo)
+    assinatura = (stat.st_mtime_ns, stat.st_size)
+
+    with _cache_lock:
+        item = _cache.get(chave)
+        if item is not None and item[0] == assinatura:
+            _cache.move_to_end(chave)
+            return item[1]
+
+    pasta = PastaTrabalho(caminho_arquivo)
+
+    with _cache_lock:
+        _cache[chave] = (assinatura, pasta)
+        _cache.move_to_end(chave)
+        while len(_cache) > MAX_PLANILHAS_EM_CACHE:
+            _cache.popitem(last=False)
+    return pasta
+
+
+def liberar_planilha(caminho_arquivo=None):
+    """Remove o arquivo (ou todos, se omitido) do cache de planilhas abertas."""
+    with _cache_lock:
+        if caminho_arquivo is None:
+            _cache.clear()
+        else:
+            _cache.pop(os.path.abspath(caminho_arquivo), None)
+
+
+def _linhas_xlsx(caminho_arquivo, sheet_name):
+    wb = load_workbook(caminho_arquivo, read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[sheet_name] if isinstance(sheet_name, int) else wb[sheet_name]
+        for linha in ws.iter_rows(values_only=True):
+            yield linha
+    finally:
+        wb.close()
+
+
+def _valor_xls(celula, datemode):
+    if celula.ctype in (xlrd.XL_CELL_EMPTY, xlrd.XL_CELL_BLANK):
+        return None
+    if celula.ctype == xlrd.XL_CELL_NUMBER:
+        return int(celula.value) if float(celula.value).is_integer() else celula.value
+    if celula.ctype == xlrd.XL_CELL_DATE:
+        return xlrd.xldate_as_datetime(celula.value, datemode)
+    if celula.ctype == xlrd.XL_CELL_BOOLEAN:
+        return bool(celula.value)
+    if celula.ctype == xlrd.XL_CELL_ERROR:
+        return None
+    return celula.value
+
+
+def _linhas_xls(caminho_arquivo, sheet_name):
+    book = xlrd.open_workbook(caminho_arquivo, on_demand=True)
+    try:
+        sheet = book.sheet_by_index(sheet_name) if isinstance(sheet_name, int) else book.sheet_by_name(sheet_name)
+        for r in range(sheet.nrows):
+            yield tuple(_valor_xls(celula, book.datemode) for celula in sheet.row(r))
+    finally:
+        book.release_resources()
+
+
+def iterar_linhas(caminho_arquivo, sheet_name=0):
+    """
+    Linhas da aba (tuplas com o valor de cada célula, None quando vazia), lidas
+    sob demanda, sem montar a aba inteira em memória.
+
+    .xlsx é lido com openpyxl em modo read_only (uma linha por vez); .xls com
+    xlrd on_demand, que carrega apenas a aba pedida (o formato .xls é
+    limitado a 65.536 linhas por aba).
+    """
+    if caminho_arquivo.lower().endswith('.xls'):
+        return _linhas_xls(caminho_arquivo, sheet_name)
+    return _linhas_xlsx(caminho_arquivo, sheet_name)
+
+
+def nomes_abas(caminho_arquivo):
+    """Nomes das abas do arquivo, sem ler o conteúdo delas."""
+    if caminho_arquivo.lower().endswith('.xls'):
+        book = xlrd.open_workbook(caminho_arquivo, on_demand=True)
+        try:
+            return list(book.sheet_names())
+        finally:
+            book.release_resources()
+
+    wb = load_workbook(caminho_arquivo, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def celula_da_linha(linhas, linha, coluna):
+    """Valor da célula (linha, coluna) em linhas lidas por `iterar_linhas`; NaN se não existir."""
+    if linha >= len(linhas) or coluna >= len(linhas[linha]) or linhas[linha][coluna] is None:
+        return float('nan')
+    return linhas[linha][coluna]
@@ -0,0 +1,87 @@
+import importlib
+import os
+import unicodedata
+
+from comum.classificacao import classificar_arquivo
+from comum.duplicidade import CHAVE_PADRAO
+
+# Tipos de relatório suportados. Cada tipo é um pacote com ler_excel.read_excel
+# e append_excel (append_to_excel_formatado, gravar_lote, materializar_excel);
+# 'arquivo' é a base de destino dentro da pasta de bases (databases/) e
+# 'prefixo' identifica o tipo pelo nome escolhido na interface.
+TIPOS_RELATORIO = {
+    'beneficiarios': {'rotulo': 'Beneficiários', 'arquivo': 'despesas.xlsx', 'prefixo': 'benefici'},
+    'prestadores': {'rotulo': 'Prestadores', 'arquivo': 'prestadores.xlsx', 'prefixo': 'prestad'},
+    'procedimentos': {'rotulo': 'Procedimentos', 'arquivo': 'procedimentos.xlsx', 'prefixo': 'proced'},
+    'consultas': {'rotulo': 'Consultas', 'arquivo': 'consultas.xlsx', 'prefixo': 'consult'},
+    'diagnosticos': {'rotulo': 'Diagnósticos', 'arquivo': 'diagnosticos.xlsx', 'prefixo': 'diagn'},
+    'exames': {'rotulo': 'Exames', 'arquivo': 'exames.xlsx', 'prefixo': 'exame'},
+    'terapias': {'rotulo': 'Terapias', 'arquivo': 'terapias.xlsx', 'prefixo': 'terap'},
+    'sinistralidade': {'rotulo': 'Sinistralidade', 'arquivo': 'sinistralidade.xlsx', 'prefixo': 'sinistr'},
+}
+
+PASTA_BASES = 'databases'
+
+
+def identificar_tipo(nome):
+    """
+    Tipo de relatório correspondente ao nome dado ("Beneficiário",
+    "exames", "Diagn?sticos"...), ou None se não for reconhecido.
+    """
+    texto = unicodedata.normalize('NFKD', str(nome))
+    texto = ''.join(ch for ch in texto if not unicodedata.combining(ch)).strip().lower()
+    for tipo, info in TIPOS_RELATORIO.items():
+        if texto.startswith(info['prefixo']):
+            return tipo
+    return None
+
+
+def caminho_destino(tipo, pasta_bases=PASTA_BASES):
+    """Caminho da base de destino do tipo (ex.: databases/despesas.xlsx)."""
+    return os.path.join(pasta_bases, TIPOS_RELATORIO[tipo]['arquivo'])
+
+
+def colunas_chave(tipo):
+    """Colunas da chave de duplicidade da base do tipo."""
+    return getattr(modulo_gravacao(tipo), 'CHAVE', CHAVE_PADRAO)
+
+
+def leitor(tipo):
+    """Função read_excel do tipo."""
+    return importlib.import_module(f'{tipo}.ler_excel').read_excel
+
+
+def leitor_em_lotes(tipo):
+    """Função ler_em_lotes do tipo (leitura sob demanda), ou None se o tipo não tiver."""
+    return getattr(importlib.import_module(f'{tipo}.ler_excel'), 'ler_em_lotes', None)
+
+
+def modulo_gravacao(tipo):
+    """Módulo append_excel do tipo."""
+    return importlib.import_module(f'{tipo}.append_excel')
+
+
+def validar_arquivo(arquivo, tipo):
+    """
+    Confere, pela assinatura do relatório, se o arquivo é do tipo.
+
+    Retorna (aceito, mensagem). O arquivo é recusado apenas quando a
+    classificação aponta com confiança outro tipo; sem confiança suficiente
+    ou sem conseguir ler o arquivo, ele é aceito com um aviso.
+    """
+    if tipo is None:
+        return True, ""
+    try:
+        classificacao = classificar_arquivo(arquivo)
+    except Exception as e:
+        return True, f"⚠️ Não foi possível validar o tipo do arquivo: {str(e)}"
+    encontrado = classificacao['tipo']
+    if encontrado == tipo:
+        return True, ""
+    if encontrado is None:
+        return True, "⚠️ Não foi possível reconhecer o tipo do relatório pelas primeiras linhas."
+    confianca = round(classificacao['confianca'] * 100)
+    return False, (
+        f"O arquivo parece ser um relatório de {TIPOS_RELATORIO[encontrado]['rotulo'].lower()} "
+        f"(confiança {confianca}%), não de {TIPOS_RELATORIO[tipo]['rotulo'].lower()}."
+    )
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+# Valores monetários em centavos e percentuais em pontos-base.
+#
+# Com VALORES_INTEIROS, as colunas de dinheiro das bases são gravadas (e
+# lidas) como inteiros de centavos (Int64) e as de percentual como inteiros
+# de pontos-base (1 pb = 0,01%; a fração 1.0 vale 10.000 pb). Somas e
+# comparações ficam exatas, sem tolerância, e somar inteiros é mais rápido
+# que somar floats. A conversão para reais/fração acontece só na hora de
+# gerar a planilha .xlsx (`valores_para_planilha`), onde o formato de número
+# da coluna cuida da exibição.
+#
+# Partições gravadas antes da opção (ou com ela desligada) têm as colunas em
+# float64, em reais/fração; a unidade de cada partição é reconhecida pelo
+# tipo da coluna (inteiro = centavos/pontos-base, float = reais/fração) e a
+# leitura da base as converte (COLUNAS_MOEDA, COLUNAS_PORCENTAGEM).
+
+# Opção de armazenamento: False mantém dinheiro e percentual em float64
+VALORES_INTEIROS = True
+
+CENTAVOS_POR_REAL = 100
+PONTOS_BASE = 10_000
+
+# Colunas de dinheiro e de percentual de todas as bases (as COLUNAS_FLOAT /
+# COL_FLOAT e COLUNAS_PORC / COL_PCT dos append_excel). O armazenamento usa
+# estas listas para levar partições e planilhas antigas, em reais/fração, às
+# unidades inteiras.
+COLUNAS_MOEDA = (
+    'valor', 'valorliq', 'valorliquido', 'inss', 'valortotal', 'valorcopart', 'valorrecebido', 'customedio',
+    'partibeneficiario', 'faturamento', 'evento', 'faturamento_per_capita', 'evento_per_capita',
+)
+COLUNAS_PORCENTAGEM = (
+    'porcqteventos', 'porcvalortotal', 'porcvalorcopart', 'porctotal', 'sobretotal', 'porcsobretotal',
+    'percintern_total', 'percpac_total', 'percvalor_total', 'perc_eventos',
+)
+
+
+def _inteiros(serie: pd.Series, fator) -> pd.Series:
+    """Valores float multiplicados por `fator` e arredondados, como Int64 (NaN vira <NA>)."""
+    valores = serie.to_numpy(dtype=float, na_value=np.nan)
+    inteiros = pd.array(np.round(valores * fator), dtype='Float64').astype('Int64')
+    return pd.Series(inteiros, index=serie.index, name=serie.name)
+
+
+def para_centavos(serie: pd.Series) -> pd.Series:
+    """Valores em reais (float) como centavos (Int64); colunas já inteiras ficam como estão."""
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        return serie
+    return _inteiros(serie, CENTAVOS_POR_REAL)
+
+
+def para_pontos_base(serie: pd.Series) -> pd.Series:
+    """Percentuais como fração (float) em pontos-base (Int64); colunas já inteiras ficam como estão."""
+    if pd.api.types.is_integer_dtype(serie.dtype):
+        return serie
+    return _inteiros(serie, PONTOS_BASE)
+
+
+def tipar_valores(df: pd.DataFrame, colunas_moeda, colunas_porc) -> pd.DataFrame:
+    """
+    Converte (no lugar) as colunas de dinheiro para centavos e as de
+    percentual para pontos-base, se VALORES_INTEIROS; devolve `df`.
+    """
+    if not VALORES_INTEIROS:
+        return df
+    for coluna in colunas_moeda:
+        if coluna in df.columns:
+            df[coluna] = para_centavos(df[coluna])
+    for coluna in colunas_porc:
+        if coluna in df.columns:
+            df[coluna] = para_pontos_base(df[coluna])
+    return df
+
+
+def valores_para_planilha(df: pd.DataFrame, colunas_moeda, colunas_porc) -> pd.DataFrame:
+    """
+    Cópia de `df` com os centavos em reais e os pontos-base em fração
+    (float64), para escrever na planilha; colunas em float ficam como estão.
+    """
+    convertidas = {}
+    for colunas, fator in ((colunas_moeda, CENTAVOS_POR_REAL), (colunas_porc, PONTOS_BASE)):
+        for coluna in colunas:
+            if coluna in df.columns and pd.api.types.is_integer_dtype(df[coluna].dtype):
+                convertidas[coluna] = df[coluna].to_numpy(dtype=float, na_value=np.nan) / fator
+    return df.assign(**convertidas) if convertidas else df
@@ -0,0 +1,199 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+
+# Vigia das pastas de entrada.
+#
+# Relatórios deixados numa pasta compartilhada ao longo do dia entram nas
+# bases sem ninguém abrir a interface: a pasta é varrida quando algo muda
+# nela, cada arquivo novo ou alterado espera até ficar completo (tamanho e
+# data sem mudar por ESTABILIDADE segundos) e os arquivos prontos são
+# entregues juntos ao pipeline de lote, de modo que uma rajada de dezenas de
+# arquivos vira uma única gravação por base de destino.
+#
+# No Linux as mudanças chegam pelo inotify (via ctypes, sem dependências):
+# sem eventos, o processo fica parado no select, e cada evento só dispara a
+# varredura (os.scandir da pasta, barato), que é quem decide o que mudou.
+# Onde não há inotify (Windows, macOS, ou pasta de rede que não gera
+# eventos) a pasta é varrida a cada INTERVALO_VARREDURA segundos, comparando
+# tamanho e data de cada arquivo com a varredura anterior.
+
+# Segundos com tamanho e data sem mudar para considerar o arquivo completo
+ESTABILIDADE = 2.0
+
+# Segundos sem novos arquivos prontos antes de gravar o lote (rajadas viram
+# um lote só) e espera máxima de um arquivo pronto, mesmo com a rajada
+# continuando
+JANELA_LOTE = 1.0
+ESPERA_MAXIMA = 10.0
+
+# Intervalo entre varreduras sem inotify, e enquanto há arquivos esperando
+# ficar completos
+INTERVALO_VARREDURA = 1.0
+
+# Com inotify, varredura de segurança mesmo sem eventos (pastas de rede)
+INTERVALO_SEGURANCA = 30.0
+
+# Arquivos temporários do Excel/LibreOffice enquanto a planilha está aberta
+PREFIXOS_TEMPORARIOS = ('~$', '.~lock', '.')
+
+# Eventos do inotify que disparam a varredura (linux/inotify.h):
+# IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENTOS_INOTIFY = 0x002 | 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+
+
+class _Inotify:
+    """Espera por mudanças nas pastas com o inotify do Linux."""
+
+    def __init__(self, pastas):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        for pasta in pastas:
+            if libc.inotify_add_watch(self.fd, os.fsencode(pasta), _EVENTOS_INOTIFY) < 0:
+                erro = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(erro, f'inotify_add_watch: {pasta}')
+
+    def esperar(self, segundos):
+        """Espera até `segundos` por eventos; os eventos são descartados (a pasta é varrida)."""
+        prontos, _, _ = select.select([self.fd], [], [], segundos)
+        if not prontos:
+            return
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+
+    def fechar(self):
+        os.close(self.fd)
+
+
+class _Varredura:
+    """Sem inotify: só espera o intervalo até a próxima varredura."""
+
+    def esperar(self, segundos):
+        time.sleep(min(segundos, INTERVALO_VARREDURA))
+
+    def fechar(self):
+        pass
+
+
+def _notificador(pastas, log):
+    """Inotify no Linux; varredura periódica se ele não estiver disponível."""
+    if sys.platform.startswith('linux'):
+        try:
+            return _Inotify(pastas)
+        except (OSError, AttributeError) as erro:
+            log(f"⚠️ inotify indisponível ({erro}); as pastas serão varridas a cada {INTERVALO_VARREDURA:g} s")
+    return _Varredura()
+
+
+def _pode_abrir(caminho):
+    """O arquivo pode ser aberto para leitura (no Windows, não está travado por quem o grava)?"""
+    try:
+        with open(caminho, 'rb') as arquivo:
+            arquivo.read(1)
+    except OSError:
+        return False
+    return True
+
+
+class VigiaPastas:
+    """
+    Vigia pastas de entrada e entrega os relatórios (.xls/.xlsx) novos ou
+    alterados, já completos, em lotes para `processar(arquivos)`.
+
+    Os arquivos presentes ao iniciar também são entregues; os que já foram
+    ingeridos são reconhecidos e pulados pelo livro de ingestão
+    (comum.ingestao), sem nova leitura.
+    """
+
+    def __init__(self, pastas, processar, log=print):
+        self.pastas = [os.path.abspath(pasta) for pasta in pastas]
+        self.processar = processar
+        self.log = log
+        # Caminho -> (mtime_ns, tamanho) do que já foi entregue
+        self.entregues = {}
+        # Caminho -> ((mtime_ns, tamanho), instante em que a assinatura apareceu)
+        self.esperando = {}
+        self.prontos = []
+        self.primeiro_pronto = None
+        self.ultimo_pronto = None
+
+    def _assinaturas(self):
+        """(mtime_ns, tamanho) de cada relatório das pastas."""
+        assinaturas = {}
+        for pasta in self.pastas:
+            try:
+                entradas = list(os.scandir(pasta))
+            except OSError as erro:
+                self.log(f"⚠️ Não foi possível ler a pasta {pasta}: {erro}")
+                continue
+            for entrada in entradas:
+                nome = entrada.name
+                if not nome.lower().endswith(('.xls', '.xlsx')) or nome.startswith(PREFIXOS_TEMPORARIOS):
+                    continue
+                try:
+                    if not entrada.is_file():
+                        continue
+                    estado = entrada.stat()
+                except OSError:
+                    continue
+                assinaturas[entrada.path] = (estado.st_mtime_ns, estado.st_size)
+        return assinaturas
+
+    def verificar(self, agora=None):
+        """
+        Varre as pastas e, se um lote estiver pronto, entrega-o a `processar`.
+        Retorna os arquivos entregues (lista vazia se nenhum).
+        """
+        agora = time.monotonic() if agora is None else agora
+        assinaturas = self._assinaturas()
+        for caminho in [c for c in self.entregues if c not in assinaturas]:
+            del self.entregues[caminho]
+        for caminho in [c for c in self.esperando if c not in assinaturas]:
+            del self.esperando[caminho]
+
+        for caminho, assinatura in assinaturas.items():
+            if self.entregues.get(caminho) == assinatura or caminho in self.prontos:
+                continue
+            anterior = self.esperando.get(caminho)
+            if anterior is None or anterior[0] != assinatura:
+                self.esperando[caminho] = (assinatura, agora)
+            elif agora - anterior[1] >= ESTABILIDADE and assinatura[1] > 0 and _pode_abrir(caminho):
+                del self.esperando[caminho]
+                self.entregues[caminho] = assinatura
+                self.prontos.append(caminho)
+                self.primeiro_pronto = agora if self.primeiro_pronto is None else self.primeiro_pronto
+                self.ultimo_pronto = agora
+
+        if not self.prontos:
+            return []
+        rajada_acabou = not self.esperando and agora - self.ultimo_pronto >= JANELA_LOTE
+        if not rajada_acabou and agora - self.primeiro_pronto < ESPERA_MAXIMA:
+            return []
+        lote, self.prontos = self.prontos, []
+        self.primeiro_pronto = self.ultimo_pronto = None
+        try:
+            self.processar(lote)
+        except Exception as erro:
+            self.log(f"❌ Erro ao processar {len(lote)} arquivo(s): {erro}")
+        return lote
+
+    def executar(self, parar=lambda: False):
+        """Vigia as pastas até `parar()` ser verdadeiro (checado a cada espera)."""
+        notificador = _notificador(self.pastas, self.log)
+        self.log(f"👀 Vigiando {', '.join(self.pastas)}")
+        try:
+            while not parar():
+                self.verificar()
+                pendente = self.esperando or self.prontos
+                notificador.esperar(INTERVALO_VARREDURA if pendente else INTERVALO_SEGURANCA)
+        finally:
+            notificador.fechar()
@@ -1,48 +1,168 @@
+import numpy as np
 import pandas as pd
 import os
+import time
 import unicodedata
 
+from comum.competencia import datas_do_periodo
+from comum.extracao import (
+    contrato_tipado, converter_inteiros, converter_numeros, converter_porcentagens, marcar_leitura,
+)
+from comum.layouts import buscar_layout, guardar_layout
+from comum.memoria import compactar
+from comum.planilha import abrir_planilha
 
-def read_excel(caminho_arquivo: str):
-    """
-    Lê ESTATISTICA_DIAGNOSTICOS (.xls/.xlsx) e retorna uma lista de dicionários
-    normalizados prontos para append. Implementação robusta para o layout
-    mostrado (coluna "Diagnóstico" seguida das demais métricas).
+# Linhas do topo da aba onde ficam os metadados e o cabeçalho da tabela
+LINHAS_BUSCA_CABECALHO = 120
+
+
+def _norm(s: str) -> str:
+    try:
+        s = str(s)
+        s = unicodedata.normalize('NFKD', s)
+        s = ''.join(ch for ch in s if not unicodedata.combining(ch))
+        return s.strip().lower()
+    except Exception:
+        return str(s).strip().lower()
+
+
+def _localizar_layout(df: pd.DataFrame):
     """
+    Localiza, no topo da aba (header=None), a linha do cabeçalho e a coluna
+    (posição) de cada campo.
 
-    def _to_str_br(value, is_percent=False):
-        if pd.isna(value) or str(value).strip().lower() == 'nan':
-            return ''
-        raw = str(value).strip().split()[0]
+    Retorna (linha, colunas, detectado), com `detectado` False quando a linha
+    é a de reserva (cabeçalho não reconhecido), ou None se o cabeçalho não
+    puder ser lido.
+    """
+    # Localiza cabeçalho: pontuação por presença de rótulos esperados
+    header_row = None
+    idx_diag_col = None
+    expected_tokens = ['diagn', 'qtd', 'valor', 'custo', 'benef']
+    for r in range(len(df)):
+        linha_norm = [_norm(c) for c in df.iloc[r].tolist()]
+        row_text = ' | '.join(linha_norm)
+        score = sum(1 for t in expected_tokens if t in row_text)
+        if score >= 3 and any('diagn' in c or c == 'cid' for c in linha_norm):
+            header_row = r
+            # tenta localizar a coluna de diagnóstico nesta linha
+            for c_idx, txt in enumerate(linha_norm):
+                if 'diagn' in txt or txt == 'cid':
+                    idx_diag_col = c_idx
+                    break
+            break
+    detectado = header_row is not None
+    if header_row is None:
+        # fallback: tenta linha 10 (11ª linha visual)
+        header_row = 10
+    # Garantia de limites válidos
+    if header_row >= len(df):
+        header_row = max(0, len(df) - 1)
+
+    try:
+        header_norm = [_norm(c) for c in df.iloc[header_row].tolist()]
+    except Exception as e:
+        print(f"[Diagnosticos] Falha ao ler header na linha {header_row}: {e}")
+        return None
+
+    def find_col(*tokens):
+        tokens = tuple(_norm(t) for t in tokens)
+        for i, name in enumerate(header_norm):
+            name_n = _norm(name)
+            if all(tok in name_n for tok in tokens):
+                return i
+        return None
+
+    c_diag = idx_diag_col if idx_diag_col is not None else find_col('diagn')
+    c_qtd_int = find_col('qtd', 'intern')
+    c_qtd_pac = find_col('qtd', 'pac')
+    c_val_total = find_col('valor', 'total')
+    c_custo = find_col('custo')
+    c_part_ben = find_col('part', 'benef')
+
+    # Fallback baseado na ordem típica após a coluna Diagnóstico
+    if c_diag is not None:
+        base = c_diag
+        def within(i):
+            return i is not None and 0 <= i < df.shape[1]
+        if c_qtd_int is None and base + 1 < df.shape[1]:
+            c_qtd_int = base + 1
+        if c_qtd_pac is None and base + 3 < df.shape[1]:
+            c_qtd_pac = base + 3
+        if c_val_total is None and base + 5 < df.shape[1]:
+            c_val_total = base + 5
+        if c_custo is None and base + 7 < df.shape[1]:
+            c_custo = base + 7
+        if c_part_ben is None and base + 8 < df.shape[1]:
+            c_part_ben = base + 8
+
+    # Percentuais: pega a coluna logo após as numéricas (com validação de limites)
+    c_perc_int = None
+    if c_qtd_int is not None and (c_qtd_int + 1) < df.shape[1]:
         try:
-            num = float(raw.replace('.', '').replace(',', '.'))
-            if is_percent:
-                return f"{num:.2f}%".replace('.', ',')
-            return f"{num:.2f}".replace('.', ',')
+            if '%' in str(df.iloc[header_row, c_qtd_int + 1]):
+                c_perc_int = c_qtd_int + 1
         except Exception:
-            return raw
+            c_perc_int = None
 
-    def _norm(s: str) -> str:
+    c_perc_pac = None
+    if c_qtd_pac is not None and (c_qtd_pac + 1) < df.shape[1]:
         try:
-            s = str(s)
-            s = unicodedata.normalize('NFKD', s)
-            s = ''.join(ch for ch in s if not unicodedata.combining(ch))
-            return s.strip().lower()
+            if '%' in str(df.iloc[header_row, c_qtd_pac + 1]):
+                c_perc_pac = c_qtd_pac + 1
         except Exception:
-            return str(s).strip().lower()
+            c_perc_pac = None
+    c_perc_val = None
+    if c_val_total is not None:
+        lim = min(c_val_total + 4, df.shape[1])
+        for j in range(c_val_total + 1, lim):
+            try:
+                cell_txt = str(df.iloc[header_row, j])
+                txt = _norm(cell_txt)
+            except Exception:
+                txt = ''
+            if '%' in cell_txt or 'sobre' in txt:
+                c_perc_val = j
+                break
+
+    colunas = {
+        'diagnostico': c_diag,
+        'qtdintern': c_qtd_int,
+        'percintern_total': c_perc_int,
+        'qtdpacientes': c_qtd_pac,
+        'percpac_total': c_perc_pac,
+        'valortotal': c_val_total,
+        'percvalor_total': c_perc_val,
+        'customedio': c_custo,
+        'partibeneficiario': c_part_ben,
+    }
+    return header_row, colunas, detectado
+
+
+def read_excel(caminho_arquivo: str):
+    """
+    Lê ESTATISTICA_DIAGNOSTICOS (.xls/.xlsx) e retorna um DataFrame com as
+    colunas já tipadas (quantidades inteiras, valores float, percentuais como
+    fração), pronto para append. Implementação robusta para o layout
+    mostrado (coluna "Diagnóstico" seguida das demais métricas).
+    O resumo da leitura (linhas, abas, tempo) fica em attrs['leitura'].
+    """
+    inicio = time.perf_counter()
 
     if not os.path.exists(caminho_arquivo):
         print(f"Erro: arquivo não encontrado: {caminho_arquivo}")
-        return []
+        return pd.DataFrame()
 
-    xl = pd.ExcelFile(caminho_arquivo)
-    dados_out = []
+    xl = abrir_planilha(caminho_arquivo)
+    registros_abas = []
 
     for sheet in xl.sheet_names:
-        df = pd.read_excel(caminho_arquivo, sheet_name=sheet, header=None)
+        # Metadados e cabeçalho saem das primeiras linhas; a tabela é lida
+        # depois, só com as colunas localizadas no cabeçalho
+        df = xl.sonda(sheet, nrows=LINHAS_BUSCA_CABECALHO)
         # Debug básico
         try:
-            print(f"[Diagnosticos] Aba='{sheet}' shape={df.shape}")
+            print(f"[Diagnosticos] Aba='{sheet}' linhas do topo={df.shape}")
         except Exception:
             pass
 
@@ -55,145 +175,70 @@ def read_excel(caminho_arquivo: str):
             periodo_cell = df.iloc[8, 3] if not pd.isna(df.iloc[8, 3]) else df.iloc[9, 3]
         except Exception:
             periodo_cell = ''
-        dt_de, dt_ate = '', ''
-        if isinstance(periodo_cell, str):
-            partes = periodo_cell.split()
-            if len(partes) >= 3:
-                dt_de, dt_ate = partes[0], partes[2]
-
-        # Localiza cabeçalho: pontuação por presença de rótulos esperados
-        header_row = None
-        idx_diag_col = None
-        expected_tokens = ['diagn', 'qtd', 'valor', 'custo', 'benef']
-        for r in range(min(120, len(df))):
-            linha_norm = [_norm(c) for c in df.iloc[r].tolist()]
-            row_text = ' | '.join(linha_norm)
-            score = sum(1 for t in expected_tokens if t in row_text)
-            if score >= 3 and any('diagn' in c or c == 'cid' for c in linha_norm):
-                header_row = r
-                # tenta localizar a coluna de diagnóstico nesta linha
-                for c_idx, txt in enumerate(linha_norm):
-                    if 'diagn' in txt or txt == 'cid':
-                        idx_diag_col = c_idx
-                        break
-                break
-        if header_row is None:
-            # fallback: tenta linha 10 (11ª linha visual)
-            header_row = 10
-        # Garantia de limites válidos
-        if header_row >= len(df):
-            header_row = max(0, len(df) - 1)
-
-        try:
-            header_norm = [_norm(c) for c in df.iloc[header_row].tolist()]
-        except Exception as e:
-            print(f"[Diagnosticos] Falha ao ler header na linha {header_row}: {e}")
-            continue
-
-        def find_col(*tokens):
-            tokens = tuple(_norm(t) for t in tokens)
-            for i, name in enumerate(header_norm):
-                name_n = _norm(name)
-                if all(tok in name_n for tok in tokens):
-                    return i
-            return None
-
-        c_diag = idx_diag_col if idx_diag_col is not None else find_col('diagn')
-        c_qtd_int = find_col('qtd', 'intern')
-        c_qtd_pac = find_col('qtd', 'pac')
-        c_val_total = find_col('valor', 'total')
-        c_custo = find_col('custo')
-        c_part_ben = find_col('part', 'benef')
-
-        # Fallback baseado na ordem típica após a coluna Diagnóstico
-        if c_diag is not None:
-            base = c_diag
-            def within(i):
-                return i is not None and 0 <= i < df.shape[1]
-            if c_qtd_int is None and base + 1 < df.shape[1]:
-                c_qtd_int = base + 1
-            if c_qtd_pac is None and base + 3 < df.shape[1]:
-                c_qtd_pac = base + 3
-            if c_val_total is None and base + 5 < df.shape[1]:
-                c_val_total = base + 5
-            if c_custo is None and base + 7 < df.shape[1]:
-                c_custo = base + 7
-            if c_part_ben is None and base + 8 < df.shape[1]:
-                c_part_ben = base + 8
-
-        print(f"[Diagnosticos] header_row={header_row} cols: diag={c_diag}, qtd_int={c_qtd_int}, qtd_pac={c_qtd_pac}, val_total={c_val_total}, custo={c_custo}, part_ben={c_part_ben}")
-
-        # Percentuais: pega a coluna logo após as numéricas (com validação de limites)
-        c_perc_int = None
-        if c_qtd_int is not None and (c_qtd_int + 1) < df.shape[1]:
-            try:
-                if '%' in str(df.iloc[header_row, c_qtd_int + 1]):
-                    c_perc_int = c_qtd_int + 1
-            except Exception:
-                c_perc_int = None
-
-        c_perc_pac = None
-        if c_qtd_pac is not None and (c_qtd_pac + 1) < df.shape[1]:
-            try:
-                if '%' in str(df.iloc[header_row, c_qtd_pac + 1]):
-                    c_perc_pac = c_qtd_pac + 1
-            except Exception:
-                c_perc_pac = None
-        c_perc_val = None
-        if c_val_total is not None:
-            lim = min(c_val_total + 4, df.shape[1])
-            for j in range(c_val_total + 1, lim):
-                try:
-                    cell_txt = str(df.iloc[header_row, j])
-                    txt = _norm(cell_txt)
-                except Exception:
-                    txt = ''
-                if '%' in cell_txt or 'sobre' in txt:
-                    c_perc_val = j
-                    break
-
-        # Helper seguro para acessar índice
-        def _get(row, idx):
-            try:
-                return row.iloc[idx] if idx is not None and idx < len(row) else ''
-            except Exception:
-                return ''
-
-        # Varre linhas de dados até encontrar 3 vazias seguidas
-        vazias_seq = 0
-        r = header_row + 1
-        while r < len(df):
-            row = df.iloc[r]
-            if row.isna().all():
-                vazias_seq += 1
-                if vazias_seq >= 3:
-                    break
-                r += 1
-                continue
-            vazias_seq = 0
-
-            diag = _get(row, c_diag)
-            diag_norm = _norm(diag)
-            if diag_norm.startswith('total') or diag_norm == '':
-                r += 1
+        dt_de, dt_ate = datas_do_periodo(periodo_cell)
+
+        # Layout já visto: linha do cabeçalho e colunas vêm do cache de layouts
+        layout = buscar_layout('diagnosticos', df)
+        if layout is not None:
+            header_row, colunas = layout['linha'], layout['colunas']
+        else:
+            localizado = _localizar_layout(df)
+            if localizado is None:
                 continue
+            header_row, colunas, detectado = localizado
+            if detectado:
+                guardar_layout('diagnosticos', df, header_row, colunas)
+
+        print(f"[Diagnosticos] header_row={header_row} cols: diag={colunas['diagnostico']}, qtd_int={colunas['qtdintern']}, qtd_pac={colunas['qtdpacientes']}, val_total={colunas['valortotal']}, custo={colunas['customedio']}, part_ben={colunas['partibeneficiario']}")
+
+        # Coluna inteira por índice (vazia quando não localizada)
+        def _col(dados, idx):
+            if idx is None or idx not in dados.columns:
+                return pd.Series(np.nan, index=dados.index, dtype=object)
+            return dados[idx]
+
+        # Linhas de dados até encontrar 3 vazias seguidas. A linha vazia é a
+        # linha inteira da aba (conteúdo fora das colunas extraídas não fecha
+        # o bloco); depois ficam só as colunas extraídas
+        dados = xl.colunas(sheet, header_row + 1, None)
+        vazias = dados.isna().all(axis=1)
+        fim_bloco = vazias.rolling(3).sum().ge(3).to_numpy().nonzero()[0]
+        if len(fim_bloco):
+            dados = dados.iloc[:fim_bloco[0] - 2]
+            vazias = vazias.iloc[:fim_bloco[0] - 2]
+        dados = dados.reindex(columns=sorted({c for c in colunas.values() if c is not None}))
+
+        diag = _col(dados, colunas['diagnostico'])
+        diag_norm = diag.map(_norm)
+        validas = ~vazias & ~(diag_norm.str.startswith('total') | (diag_norm == ''))
+        dados = dados[validas.values]
+        if dados.empty:
+            continue
 
-            linha_out = {
-                'diagnostico': str(diag).strip(),
-                'qtdintern': _to_str_br(_get(row, c_qtd_int)),
-                'percintern_total': _to_str_br(_get(row, c_perc_int), is_percent=True),
-                'qtdpacientes': _to_str_br(_get(row, c_qtd_pac)),
-                'percpac_total': _to_str_br(_get(row, c_perc_pac), is_percent=True),
-                'valortotal': _to_str_br(_get(row, c_val_total)),
-                'percvalor_total': _to_str_br(_get(row, c_perc_val), is_percent=True),
-                'customedio': _to_str_br(_get(row, c_custo)),
-                'partibeneficiario': _to_str_br(_get(row, c_part_ben)),
-                'relatorio': 'Estatísticas de Diagnóstico',
-                'contrato': str(contrato).strip() if not pd.isna(contrato) else '',
-                'dtcompetde': dt_de,
-                'dtcompetate': dt_ate,
-            }
-            dados_out.append(linha_out)
-            r += 1
-
-    return dados_out
+        def _numeros(campo):
+            return converter_numeros(_col(dados, colunas[campo]), padrao_br=True)
+
+        def _porcentagens(campo):
+            return converter_porcentagens(_col(dados, colunas[campo]), escala=100, padrao_br=True)
+
+        registros_abas.append(pd.DataFrame({
+            'diagnostico': _col(dados, colunas['diagnostico']).astype(str).str.strip(),
+            'qtdintern': converter_inteiros(_col(dados, colunas['qtdintern']), padrao_br=True),
+            'percintern_total': _porcentagens('percintern_total'),
+            'qtdpacientes': converter_inteiros(_col(dados, colunas['qtdpacientes']), padrao_br=True),
+            'percpac_total': _porcentagens('percpac_total'),
+            'valortotal': _numeros('valortotal'),
+            'percvalor_total': _porcentagens('percvalor_total'),
+            'customedio': _numeros('customedio'),
+            'partibeneficiario': _numeros('partibeneficiario'),
+            'relatorio': 'Estatísticas de Diagnóstico',
+            'contrato': contrato_tipado(contrato),
+            'dtcompetde': dt_de,
+            'dtcompetate': dt_ate,
+        }).reset_index(drop=True))
+
+    if not registros_abas:
+        return pd.DataFrame()
+    # Textos repetidos como category e inteiros em 32 bits (comum.memoria)
+    df = compactar(pd.concat(registros_abas, ignore_index=True))
+    return marcar_leitura(df, caminho_arquivo, inicio, len(registros_abas))
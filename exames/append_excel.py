@@ -1,82 +1,138 @@
 import pandas as pd
 import os
+import time
 
+from comum.armazenamento import RECUSAR, abrir_base, gravar_lotes, resultado_arquivo
+from comum.competencia import tipar_datas
+from comum.duplicidade import formatar_chaves
+from comum.extracao import converter_coluna
+from comum.valores import tipar_valores, valores_para_planilha
 
-def _num_br_to_float(valor):
-    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
-        return 0.0
-    if isinstance(valor, (int, float)):
-        return float(valor)
-    s = str(valor).strip().replace('.', '').replace('%', '').replace(' ', '')
-    s = s.replace(',', '.')
-    try:
-        return float(s)
-    except Exception:
-        return 0.0
+# Tipagem
+COL_INT = ['qtdeventos', 'contrato']
+COL_FLOAT = ['valorliquido', 'inss', 'valortotal', 'customedio']
+COL_PCT = ['sobretotal', 'porctotal']
 
 
-def _num_br_to_int(valor):
-    try:
-        return int(round(_num_br_to_float(valor)))
-    except Exception:
-        return 0
-
-
-def append_to_excel_formatado(caminho_arquivo: str, dados: list):
+def preparar_dados(dados) -> pd.DataFrame:
     """
-    Recebe a lista de dicionários de exames, normaliza tipos e escreve em
-    `caminho_arquivo` com formatação (xlsxwriter). Evita duplicar por
-    (contrato, dtcompetde).
+    Converte os registros lidos para os tipos da base (DataFrame), com os
+    avisos da conversão e o tempo gasto em attrs ('avisos', 'preparo').
     """
-    if not dados:
-        print("Aviso: não há dados para gravar.")
-        return
-
+    inicio = time.perf_counter()
+    avisos = []
     df_novos = pd.DataFrame(dados)
 
-    col_int = ['qtdeventos', 'contrato']
-    col_float = ['valorliquido', 'inss', 'valortotal', 'customedio']
-    col_pct = ['sobretotal', 'porctotal']
-
-    for c in col_int:
+    # Colunas que já chegam tipadas do leitor são usadas como estão; textos no
+    # formato brasileiro passam pelo conversor vetorizado de comum.extracao.
+    # Vazio (ou texto inválido) vira 0
+    for c in COL_INT:
         if c in df_novos.columns:
-            df_novos[c] = df_novos[c].apply(_num_br_to_int)
+            df_novos[c] = converter_coluna(df_novos[c], padrao_br=True, avisos=avisos).fillna(0).round().astype(int)
 
-    for c in col_float:
+    for c in COL_FLOAT:
         if c in df_novos.columns:
-            df_novos[c] = df_novos[c].apply(_num_br_to_float)
+            df_novos[c] = converter_coluna(df_novos[c], padrao_br=True, avisos=avisos).fillna(0.0)
 
-    for c in col_pct:
+    for c in COL_PCT:
         if c in df_novos.columns:
-            df_novos[c] = df_novos[c].apply(lambda v: _num_br_to_float(v) / 100.0)
-
-    if not os.path.exists(caminho_arquivo):
-        os.makedirs(os.path.dirname(caminho_arquivo), exist_ok=True)
-        with pd.ExcelWriter(caminho_arquivo, engine='xlsxwriter') as writer:
-            df_novos.to_excel(writer, sheet_name='Dados', index=False)
-            _formatar(writer, df_novos, col_float, col_pct)
-        print("OK. Planilha criada com os dados de Exames.")
-        return
-
-    df_exist = pd.read_excel(caminho_arquivo)
-    duplicados = []
-    if not df_exist.empty:
-        for _, r in df_novos.iterrows():
-            k1 = str(r.get('contrato', ''))
-            k2 = str(r.get('dtcompetde', ''))
-            if not df_exist[(df_exist['contrato'].astype(str) == k1) & (df_exist['dtcompetde'].astype(str) == k2)].empty:
-                duplicados.append((k1, k2))
-
-    if duplicados:
-        print(f"Atenção: Dados já existentes para os contratos/competências: {duplicados[0]}. Nenhum dado foi adicionado.")
-        return
-
-    df_final = pd.concat([df_exist, df_novos], ignore_index=True)
-    with pd.ExcelWriter(caminho_arquivo, engine='xlsxwriter') as writer:
-        df_final.to_excel(writer, sheet_name='Dados', index=False)
-        _formatar(writer, df_final, col_float, col_pct)
-
-    print("OK. Dados de Exames adicionados com sucesso, sem duplicações.")
+            # o leitor já entrega a fração (0-1); textos vêm como 0-100
+            escala = 1 if pd.api.types.is_numeric_dtype(df_novos[c]) else 100
+            df_novos[c] = converter_coluna(df_novos[c], padrao_br=True, escala=escala, avisos=avisos).fillna(0.0)
+
+    # Dinheiro em centavos e percentuais em pontos-base (comum.valores)
+    tipar_valores(df_novos, COL_FLOAT, COL_PCT)
+
+    # Competências e períodos como datas (textos de listas de registros também)
+    df_novos = tipar_datas(df_novos)
+
+    # Avisos da conversão e tempo do preparo seguem com os registros até o
+    # resultado da gravação (comum.armazenamento)
+    df_novos.attrs.update(avisos=avisos, preparo=round(time.perf_counter() - inicio, 3))
+    return df_novos
+
+
+def append_to_excel_formatado(caminho_arquivo: str, dados: list, materializar: bool = True, politica: str = RECUSAR,
+                              origem: str = '', log=print) -> dict:
+    """
+    Recebe os registros de exames (DataFrame tipado do leitor ou lista de
+    dicionários), normaliza tipos e escreve em `caminho_arquivo` com
+    formatação (xlsxwriter). Evita duplicar por (contrato, dtcompetde):
+    chaves já gravadas seguem a `politica` (RECUSAR, IGNORAR_EXISTENTES ou
+    SUBSTITUIR, de comum.armazenamento). As linhas gravadas levam o número da
+    ingestão de `origem` (o relatório lido).
+    Com materializar=False o lote só é gravado como partição da base e a
+    planilha é regerada depois, por materializar_excel.
+    Retorna o resultado da gravação (resultado_arquivo, de
+    comum.armazenamento): status, linhas lidas e gravadas, chaves
+    repetidas, avisos da conversão e tempo de cada etapa. As mensagens
+    vão para `log` (print, por padrão).
+    """
+    if dados is None or len(dados) == 0:
+        log("Aviso: não há dados para gravar.")
+        return resultado_arquivo(origem, 'vazio')
+
+    df_novos = preparar_dados(dados)
+
+    # Base particionada: cada chave do lote vira uma partição em
+    # databases/<nome>.partes/ e a planilha é gerada a partir delas
+    base = abrir_base(caminho_arquivo)
+    planilha_nova = not os.path.exists(caminho_arquivo)
+
+    # Checagem de duplicidade por (contrato, dtcompetde) nas chaves já gravadas
+    # As chaves repetidas seguem a política: RECUSAR (padrão) não grava nada,
+    # IGNORAR_EXISTENTES grava só as novas e SUBSTITUIR troca as gravadas
+    gravado = gravar_lotes(
+        base, [(origem, df_novos)], _formatar_base, exibir=_exibir_base,
+        politica=politica, materializar=materializar,
+    )[0]
+    for aviso in gravado['avisos']:
+        log(f"⚠️ {aviso}")
+
+    if gravado['status'] == 'duplicado':
+        log(f"Atenção: Dados já existentes para os contratos/competências: {formatar_chaves(gravado['chaves'])}. Nenhum dado foi adicionado.")
+        return gravado
+    if gravado['ignoradas']:
+        log(f"Atenção: Dados já existentes mantidos para os contratos/competências: {formatar_chaves(gravado['ignoradas'])}; as demais chaves foram adicionadas.")
+    if gravado['substituidas']:
+        log(f"Atenção: Dados substituídos para os contratos/competências: {formatar_chaves(gravado['substituidas'])}.")
+
+    if planilha_nova and materializar:
+        log("OK. Planilha criada com os dados de Exames.")
+    else:
+        log("OK. Dados de Exames adicionados com sucesso, sem duplicações.")
+    return gravado
+
+
+def gravar_lote(caminho_arquivo: str, lotes: list, politica: str = RECUSAR) -> list:
+    """
+    Grava de uma vez os registros de vários arquivos, dados como pares
+    (arquivo de origem, registros lidos). Chaves já existentes na base ou
+    repetidas no lote seguem a `politica` (por padrão, recusam o arquivo
+    inteiro); os demais viram partições numa única gravação e a planilha é
+    regerada uma só vez. Retorna o resultado de cada arquivo, na ordem
+    recebida.
+    """
+    preparados = [
+        (origem, preparar_dados(dados) if dados is not None and len(dados) > 0 else None)
+        for origem, dados in lotes
+    ]
+    return gravar_lotes(abrir_base(caminho_arquivo), preparados, _formatar_base, exibir=_exibir_base, politica=politica)
+
+
+def materializar_excel(caminho_arquivo: str):
+    """Regera a planilha formatada a partir das partições, se houver lotes pendentes."""
+    base = abrir_base(caminho_arquivo)
+    if base.pendente():
+        base.materializar(_formatar_base, exibir=_exibir_base)
+
+
+def _formatar_base(writer: pd.ExcelWriter, df: pd.DataFrame):
+    _formatar(writer, df, COL_FLOAT, COL_PCT)
+
+
+def _exibir_base(df: pd.DataFrame) -> pd.DataFrame:
+    return valores_para_planilha(df, COL_FLOAT, COL_PCT)
 
 
 def _formatar(writer: pd.ExcelWriter, df: pd.DataFrame, col_float: list, col_pct: list):
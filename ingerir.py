@@ -0,0 +1,268 @@
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from datetime import datetime
+
+from comum.armazenamento import POLITICAS, RECUSAR
+from comum.lote import (
+    DESCONHECIDO, ERRO, INCOMPATIVEL, contar_situacoes, desfazer_ingestao, listar_arquivos_excel, listar_ingestoes,
+    processar_arquivos,
+)
+from comum.paralelo import aquecer_pool, encerrar_pool
+from comum.registro import PASTA_BASES, TIPOS_RELATORIO, caminho_destino
+from comum.vigia import VigiaPastas
+
+# Ingestão em lote sem interação, para agendamentos (cron, agendador de
+# tarefas): lê os relatórios indicados, checa duplicidade e grava nas bases
+# com o mesmo pipeline da interface (comum.lote.processar_arquivos), para os
+# oito tipos de relatório.
+#
+#     python ingerir.py "entrada/*.xlsx" --tipo auto --processos 4 --bases databases
+#
+# O resumo em JSON (um resultado por arquivo) sai no stdout; as mensagens de
+# andamento, inclusive as impressas pelos leitores e pelos processos de
+# leitura, vão para o stderr. O código de saída é SAIDA_OK se todos os
+# arquivos terminaram gravados, já existentes, já ingeridos ou sem dados, e
+# SAIDA_FALHA se algum deu erro, não foi reconhecido, é incompatível com o
+# tipo pedido ou não foi encontrado.
+#
+# Com --vigiar, os caminhos são pastas de entrada que ficam sendo vigiadas
+# (comum.vigia) até o processo ser interrompido (Ctrl+C ou SIGTERM): os
+# relatórios novos ou alterados, depois de completos, são ingeridos em lotes
+# e cada lote escreve uma linha JSON com o seu resumo no stdout.
+#
+#     python ingerir.py entrada/ --vigiar --bases databases
+#
+# As ingestões gravadas numa base (número na coluna 'ingestao' da planilha)
+# podem ser listadas e desfeitas, também com o resultado em JSON no stdout:
+#
+#     python ingerir.py --listar-ingestoes beneficiarios
+#     python ingerir.py --desfazer beneficiarios 12
+
+SAIDA_OK = 0
+SAIDA_FALHA = 1
+
+# Situações de arquivo que fazem a execução terminar com SAIDA_FALHA
+SITUACOES_FALHA = (ERRO, INCOMPATIVEL, DESCONHECIDO)
+
+TIPO_AUTOMATICO = 'auto'
+
+
+def expandir_caminhos(caminhos):
+    """
+    Arquivos Excel dos caminhos dados: arquivos, pastas (os .xls/.xlsx de
+    dentro) e padrões glob ("entrada/**/*.xlsx"), sem repetição e na ordem
+    dada. Retorna (arquivos, não encontrados); padrões sem correspondência
+    não contam como não encontrados (pasta de entrada vazia).
+    """
+    arquivos, nao_encontrados = [], []
+    for caminho in caminhos:
+        if os.path.isdir(caminho):
+            encontrados = listar_arquivos_excel(caminho)
+        elif os.path.isfile(caminho):
+            encontrados = [caminho]
+        else:
+            encontrados = sorted(c for c in glob.glob(caminho, recursive=True) if os.path.isfile(c))
+            if not encontrados and not glob.has_magic(caminho):
+                nao_encontrados.append(caminho)
+        for arquivo in encontrados:
+            arquivo = os.path.abspath(arquivo)
+            if arquivo not in arquivos:
+                arquivos.append(arquivo)
+    return arquivos, nao_encontrados
+
+
+def _argumentos(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ingestão em lote dos relatórios Bradesco PME nas bases (sem interação).",
+    )
+    parser.add_argument('caminhos', nargs='*', help="arquivos, pastas ou padrões glob dos relatórios")
+    parser.add_argument(
+        '--tipo', default=TIPO_AUTOMATICO, choices=[TIPO_AUTOMATICO, *TIPOS_RELATORIO],
+        help="tipo dos relatórios; 'auto' identifica cada arquivo pela assinatura (padrão)",
+    )
+    parser.add_argument(
+        '--processos', type=int, default=None,
+        help="processos de leitura em paralelo (padrão: um por núcleo)",
+    )
+    parser.add_argument('--bases', default=PASTA_BASES, help=f"pasta das bases de destino (padrão: {PASTA_BASES})")
+    parser.add_argument(
+        '--politica', default=RECUSAR, choices=POLITICAS,
+        help="chaves já gravadas: recusar o arquivo, ignorar as existentes ou substituí-las (padrão: recusar)",
+    )
+    parser.add_argument(
+        '--vigiar', action='store_true',
+        help="vigiar as pastas dadas e ingerir os relatórios que chegarem, até ser interrompido",
+    )
+    parser.add_argument(
+        '--listar-ingestoes', metavar='TIPO', choices=list(TIPOS_RELATORIO),
+        help="listar as ingestões gravadas na base do tipo, em vez de ingerir",
+    )
+    parser.add_argument(
+        '--desfazer', nargs=2, metavar=('TIPO', 'NUMERO'),
+        help="retirar da base do tipo as linhas gravadas pela ingestão NUMERO, em vez de ingerir",
+    )
+    argumentos = parser.parse_args(argv)
+    if argumentos.listar_ingestoes and argumentos.desfazer:
+        parser.error("use --listar-ingestoes ou --desfazer, não os dois")
+    if argumentos.listar_ingestoes or argumentos.desfazer:
+        if argumentos.caminhos or argumentos.vigiar:
+            parser.error("--listar-ingestoes e --desfazer não recebem arquivos nem --vigiar")
+    elif not argumentos.caminhos:
+        parser.error("informe os arquivos, pastas ou padrões glob dos relatórios")
+    if argumentos.desfazer:
+        tipo, numero = argumentos.desfazer
+        if tipo not in TIPOS_RELATORIO:
+            parser.error(f"tipo inválido em --desfazer: {tipo} (opções: {', '.join(TIPOS_RELATORIO)})")
+        if not numero.isdigit():
+            parser.error(f"número de ingestão inválido em --desfazer: {numero}")
+        argumentos.desfazer = (tipo, int(numero))
+    return argumentos
+
+
+def _saida_do_resumo():
+    """
+    Arquivo para o resumo JSON, no stdout original. Daqui em diante o que
+    for impresso (por este processo ou pelos do pool de leitura, que herdam
+    os descritores) vai para o stderr, sem misturar com o JSON.
+    """
+    sys.stdout.flush()
+    saida = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return saida
+
+
+def _resumo(argumentos, iniciado_em, inicio, arquivos, resultados, nao_encontrados=()):
+    return {
+        'iniciado_em': iniciado_em,
+        'segundos': round(time.perf_counter() - inicio, 3),
+        'bases': os.path.abspath(argumentos.bases),
+        'tipo': argumentos.tipo,
+        'politica': argumentos.politica,
+        'arquivos': len(arquivos),
+        'situacoes': contar_situacoes(resultados),
+        'nao_encontrados': list(nao_encontrados),
+        'resultados': resultados,
+    }
+
+
+def _gerenciar_ingestoes(argumentos, saida, log) -> int:
+    """--listar-ingestoes / --desfazer: resultado em JSON no stdout."""
+    if argumentos.listar_ingestoes:
+        tipo = argumentos.listar_ingestoes
+        resumo = {'base': os.path.abspath(caminho_destino(tipo, argumentos.bases)), 'tipo': tipo}
+        resumo['ingestoes'] = listar_ingestoes(tipo, argumentos.bases)
+        codigo = SAIDA_OK
+    else:
+        tipo, numero = argumentos.desfazer
+        resumo = {'base': os.path.abspath(caminho_destino(tipo, argumentos.bases)), 'tipo': tipo, 'ingestao': numero}
+        try:
+            resumo['linhas'] = desfazer_ingestao(tipo, numero, argumentos.bases, log=log)
+            codigo = SAIDA_OK
+        except ValueError as erro:
+            log(f"❌ {erro}")
+            resumo['erro'] = str(erro)
+            codigo = SAIDA_FALHA
+    json.dump(resumo, saida, ensure_ascii=False, indent=2, default=str)
+    saida.write('\n')
+    saida.close()
+    return codigo
+
+
+def _vigiar(argumentos, saida, log) -> int:
+    """Modo --vigiar: ingere cada lote que chega às pastas, com uma linha JSON por lote."""
+    pastas = [caminho for caminho in argumentos.caminhos if os.path.isdir(caminho)]
+    for caminho in argumentos.caminhos:
+        if caminho not in pastas:
+            log(f"❌ {caminho}: pasta não encontrada")
+    if len(pastas) != len(argumentos.caminhos):
+        saida.close()
+        return SAIDA_FALHA
+    tipo = None if argumentos.tipo == TIPO_AUTOMATICO else argumentos.tipo
+
+    # Ctrl+C e SIGTERM interrompem a espera na hora, mas deixam um lote em
+    # gravação terminar
+    parar, gravando = [], []
+
+    def ao_terminar(*_):
+        parar.append(True)
+        if not gravando:
+            raise KeyboardInterrupt
+
+    def processar(arquivos):
+        inicio = time.perf_counter()
+        iniciado_em = datetime.now().isoformat(timespec='seconds')
+        log(f"📂 {len(arquivos)} arquivo(s) para ingerir em {os.path.abspath(argumentos.bases)}")
+        gravando.append(True)
+        try:
+            resultados = processar_arquivos(
+                arquivos, tipo, argumentos.bases, argumentos.processos, log=log, politica=argumentos.politica,
+            )
+        finally:
+            gravando.clear()
+        json.dump(_resumo(argumentos, iniciado_em, inicio, arquivos, resultados), saida, ensure_ascii=False, default=str)
+        saida.write('\n')
+        saida.flush()
+
+    signal.signal(signal.SIGINT, ao_terminar)
+    signal.signal(signal.SIGTERM, ao_terminar)
+    try:
+        # Processos de leitura já de pé: o primeiro lote não espera por eles
+        aquecer_pool(argumentos.processos)
+        VigiaPastas(pastas, processar, log=log).executar(parar=lambda: bool(parar))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        encerrar_pool()
+        saida.close()
+    log("⏹️ Vigia encerrada")
+    return SAIDA_OK
+
+
+def main(argv=None) -> int:
+    argumentos = _argumentos(argv)
+    saida = _saida_do_resumo()
+
+    def log(mensagem):
+        print(mensagem, file=sys.stderr, flush=True)
+
+    if argumentos.listar_ingestoes or argumentos.desfazer:
+        return _gerenciar_ingestoes(argumentos, saida, log)
+    if argumentos.vigiar:
+        return _vigiar(argumentos, saida, log)
+
+    inicio = time.perf_counter()
+    iniciado_em = datetime.now().isoformat(timespec='seconds')
+    arquivos, nao_encontrados = expandir_caminhos(argumentos.caminhos)
+    for caminho in nao_encontrados:
+        log(f"❌ {caminho}: arquivo ou pasta não encontrado")
+    tipo = None if argumentos.tipo == TIPO_AUTOMATICO else argumentos.tipo
+
+    resultados = []
+    if arquivos:
+        log(f"📂 {len(arquivos)} arquivo(s) para ingerir em {os.path.abspath(argumentos.bases)}")
+        try:
+            resultados = processar_arquivos(
+                arquivos, tipo, argumentos.bases, argumentos.processos, log=log, politica=argumentos.politica,
+            )
+        finally:
+            encerrar_pool()
+    else:
+        log("Nenhum arquivo encontrado para processamento.")
+
+    resumo = _resumo(argumentos, iniciado_em, inicio, arquivos, resultados, nao_encontrados)
+    falhou = bool(nao_encontrados) or any(resumo['situacoes'].get(situacao) for situacao in SITUACOES_FALHA)
+    json.dump(resumo, saida, ensure_ascii=False, indent=2, default=str)
+    saida.write('\n')
+    saida.close()
+    return SAIDA_FALHA if falhou else SAIDA_OK
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
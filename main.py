@@ -2,10 +2,8 @@ import customtkinter as ctk
 from tkinter import filedialog, messagebox
 import os
 import threading
+import multiprocessing
 from datetime import datetime
-import sys
-from io import StringIO
-import contextlib
 
 # Importar módulos de automação
 try:
@@ -23,11 +21,21 @@ try:
     from exames.append_excel import append_to_excel_formatado as exames_append
     from terapias.ler_excel import read_excel as terapias_read
     from terapias.append_excel import append_to_excel_formatado as terapias_append
+    from comum.lote import (
+        DESCONHECIDO, DUPLICADO, ERRO, GRAVADO, INCOMPATIVEL, JA_INGERIDO, VAZIO,
+        contar_situacoes, listar_arquivos_excel, processar_arquivos,
+    )
+    from comum.duplicidade import formatar_chaves
+    from comum.paralelo import aquecer_pool, encerrar_pool
+    from comum.registro import TIPOS_RELATORIO, caminho_destino as destino_do_tipo, identificar_tipo, validar_arquivo
     MODULOS_DISPONIVEL = True
 except ImportError as e:
     print(f"Aviso: Módulos de beneficiários não encontrados: {e}")
     MODULOS_DISPONIVEL = False
 
+# Opção que identifica o tipo de cada arquivo (pastas com relatórios misturados)
+OPCAO_AUTOMATICA = "Automático"
+
 # Configuração do tema personalizado
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
@@ -53,6 +61,11 @@ class AutomacaoBradescoApp(ctk.CTk):
         self.grid_rowconfigure(1, weight=1)
         
         self.criar_interface()
+
+        # Processos de leitura sobem em segundo plano, antes da primeira pasta
+        if MODULOS_DISPONIVEL:
+            threading.Thread(target=aquecer_pool, daemon=True).start()
+        self.protocol("WM_DELETE_WINDOW", self.ao_fechar)
         
     def criar_interface(self):
         # ========== HEADER PRINCIPAL ==========
@@ -147,6 +160,7 @@ class AutomacaoBradescoApp(ctk.CTk):
             ("Diagn?sticos", "Indicadores de diagn?sticos", "*"),
             ("Exames", "Resultados e custos de exames", "*"),
             ("Terapias", "Informa??es de terapias realizadas", "*"),
+            (OPCAO_AUTOMATICA, "Identifica o tipo de cada arquivo\ne grava na base correspondente", "*"),
         ]
 
         colunas = 3
@@ -384,6 +398,9 @@ class AutomacaoBradescoApp(ctk.CTk):
                 self.adicionar_log("M?dulos de terapias prontos para uso")
             else:
                 self.adicionar_log("M?dulos de terapias n?o encontrados")
+        elif tipo == OPCAO_AUTOMATICA:
+            self.adicionar_log("💡 Cada arquivo é identificado pelo cabeçalho e gravado na base do seu tipo")
+            self.adicionar_log("💡 Use com uma pasta que mistura relatórios de tipos diferentes")
 
         self.atualizar_estado_botoes()
 
@@ -473,17 +490,7 @@ class AutomacaoBradescoApp(ctk.CTk):
 
     def _listar_arquivos_excel(self, pasta):
         """Retorna lista ordenada de arquivos Excel em uma pasta"""
-        try:
-            nomes = sorted(os.listdir(pasta))
-        except OSError:
-            return []
-
-        arquivos = []
-        for nome in nomes:
-            caminho = os.path.join(pasta, nome)
-            if os.path.isfile(caminho) and nome.lower().endswith((".xls", ".xlsx")):
-                arquivos.append(caminho)
-        return arquivos
+        return listar_arquivos_excel(pasta)
 
     def _obter_arquivos_para_processar(self):
         """Retorna lista de arquivos conforme modo atual"""
@@ -509,42 +516,7 @@ class AutomacaoBradescoApp(ctk.CTk):
         
     def _validar_tipo_arquivo(self, arquivo, tipo_automacao):
         """Valida se o arquivo é compatível com o tipo de automação selecionado"""
-        try:
-            import pandas as pd
-            
-            # Tenta ler o arquivo para análise básica
-            df = pd.read_excel(arquivo, nrows=15)  # Lê apenas as primeiras 15 linhas
-            
-            if tipo_automacao == "Beneficiário":
-                # Arquivo de beneficiários tem dados específicos como 'Ranking de Beneficiários'
-                # Verifica se encontra indícios de estrutura de beneficiários
-                conteudo_str = df.to_string().lower()
-                if any(keyword in conteudo_str for keyword in ['beneficiar', 'ranking', 'certificado']):
-                    return True, ""
-                else:
-                    return False, "O arquivo selecionado não parece ser um relatório de beneficiários."
-                    
-            elif tipo_automacao == "Prestadores":
-                # Arquivo de prestadores tem estrutura específica
-                conteudo_str = df.to_string().lower()
-                if any(keyword in conteudo_str for keyword in ['prestador', 'valor', 'código']):
-                    return True, ""
-                else:
-                    return False, "O arquivo selecionado não parece ser um relatório de prestadores."
-                    
-            elif tipo_automacao == "Procedimentos":
-                # Arquivo de procedimentos tem estrutura específica
-                conteudo_str = df.to_string().lower()
-                if any(keyword in conteudo_str for keyword in ['procedimento', 'custo', 'ranking']):
-                    return True, ""
-                else:
-                    return False, "O arquivo selecionado não parece ser um relatório de procedimentos."
-                    
-            return True, ""  # Por padrão, aceita o arquivo
-            
-        except Exception as e:
-            # Se não conseguir ler o arquivo, aceita mas avisa
-            return True, f"⚠️ Não foi possível validar o tipo do arquivo: {str(e)}"
+        return validar_arquivo(arquivo, identificar_tipo(tipo_automacao))
 
     def _executar_consultas(self, arquivo):
         """Executa a automação específica de consultas"""
@@ -555,7 +527,7 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.adicionar_log("Lendo arquivo de consultas...")
             self.atualizar_progresso(0.2)
             dados = consultas_read(arquivo)
-            if not dados:
+            if dados is None or len(dados) == 0:
                 raise Exception("Nenhum dado de consultas encontrado no arquivo")
             self.adicionar_log(f"{len(dados)} registros de consultas carregados")
             self.atualizar_progresso(0.5)
@@ -563,12 +535,9 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.adicionar_log("Salvando resultado em databases/consultas.xlsx ...")
             caminho_destino = "databases/consultas.xlsx"
             os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
-            with self._capturar_saida_console() as saida:
-                consultas_append(caminho_destino, dados)
-
-            saida_texto = saida.getvalue().lower()
-            self._processar_mensagens_append(saida)
-            if "existentes" in saida_texto:
+            resultado = consultas_append(caminho_destino, dados, origem=arquivo, log=self.adicionar_log)
+            self._registrar_resultado_append(dados, resultado)
+            if resultado['status'] == DUPLICADO:
                 self.after(0, lambda: messagebox.showwarning(
                     "Duplicatas detectadas",
                     "Dados já existentes para consultas. Nada foi inserido."
@@ -594,7 +563,7 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.adicionar_log("Lendo arquivo de diagnósticos...")
             self.atualizar_progresso(0.2)
             dados = diagnosticos_read(arquivo)
-            if not dados:
+            if dados is None or len(dados) == 0:
                 raise Exception("Nenhum dado de diagnósticos encontrado no arquivo")
             self.adicionar_log(f"{len(dados)} registros de diagnósticos carregados")
             self.atualizar_progresso(0.5)
@@ -602,12 +571,9 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.adicionar_log("Salvando resultado em databases/diagnosticos.xlsx ...")
             caminho_destino = "databases/diagnosticos.xlsx"
             os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
-            with self._capturar_saida_console() as saida:
-                diagnosticos_append(caminho_destino, dados)
-
-            saida_texto = saida.getvalue().lower()
-            self._processar_mensagens_append(saida)
-            if "existentes" in saida_texto:
+            resultado = diagnosticos_append(caminho_destino, dados, origem=arquivo, log=self.adicionar_log)
+            self._registrar_resultado_append(dados, resultado)
+            if resultado['status'] == DUPLICADO:
                 self.after(0, lambda: messagebox.showwarning(
                     "Duplicatas detectadas",
                     "Dados já existentes para diagnósticos. Nada foi inserido."
@@ -633,7 +599,7 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.adicionar_log("Lendo arquivo de exames...")
             self.atualizar_progresso(0.2)
             dados = exames_read(arquivo)
-            if not dados:
+            if dados is None or len(dados) == 0:
                 raise Exception("Nenhum dado de exames encontrado no arquivo")
             self.adicionar_log(f"{len(dados)} registros de exames carregados")
             self.atualizar_progresso(0.5)
@@ -641,12 +607,9 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.adicionar_log("Salvando resultado em databases/exames.xlsx ...")
             caminho_destino = "databases/exames.xlsx"
             os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
-            with self._capturar_saida_console() as saida:
-                exames_append(caminho_destino, dados)
-
-            saida_texto = saida.getvalue().lower()
-            self._processar_mensagens_append(saida)
-            if "existentes" in saida_texto:
+            resultado = exames_append(caminho_destino, dados, origem=arquivo, log=self.adicionar_log)
+            self._registrar_resultado_append(dados, resultado)
+            if resultado['status'] == DUPLICADO:
                 self.after(0, lambda: messagebox.showwarning(
                     "Duplicatas detectadas",
                     "Dados já existentes para exames. Nada foi inserido."
@@ -672,7 +635,7 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.adicionar_log("Lendo arquivo de terapias...")
             self.atualizar_progresso(0.2)
             dados = terapias_read(arquivo)
-            if not dados:
+            if dados is None or len(dados) == 0:
                 raise Exception("Nenhum dado de terapias encontrado no arquivo")
             self.adicionar_log(f"{len(dados)} registros de terapias carregados")
             self.atualizar_progresso(0.5)
@@ -680,12 +643,9 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.adicionar_log("Salvando resultado em databases/terapias.xlsx ...")
             caminho_destino = "databases/terapias.xlsx"
             os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
-            with self._capturar_saida_console() as saida:
-                terapias_append(caminho_destino, dados)
-
-            saida_texto = saida.getvalue().lower()
-            self._processar_mensagens_append(saida)
-            if "existentes" in saida_texto:
+            resultado = terapias_append(caminho_destino, dados, origem=arquivo, log=self.adicionar_log)
+            self._registrar_resultado_append(dados, resultado)
+            if resultado['status'] == DUPLICADO:
                 self.after(0, lambda: messagebox.showwarning(
                     "Duplicatas detectadas",
                     "Dados já existentes para terapias. Nada foi inserido."
@@ -716,6 +676,10 @@ class AutomacaoBradescoApp(ctk.CTk):
 
             self.adicionar_log("Iniciando processamento dos arquivos selecionados...")
 
+            if self.modo_selecao_var.get() == "pasta" or tipo_selecionado == OPCAO_AUTOMATICA:
+                self._executar_pasta(arquivos, tipo_selecionado)
+                return
+
             tipo_normalizado = tipo_selecionado.lower()
             for indice, arquivo in enumerate(arquivos, start=1):
                 nome_base = os.path.basename(arquivo)
@@ -728,10 +692,6 @@ class AutomacaoBradescoApp(ctk.CTk):
 
                 if not arquivo_valido:
                     self.adicionar_log(f"{prefixo} Arquivo incompativel: {mensagem_validacao}")
-                    messagebox.showerror(
-                        "Arquivo incompativel",
-                        f"{mensagem_validacao}\\n\\nTipo selecionado: {tipo_selecionado}\\nArquivo: {nome_base}"
-                    )
                     continue
 
                 if mensagem_validacao:
@@ -772,48 +732,74 @@ class AutomacaoBradescoApp(ctk.CTk):
             self.executando = False
             self.atualizar_progresso(0)
             self.after(0, self.atualizar_estado_botoes)
-    def _capturar_saida_console(self):
-        """Context manager para capturar a saída do console (prints)"""
-        old_stdout = sys.stdout
-        stdout_capture = StringIO()
-        try:
-            sys.stdout = stdout_capture
-            yield stdout_capture
-        finally:
-            sys.stdout = old_stdout
 
-    def _processar_mensagens_append(self, saida_capturada):
-        """Processa as mensagens capturadas do módulo append e adiciona aos logs"""
-        mensagens = saida_capturada.getvalue().strip()
-        
-        if mensagens:
-            self.adicionar_log("📋 Mensagens do sistema de gravação:")
-            for linha in mensagens.split('\n'):
-                linha = linha.strip()
-                if linha:
-                    # Detecta diferentes tipos de mensagens
-                    if "Dados já existentes" in linha or "já existentes" in linha:
-                        self.adicionar_log(f"🔄 {linha}")
-                        self.adicionar_log("✅ Sistema de proteção contra duplicatas funcionando corretamente!")
-                        self.adicionar_log("📊 Dados não foram duplicados - integridade preservada")
-                        
-                        # Extrair detalhes das duplicatas se possível
-                        if "contratos/competências:" in linha:
-                            detalhes = linha.split("contratos/competências:")[1].split(".")[0].strip()
-                            self.adicionar_log(f"📝 Detalhes: {detalhes}")
-                            
-                    elif "adicionados com sucesso" in linha or "sucesso" in linha:
-                        self.adicionar_log(f"✅ {linha}")
-                    elif "Planilha criada" in linha or "criada" in linha:
-                        self.adicionar_log(f"📄 {linha}")
-                    elif linha.startswith("⚠️") or linha.startswith("✅"):
-                        # Mensagens que já têm emoji
-                        self.adicionar_log(linha)
-                    else:
-                        # Outras mensagens do sistema
-                        self.adicionar_log(f"ℹ️ {linha}")
+    def _executar_pasta(self, arquivos, tipo_selecionado):
+        """
+        Processa a pasta em lote: le todos os arquivos, checa duplicidade no
+        lote inteiro (contra a base e entre os arquivos) e grava cada base de
+        destino uma unica vez, registrando no log o resultado de cada arquivo.
+        Na opcao automatica, cada arquivo vai para a base do seu tipo.
+        """
+        if not MODULOS_DISPONIVEL:
+            raise Exception("Módulos de automação não estão disponíveis")
+
+        automatico = tipo_selecionado == OPCAO_AUTOMATICA
+        tipo = None if automatico else identificar_tipo(tipo_selecionado)
+        if tipo is None and not automatico:
+            self.adicionar_log(f"Automacao \"{tipo_selecionado}\" ainda nao esta implementada.")
+            return
+
+        resultados = processar_arquivos(
+            arquivos, tipo, log=self.adicionar_log, progresso=self.atualizar_progresso
+        )
+        contagem = contar_situacoes(resultados)
+
+        linhas_resumo = [f"Arquivos na pasta: {len(arquivos)}"]
+        if automatico:
+            por_tipo = {}
+            for resultado in resultados:
+                if resultado['status'] == GRAVADO:
+                    por_tipo[resultado['tipo']] = por_tipo.get(resultado['tipo'], 0) + 1
+            for tipo_base, quantidade in por_tipo.items():
+                linhas_resumo.append(f"• {TIPOS_RELATORIO[tipo_base]['rotulo']}: {quantidade} gravado(s)")
+        linhas_resumo += [
+            f"• Gravados: {contagem.get(GRAVADO, 0)}",
+            f"• Já existentes (ignorados): {contagem.get(DUPLICADO, 0)}",
+            f"• Já ingeridos (não lidos): {contagem.get(JA_INGERIDO, 0)}",
+            f"• Sem dados: {contagem.get(VAZIO, 0)}",
+            f"• Incompatíveis: {contagem.get(INCOMPATIVEL, 0) + contagem.get(DESCONHECIDO, 0)}",
+            f"• Com erro: {contagem.get(ERRO, 0)}",
+        ]
+        if not automatico:
+            linhas_resumo.append(f"\nBase: {os.path.abspath(destino_do_tipo(tipo))}")
+        resumo = "\n".join(linhas_resumo)
+
+        self.adicionar_log(
+            f"📊 Lote concluído: {contagem.get(GRAVADO, 0)} gravado(s), {contagem.get(DUPLICADO, 0)} já existente(s)"
+        )
+        if automatico:
+            titulo = "Automação automática concluída"
         else:
-            self.adicionar_log("📋 Processamento silencioso - sem mensagens adicionais")
+            titulo = f"Automação de {TIPOS_RELATORIO[tipo]['rotulo'].lower()} concluída"
+        self.after(0, lambda: messagebox.showinfo(titulo, resumo))
+
+    def _registrar_resultado_append(self, dados, resultado):
+        """Registra no log o resultado da gravação (dicionário devolvido pelo append)"""
+        leitura = getattr(dados, 'attrs', {}).get('leitura')
+        if resultado['status'] == DUPLICADO:
+            self.adicionar_log("✅ Sistema de proteção contra duplicatas funcionando corretamente!")
+            self.adicionar_log("📊 Dados não foram duplicados - integridade preservada")
+            self.adicionar_log(f"📝 Detalhes: {formatar_chaves(resultado['chaves'])}")
+        elif resultado['status'] == GRAVADO:
+            self.adicionar_log(
+                f"📊 {resultado['linhas']} de {resultado['linhas_lidas']} registros gravados "
+                f"(ingestão {resultado['ingestao']})"
+            )
+        tempos = ([f"leitura {leitura['segundos']:.2f}s"] if leitura else []) + [
+            f"{etapa} {segundos:.2f}s" for etapa, segundos in resultado['segundos'].items()
+        ]
+        if tempos:
+            self.adicionar_log(f"⏱️ Tempos: {', '.join(tempos)}")
 
     def _executar_prestadores(self, arquivo):
             """Executa a automação específica de Prestadores"""
@@ -828,7 +814,7 @@ class AutomacaoBradescoApp(ctk.CTk):
                 # Chama a função real de leitura
                 dados = prestadores_read(arquivo)
 
-                if not dados:
+                if dados is None or len(dados) == 0:
                     raise Exception("Nenhum dado foi encontrado no arquivo")
 
                 self.adicionar_log(f"✅ Dados lidos com sucesso! {len(dados)} registros encontrados")
@@ -846,20 +832,13 @@ class AutomacaoBradescoApp(ctk.CTk):
                 caminho_destino = 'databases/prestadores.xlsx'
                 os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
 
-                # Captura a saída do console durante o append
-                with self._capturar_saida_console() as saida:
-                    prestadores_append(caminho_destino, dados)
-                
-                # Processa as mensagens capturadas
-                saida_texto = saida.getvalue().strip()
-                
-                # DEBUG: Mostra o que foi capturado
-                self.adicionar_log(f"🔧 DEBUG: Texto capturado do console: '{saida_texto}'")
-                
+                # As mensagens da gravação vão direto para o log; o resultado diz o que aconteceu
+                resultado = prestadores_append(caminho_destino, dados, origem=arquivo, log=self.adicionar_log)
+                self._registrar_resultado_append(dados, resultado)
+
                 # Verifica especificamente por duplicatas
-                if "já existentes" in saida_texto or "Dados já existentes" in saida_texto:
+                if resultado['status'] == DUPLICADO:
                     self.adicionar_log("🔄 DUPLICATAS DETECTADAS!")
-                    self._processar_mensagens_append(saida)
                     self.adicionar_log("🛡️ PROTEÇÃO ATIVA: Dados duplicados foram rejeitados automaticamente")
                     
                     # Popup específico para duplicatas
@@ -873,9 +852,6 @@ class AutomacaoBradescoApp(ctk.CTk):
                         f"📊 Sistema funcionando corretamente."
                     ))
                 else:
-                    # Processa mensagens normais
-                    self._processar_mensagens_append(saida)
-                    
                     # Popup de sucesso normal
                     self.after(0, lambda: messagebox.showinfo(
                         "Sucesso", 
@@ -906,7 +882,7 @@ class AutomacaoBradescoApp(ctk.CTk):
                 # Chama a função real de leitura
                 dados = procedimentos_read(arquivo)
 
-                if not dados:
+                if dados is None or len(dados) == 0:
                     raise Exception("Nenhum dado foi encontrado no arquivo")
 
                 self.adicionar_log(f"✅ Dados lidos com sucesso! {len(dados)} registros encontrados")
@@ -924,20 +900,13 @@ class AutomacaoBradescoApp(ctk.CTk):
                 caminho_destino = 'databases/procedimentos.xlsx'
                 os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
 
-                # Captura a saída do console durante o append
-                with self._capturar_saida_console() as saida:
-                    procedimentos_append(caminho_destino, dados)
-                
-                # Processa as mensagens capturadas
-                saida_texto = saida.getvalue().strip()
-                
-                # DEBUG: Mostra o que foi capturado
-                self.adicionar_log(f"🔧 DEBUG: Texto capturado do console: '{saida_texto}'")
-                
+                # As mensagens da gravação vão direto para o log; o resultado diz o que aconteceu
+                resultado = procedimentos_append(caminho_destino, dados, origem=arquivo, log=self.adicionar_log)
+                self._registrar_resultado_append(dados, resultado)
+
                 # Verifica especificamente por duplicatas
-                if "já existentes" in saida_texto or "Dados já existentes" in saida_texto:
+                if resultado['status'] == DUPLICADO:
                     self.adicionar_log("🔄 DUPLICATAS DETECTADAS!")
-                    self._processar_mensagens_append(saida)
                     self.adicionar_log("🛡️ PROTEÇÃO ATIVA: Dados duplicados foram rejeitados automaticamente")
                     
                     # Popup específico para duplicatas
@@ -951,9 +920,6 @@ class AutomacaoBradescoApp(ctk.CTk):
                         f"📊 Sistema funcionando corretamente."
                     ))
                 else:
-                    # Processa mensagens normais
-                    self._processar_mensagens_append(saida)
-                    
                     # Popup de sucesso normal
                     self.after(0, lambda: messagebox.showinfo(
                         "Sucesso", 
@@ -985,7 +951,7 @@ class AutomacaoBradescoApp(ctk.CTk):
             # Chama a função real de leitura
             dados = beneficiarios_read(arquivo)
             
-            if not dados:
+            if dados is None or len(dados) == 0:
                 raise Exception("Nenhum dado foi encontrado no arquivo")
                 
             self.adicionar_log(f"✅ Dados lidos com sucesso! {len(dados)} registros encontrados")
@@ -1003,20 +969,13 @@ class AutomacaoBradescoApp(ctk.CTk):
             caminho_destino = 'databases/despesas.xlsx'
             os.makedirs(os.path.dirname(caminho_destino), exist_ok=True)
             
-            # Captura a saída do console durante o append
-            with self._capturar_saida_console() as saida:
-                resultado_append = beneficarios_append(caminho_destino, dados)
-            
-            # Processa as mensagens capturadas
-            saida_texto = saida.getvalue().strip()
-            
-            # DEBUG: Mostra o que foi capturado
-            self.adicionar_log(f"🔧 DEBUG: Texto capturado do console: '{saida_texto}'")
-            
+            # As mensagens da gravação vão direto para o log; o resultado diz o que aconteceu
+            resultado = beneficarios_append(caminho_destino, dados, origem=arquivo, log=self.adicionar_log)
+            self._registrar_resultado_append(dados, resultado)
+
             # Verifica especificamente por duplicatas
-            if "já existentes" in saida_texto or "Dados já existentes" in saida_texto:
+            if resultado['status'] == DUPLICADO:
                 self.adicionar_log("🔄 DUPLICATAS DETECTADAS!")
-                self._processar_mensagens_append(saida)
                 self.adicionar_log("�️ PROTEÇÃO ATIVA: Dados duplicados foram rejeitados automaticamente")
                 
                 # Popup específico para duplicatas
@@ -1030,9 +989,6 @@ class AutomacaoBradescoApp(ctk.CTk):
                     f"📊 Sistema funcionando corretamente."
                 ))
             else:
-                # Processa mensagens normais
-                self._processar_mensagens_append(saida)
-                
                 # Popup de sucesso normal
                 self.after(0, lambda: messagebox.showinfo(
                     "Sucesso", 
@@ -1155,6 +1111,12 @@ class AutomacaoBradescoApp(ctk.CTk):
         self.adicionar_log("Sistema limpo - pronto para nova automacao")
         self.atualizar_estado_botoes()
 
+    def ao_fechar(self):
+        """Encerra os processos de leitura e fecha a janela"""
+        if MODULOS_DISPONIVEL:
+            encerrar_pool()
+        self.destroy()
+
     def adicionar_log(self, mensagem):
         """Adiciona mensagem ao log com timestamp"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -1165,5 +1127,6 @@ class AutomacaoBradescoApp(ctk.CTk):
 
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     app = AutomacaoBradescoApp()
     app.mainloop()
@@ -1,95 +1,113 @@
 import pandas as pd
 import sys
 import os
+import time
+from itertools import islice
 
-def read_excel(caminho_arquivo):
+from comum.competencia import datas_do_periodo
+from comum.extracao import (
+    TAMANHO_LOTE, colunas_do_layout, contrato_tipado, extrair_em_lotes, extrair_registros, marcar_leitura,
+    periodo_do_relatorio,
+)
+from comum.memoria import compactar, concatenar
+from comum.planilha import abrir_planilha, celula_da_linha, iterar_linhas, nomes_abas
+
+# Colunas da tabela de dados (posição na planilha) e como cada uma é extraída
+CAMPOS = [
+    ('codigo', 3, 'carregado'),         # Código (só aparece na 1ª linha do grupo)
+    ('prestador', 6, 'texto'),          # Nome do prestador na coluna G
+    ('qtdeventos', 8, 'numero'),        # Quantidade de eventos
+    ('uf', 9, 'bruto'),                 # UF do prestador
+    ('valor', 10, 'numero'),            # Valor
+    ('inss', 11, 'numero'),             # INSS
+    ('valortotal', 12, 'numero'),       # Valor total
+    ('porctotal', 13, 'porcentagem'),   # % do valor total
+    ('customedio', 15, 'numero'),       # Custo médio
+]
+# Linhas sem nome do prestador (coluna G) são ignoradas
+COLUNA_NOME = 6
+# Linha do cabeçalho da tabela e células do contrato e do período (base zero)
+LINHA_CABECALHO = 12
+CELULA_CONTRATO = (3, 3)
+CELULA_PERIODO = (8, 3)
+
+def read_excel(caminho_arquivo, abas=None):
     """
     Função principal que lê um arquivo Excel específico de estatísticas de beneficiários
     e extrai dados formatados para processamento posterior.
-    """
-    def convert(value, porcentagem=False, zero_if_nan=False):
-        """
-        Função auxiliar para converter e formatar valores do Excel.
-        - Trata valores NaN (células vazias)
-        - Converte números para formato brasileiro (vírgula como decimal)
-        - Formata porcentagens multiplicando por 100
-        """
-        if pd.isna(value) or str(value).strip().lower() == 'nan':
-            return '0' if zero_if_nan else ''
-        
-        # Pega apenas o primeiro elemento se houver espaços (remove texto adicional)
-        raw = str(value).strip().split()[0]
-        try:
-            # Converte vírgula para ponto para processamento numérico
-            val_float = float(raw.replace(',', '.'))
-            if porcentagem:
-                # Para porcentagens: multiplica por 100 e adiciona o símbolo %
-                return f"{val_float * 100:.2f}%".replace('.', ',')
-            else:
-                # Para números normais: converte ponto para vírgula (padrão brasileiro)
-                return str(val_float).replace('.', ',')
-        except:
-            # Se não conseguir converter, retorna o valor original
-            return raw
 
+    Lê todas as abas (os relatórios consolidados trazem um contrato por aba),
+    ou só as de `abas`, e retorna um único DataFrame com as colunas numéricas
+    já tipadas (float64/Int64, percentuais como fração), pronto para o append.
+    O resumo da leitura (linhas, abas, tempo) fica em attrs['leitura'].
+    """
+    inicio = time.perf_counter()
     if not os.path.exists(caminho_arquivo):
         print(f"Erro: O arquivo '{caminho_arquivo}' não foi encontrado.")
         return
     print(f"Lendo o arquivo: {caminho_arquivo}")
     print("-" * 50)
-    # Objeto ExcelFile permite ler múltiplas abas
-    xl_file = pd.ExcelFile(caminho_arquivo)
-    # Processa cada aba da planilha
-    for sheet_name in xl_file.sheet_names:
-        # Lê dados gerais da planilha (cabeçalho)
-        df = pd.read_excel(caminho_arquivo, sheet_name=sheet_name)
-        # Lê a tabela de dados específica (pula as primeiras 14 linhas de cabeçalho)
-        table = pd.read_excel(caminho_arquivo, sheet_name=sheet_name, skiprows=12)
-        
+    partes = list(ler_abas(caminho_arquivo, abas))
+    if not partes:
+        return pd.DataFrame()
+    return marcar_leitura(concatenar(partes), caminho_arquivo, inicio, len(partes))
+
+
+def ler_abas(caminho_arquivo, abas=None):
+    """
+    Registros de cada aba do relatório (todas, ou só as de `abas`), um
+    DataFrame por aba. Cada um vem marcado em `attrs` com a aba, o contrato e
+    o período; abas sem registros ou sem período (capa, resumo) são puladas.
+    """
+    # Arquivo lido uma única vez; metadados vêm das primeiras linhas e a
+    # tabela de dados só com as colunas do layout
+    xl_file = abrir_planilha(caminho_arquivo)
+    for sheet_name in (xl_file.sheet_names if abas is None else abas):
         # Extrai informações do cabeçalho da planilha
-        contrato = df.iloc[2, 3]  # Número do contrato na célula D3
-        data_de_ate = df.iloc[7, 3]  # Período da competência na célula D10
-        dados = []
-        codigo_atual = None  # Variável para manter o certificado atual
-        # Processa cada linha da tabela de dados
-        for i in range(len(table)):
-            # Nome do beneficiário na coluna D (índice 3)
-            nome = table.iloc[i, 6]
-            if pd.isna(nome) or str(nome).strip() == '':
-                continue  # Pula linhas vazias
-            # Lógica especial para certificados: eles não aparecem em todas as linhas
-            # Quando encontrar um novo certificado, guarda para usar nas próximas linhas
-            codigo = table.iloc[i, 3]
-            if not pd.isna(codigo):
-                codigo_atual = str(codigo).strip()
-                # Remove decimais desnecessários (ex: "123.0" vira "123")
-                if codigo_atual.replace('.', '', 1).isdigit():
-                    codigo_atual = str(int(float(codigo_atual)))
-            # Extrai todos os valores das colunas usando a função convert
-            qtdEventos = convert(table.iloc[i, 8])                                    # Status do beneficiário
-            uf = table.iloc[i, 9]                                                       # Quantidade de eventos
-            valor = convert(table.iloc[i, 10])  # % de eventos
-            inss = convert(table.iloc[i, 11])                         # Valor líquido
-            valorTotal = convert(table.iloc[i, 12])          # INSS (força 0 se vazio)
-            porcTotal = convert(table.iloc[i, 13], porcentagem=True)                       # Valor total
-            cutoMedio = convert(table.iloc[i, 15])
-            # Valor total
-            # Monta o dicionário com todos os dados da linha
-            linha = {
-                'codigo': codigo_atual,
-                'prestador': nome.strip(),
-                'qtdeventos': qtdEventos,
-                'uf': uf,
-                'valor': valor,
-                'inss': inss,
-                'valortotal': valorTotal,
-                'porctotal': porcTotal,
-                'customedio': cutoMedio,
-                'relatorio': 'Ranking de Prestadores',
-                'contrato': contrato,
-                'dtcompetde': data_de_ate.split(' ')[0],
-                'dtcompetate': data_de_ate.split(' ')[2],
-            }
-            dados.append(linha)
-        
-        return dados
\ No newline at end of file
+        contrato = xl_file.celula(sheet_name, *CELULA_CONTRATO)  # Número do contrato na célula D4
+        data_de_ate = periodo_do_relatorio(xl_file.celula(sheet_name, *CELULA_PERIODO))  # Período da competência
+        if data_de_ate is None:
+            continue
+
+        # Lê a tabela de dados específica (pula as linhas de cabeçalho do relatório)
+        table = xl_file.colunas(sheet_name, LINHA_CABECALHO + 1, colunas_do_layout(COLUNA_NOME, CAMPOS))
+
+        # Extrai todas as colunas de uma vez (linhas sem nome são descartadas
+        # e o código é propagado para as linhas seguintes do grupo)
+        registros = extrair_registros(table, COLUNA_NOME, CAMPOS)
+        if registros.empty:
+            continue
+
+        yield _completar(registros, contrato, data_de_ate, sheet_name)
+
+
+def _completar(registros, contrato, data_de_ate, aba):
+    """Acrescenta aos registros o tipo do relatório, o contrato e a competência."""
+    registros['relatorio'] = 'Ranking de Prestadores'
+    registros['contrato'] = contrato_tipado(contrato)
+    dt_de, dt_ate = datas_do_periodo(data_de_ate)
+    registros['dtcompetde'] = dt_de
+    registros['dtcompetate'] = dt_ate
+    registros.attrs.update(aba=aba, contrato=contrato_tipado(contrato), periodo=data_de_ate)
+    return compactar(registros)
+
+
+def ler_em_lotes(caminho_arquivo, tamanho_lote=TAMANHO_LOTE, abas=None):
+    """
+    Lê o relatório sob demanda e produz os registros em DataFrames de até
+    `tamanho_lote` linhas da planilha, com as mesmas colunas e tipos de
+    read_excel, aba por aba e marcados em `attrs` como em ler_abas.
+
+    A memória usada não depende do tamanho do relatório, e cada lote pode ser
+    gravado enquanto o restante do arquivo ainda está sendo lido.
+    """
+    for sheet_name in (nomes_abas(caminho_arquivo) if abas is None else abas):
+        linhas = iterar_linhas(caminho_arquivo, sheet_name)
+        cabecalho = list(islice(linhas, LINHA_CABECALHO + 1))
+        contrato = celula_da_linha(cabecalho, *CELULA_CONTRATO)
+        data_de_ate = periodo_do_relatorio(celula_da_linha(cabecalho, *CELULA_PERIODO))
+        if data_de_ate is None:
+            linhas.close()
+            continue
+        for registros in extrair_em_lotes(linhas, COLUNA_NOME, CAMPOS, tamanho_lote):
+            yield _completar(registros, contrato, data_de_ate, sheet_name)
@@ -1,87 +1,143 @@
 ﻿import os
+import time
 from typing import Dict, List
 
 import pandas as pd
 
+from comum.armazenamento import RECUSAR, abrir_base, gravar_lotes, resultado_arquivo
+from comum.competencia import tipar_datas
+from comum.duplicidade import formatar_chaves
+from comum.extracao import converter_coluna
+from comum.valores import tipar_valores, valores_para_planilha
 
-def _num_br_to_float(valor):
-    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
-        return 0.0
-    if isinstance(valor, (int, float)):
-        return float(valor)
-    s = str(valor).strip().replace('.', '').replace('%', '').replace(' ', '')
-    s = s.replace(',', '.')
-    try:
-        return float(s)
-    except Exception:
-        return 0.0
+CHAVE = ('contrato', 'competencia')
 
+# Competencias mensais: as datas da planilha aparecem como mes/ano
+FORMATO_DATA = 'mm/yyyy'
 
-def _num_br_to_int(valor):
-    try:
-        return int(round(_num_br_to_float(valor)))
-    except Exception:
-        return 0
+# Tipagem
+COL_INT = ['numero_vidas']
+COL_FLOAT = ['faturamento', 'evento', 'faturamento_per_capita', 'evento_per_capita']
+COL_PCT = ['perc_eventos']
 
 
-def append_to_excel_formatado(caminho_arquivo: str, dados: List[Dict]):
-    """Anexa dados de sinistralidade em planilha Excel com formatacao."""
-    if not dados:
-        print("Aviso: nao ha dados de sinistralidade para gravar.")
-        return
-
+def preparar_dados(dados) -> pd.DataFrame:
+    """
+    Converte os registros lidos para os tipos da base (DataFrame), com os
+    avisos da conversao e o tempo gasto em attrs ('avisos', 'preparo').
+    """
+    inicio = time.perf_counter()
+    avisos = []
     df_novos = pd.DataFrame(dados)
 
-    col_int = ['numero_vidas']
-    col_float = ['faturamento', 'evento', 'faturamento_per_capita', 'evento_per_capita']
-    col_pct = ['perc_eventos']
-
-    for coluna in col_int:
+    # Colunas que ja chegam tipadas do leitor sao usadas como estao; textos no
+    # formato brasileiro passam pelo conversor vetorizado de comum.extracao.
+    # Vazio (ou texto invalido) vira 0
+    for coluna in COL_INT:
         if coluna in df_novos.columns:
-            df_novos[coluna] = df_novos[coluna].apply(_num_br_to_int)
+            df_novos[coluna] = converter_coluna(df_novos[coluna], padrao_br=True, avisos=avisos).fillna(0).round().astype(int)
 
-    for coluna in col_float:
+    for coluna in COL_FLOAT:
         if coluna in df_novos.columns:
-            df_novos[coluna] = df_novos[coluna].apply(_num_br_to_float)
+            df_novos[coluna] = converter_coluna(df_novos[coluna], padrao_br=True, avisos=avisos).fillna(0.0)
 
-    for coluna in col_pct:
+    for coluna in COL_PCT:
         if coluna in df_novos.columns:
-            df_novos[coluna] = df_novos[coluna].apply(lambda v: _num_br_to_float(v) / 100.0)
-
-    if not os.path.exists(caminho_arquivo):
-        os.makedirs(os.path.dirname(caminho_arquivo), exist_ok=True)
-        with pd.ExcelWriter(caminho_arquivo, engine='xlsxwriter') as writer:
-            df_novos.to_excel(writer, sheet_name='Dados', index=False)
-            _formatar(writer, df_novos, col_float, col_pct)
-        print("OK. Planilha criada com os dados de Sinistralidade.")
-        return
-
-    df_exist = pd.read_excel(caminho_arquivo)
-    duplicados = []
-    if not df_exist.empty:
-        if 'contrato' not in df_exist.columns:
-            df_exist['contrato'] = ''
-        if 'competencia' not in df_exist.columns:
-            df_exist['competencia'] = ''
-        serie_contrato = df_exist['contrato'].astype(str)
-        serie_competencia = df_exist['competencia'].astype(str)
-        for _, linha in df_novos.iterrows():
-            contrato = str(linha.get('contrato', ''))
-            competencia = str(linha.get('competencia', ''))
-            mask = (serie_contrato == contrato) & (serie_competencia == competencia)
-            if mask.any():
-                duplicados.append((contrato, competencia))
-
-    if duplicados:
-        print(f"Atencao: dados ja existentes para: {duplicados[0]}. Nenhum dado foi adicionado.")
-        return
-
-    df_final = pd.concat([df_exist, df_novos], ignore_index=True)
-    with pd.ExcelWriter(caminho_arquivo, engine='xlsxwriter') as writer:
-        df_final.to_excel(writer, sheet_name='Dados', index=False)
-        _formatar(writer, df_final, col_float, col_pct)
-
-    print("OK. Dados de Sinistralidade adicionados com sucesso, sem duplicidades.")
+            # o leitor ja entrega a fracao (0-1); textos vem como 0-100
+            escala = 1 if pd.api.types.is_numeric_dtype(df_novos[coluna]) else 100
+            df_novos[coluna] = converter_coluna(df_novos[coluna], padrao_br=True, escala=escala, avisos=avisos).fillna(0.0)
+
+    # Dinheiro em centavos e percentuais em pontos-base (comum.valores)
+    tipar_valores(df_novos, COL_FLOAT, COL_PCT)
+
+    # Competencias e periodos como datas (textos de listas de registros tambem)
+    df_novos = tipar_datas(df_novos)
+
+    # Avisos da conversao e tempo do preparo seguem com os registros ate o
+    # resultado da gravacao (comum.armazenamento)
+    df_novos.attrs.update(avisos=avisos, preparo=round(time.perf_counter() - inicio, 3))
+    return df_novos
+
+
+def append_to_excel_formatado(caminho_arquivo: str, dados: List[Dict], materializar: bool = True, politica: str = RECUSAR,
+                              origem: str = '', log=print) -> dict:
+    """
+    Anexa dados de sinistralidade em planilha Excel com formatacao.
+    Chaves ja gravadas seguem a `politica` (RECUSAR, IGNORAR_EXISTENTES ou
+    SUBSTITUIR, de comum.armazenamento). As linhas gravadas levam o numero da
+    ingestao de `origem` (o relatorio lido).
+    Com materializar=False o lote so e gravado como particao da base e a
+    planilha e regerada depois, por materializar_excel.
+    Retorna o resultado da gravacao (resultado_arquivo, de
+    comum.armazenamento): status, linhas lidas e gravadas, chaves
+    repetidas, avisos da conversao e tempo de cada etapa. As mensagens
+    vao para `log` (print, por padrao).
+    """
+    if dados is None or len(dados) == 0:
+        log("Aviso: nao ha dados de sinistralidade para gravar.")
+        return resultado_arquivo(origem, 'vazio')
+
+    df_novos = preparar_dados(dados)
+
+    # Base particionada: cada chave do lote vira uma particao em
+    # databases/<nome>.partes/ e a planilha e gerada a partir delas
+    base = abrir_base(caminho_arquivo, CHAVE)
+    planilha_nova = not os.path.exists(caminho_arquivo)
+
+    # Checagem de duplicidade por (contrato, competencia) nas chaves ja gravadas
+    # As chaves repetidas seguem a politica: RECUSAR (padrao) nao grava nada,
+    # IGNORAR_EXISTENTES grava so as novas e SUBSTITUIR troca as gravadas
+    gravado = gravar_lotes(
+        base, [(origem, df_novos)], _formatar_base, FORMATO_DATA, exibir=_exibir_base,
+        politica=politica, materializar=materializar,
+    )[0]
+    for aviso in gravado['avisos']:
+        log(f"⚠️ {aviso}")
+
+    if gravado['status'] == 'duplicado':
+        log(f"Atencao: dados ja existentes para: {formatar_chaves(gravado['chaves'])}. Nenhum dado foi adicionado.")
+        return gravado
+    if gravado['ignoradas']:
+        log(f"Atencao: dados ja existentes mantidos para: {formatar_chaves(gravado['ignoradas'])}; as demais chaves foram adicionadas.")
+    if gravado['substituidas']:
+        log(f"Atencao: dados substituidos para: {formatar_chaves(gravado['substituidas'])}.")
+
+    if planilha_nova and materializar:
+        log("OK. Planilha criada com os dados de Sinistralidade.")
+    else:
+        log("OK. Dados de Sinistralidade adicionados com sucesso, sem duplicidades.")
+    return gravado
+
+
+def gravar_lote(caminho_arquivo: str, lotes: list, politica: str = RECUSAR) -> list:
+    """
+    Grava de uma vez os registros de varios arquivos, dados como pares
+    (arquivo de origem, registros lidos). Chaves ja existentes na base ou
+    repetidas no lote seguem a `politica` (por padrao, recusam o arquivo
+    inteiro); os demais viram particoes numa unica gravacao e a planilha e
+    regerada uma so vez. Retorna o resultado de cada arquivo, na ordem
+    recebida.
+    """
+    preparados = [
+        (origem, preparar_dados(dados) if dados is not None and len(dados) > 0 else None)
+        for origem, dados in lotes
+    ]
+    return gravar_lotes(abrir_base(caminho_arquivo, CHAVE), preparados, _formatar_base, FORMATO_DATA, exibir=_exibir_base, politica=politica)
+
+
+def materializar_excel(caminho_arquivo: str):
+    """Regera a planilha formatada a partir das particoes, se houver lotes pendentes."""
+    base = abrir_base(caminho_arquivo, CHAVE)
+    if base.pendente():
+        base.materializar(_formatar_base, FORMATO_DATA, exibir=_exibir_base)
+
+
+def _formatar_base(writer: pd.ExcelWriter, df: pd.DataFrame):
+    _formatar(writer, df, COL_FLOAT, COL_PCT)
+
+
+def _exibir_base(df: pd.DataFrame) -> pd.DataFrame:
+    return valores_para_planilha(df, COL_FLOAT, COL_PCT)
 
 
 def _formatar(writer: pd.ExcelWriter, df: pd.DataFrame, col_float: List[str], col_pct: List[str]):
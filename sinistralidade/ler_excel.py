@@ -1,24 +1,23 @@
 ﻿import os
 import re
+import time
 import unicodedata
-from datetime import datetime
-from typing import Dict, List
+from typing import List
 
+import numpy as np
 import pandas as pd
 
+from comum.competencia import converter_datas, data_competencia
+from comum.extracao import (
+    converter_inteiros, converter_numeros, converter_porcentagens, linhas_de_total, marcar_leitura,
+)
+from comum.layouts import buscar_layout, colunas_presentes, guardar_layout
+from comum.memoria import compactar
+from comum.planilha import abrir_planilha
 
-def _to_str_br(value, is_percent: bool = False) -> str:
-    if pd.isna(value) or str(value).strip().lower() == "nan":
-        return ""
-    raw = str(value).strip().split()[0]
-    try:
-        number = float(raw.replace(".", "").replace(",", "."))
-        formatted = f"{number:.2f}"
-        if is_percent:
-            formatted += "%"
-        return formatted.replace(".", ",")
-    except Exception:
-        return raw
+# Linhas do topo da aba onde ficam os metadados e, em geral, o cabeçalho da
+# tabela; se o cabeçalho não estiver nelas, a aba inteira é percorrida
+LINHAS_BUSCA_CABECALHO = 40
 
 
 def _norm(texto) -> str:
@@ -31,46 +30,63 @@ def _norm(texto) -> str:
         return str(texto).lower().strip()
 
 
-def _format_mes(valor) -> str:
-    if pd.isna(valor):
-        return ""
-    if isinstance(valor, (pd.Timestamp, datetime)):
-        return valor.strftime("%m/%Y")
-    texto = str(valor).strip()
-    if not texto:
-        return ""
-    try:
-        convertido = pd.to_datetime(valor, errors='coerce', dayfirst=False)
-        if pd.notna(convertido):
-            return convertido.strftime("%m/%Y")
-    except Exception:
-        pass
-    encontrado = re.search(r"\d{2}/\d{4}", texto)
-    if encontrado:
-        return encontrado.group(0)
-    try:
-        convertido = pd.to_datetime(texto, format="%Y-%m-%d", errors='coerce')
-        if pd.notna(convertido):
-            return convertido.strftime("%m/%Y")
-    except Exception:
-        pass
-    return texto
-
-
-def read_excel(caminho_arquivo: str) -> List[Dict[str, str]]:
-    """Le o relatorio de sinistralidade (.xls/.xlsx) e retorna registros limpos."""
+def _linha_cabecalho(df_raw):
+    """Linha (base zero) com as colunas "Mês" e "Faturamento", ou None."""
+    for r in range(len(df_raw)):
+        linha_norm = [_norm(val) for val in df_raw.iloc[r].tolist()]
+        if 'mes' in linha_norm and any('fatur' in v for v in linha_norm):
+            return r
+    return None
+
+
+def _mapear_colunas(tabela: pd.DataFrame) -> dict:
+    """Coluna da tabela de onde sai cada campo; None se não localizada."""
+    def first_col(predicate):
+        for col in tabela.columns:
+            nome = _norm(col)
+            if predicate(col, nome):
+                return col
+        return None
+
+    col_mes = first_col(lambda col, nome: 'mes' in nome)
+    col_faturamento = first_col(lambda col, nome: 'fatur' in nome and 'capit' not in nome)
+    col_evento = first_col(lambda col, nome: 'evento' in nome and 'capit' not in nome and '%' not in nome)
+    col_perc_evento = first_col(lambda col, nome: ('%' in str(col) or '%' in nome or 'percent' in nome) and 'evento' in nome)
+    if col_evento and col_perc_evento and col_evento == col_perc_evento:
+        col_perc_evento = None
+    col_vidas = first_col(lambda col, nome: 'vida' in nome)
+    col_fat_capita = first_col(lambda col, nome: 'capit' in nome and 'fatur' in nome)
+    col_evt_capita = first_col(lambda col, nome: 'capit' in nome and 'evento' in nome)
+    return {
+        'competencia': col_mes,
+        'faturamento': col_faturamento,
+        'evento': col_evento,
+        'perc_eventos': col_perc_evento,
+        'numero_vidas': col_vidas,
+        'faturamento_per_capita': col_fat_capita,
+        'evento_per_capita': col_evt_capita,
+    }
+
+
+def read_excel(caminho_arquivo: str) -> pd.DataFrame:
+    """
+    Le o relatorio de sinistralidade (.xls/.xlsx) e retorna um DataFrame com
+    valores float, numero de vidas inteiro e percentual como fracao.
+    O resumo da leitura (linhas, abas, tempo) fica em attrs['leitura'].
+    """
+    inicio = time.perf_counter()
 
     if not os.path.exists(caminho_arquivo):
         print(f"Erro: arquivo nao encontrado: {caminho_arquivo}")
-        return []
+        return pd.DataFrame()
 
-    xls = pd.ExcelFile(caminho_arquivo)
-    dados_out: List[Dict[str, str]] = []
+    xls = abrir_planilha(caminho_arquivo)
+    registros_abas: List[pd.DataFrame] = []
 
     for sheet in xls.sheet_names:
-        df_raw = pd.read_excel(caminho_arquivo, sheet_name=sheet, header=None)
+        df_raw = xls.sonda(sheet, nrows=LINHAS_BUSCA_CABECALHO)
         try:
-            print(f"[Sinistralidade] Aba='{sheet}' shape={df_raw.shape}")
+            print(f"[Sinistralidade] Aba='{sheet}' linhas do topo={df_raw.shape}")
         except Exception:
             pass
 
@@ -96,71 +112,65 @@ def read_excel(caminho_arquivo: str) -> List[Dict[str, str]]:
                     break
         contrato = '' if pd.isna(contrato) else str(contrato).strip()
 
-        periodo_de, periodo_ate = '', ''
+        periodo_de, periodo_ate = pd.NaT, pd.NaT
         for r in range(min(15, len(df_raw))):
             linha = df_raw.iloc[r].tolist()
             linha_txt = ' '.join(str(x) for x in linha if not pd.isna(x))
             if 'period' in _norm(linha_txt):
                 encontrados = re.findall(r"\d{2}/\d{4}", linha_txt)
                 if encontrados:
-                    periodo_de = encontrados[0]
-                    periodo_ate = encontrados[-1]
+                    periodo_de = data_competencia(encontrados[0], mensal=True)
+                    periodo_ate = data_competencia(encontrados[-1], mensal=True)
                     break
 
-        header_row = None
-        for r in range(len(df_raw)):
-            linha_norm = [_norm(val) for val in df_raw.iloc[r].tolist()]
-            if 'mes' in linha_norm and any('fatur' in v for v in linha_norm):
-                header_row = r
-                break
+        # Layout já visto: linha do cabeçalho e colunas vêm do cache de layouts
+        layout = buscar_layout('sinistralidade', df_raw)
+        header_row = _linha_cabecalho(df_raw) if layout is None else layout['linha']
+        if header_row is None and len(df_raw) == LINHAS_BUSCA_CABECALHO:
+            header_row = _linha_cabecalho(xls.folha(sheet))
         if header_row is None:
             continue
 
-        tabela = pd.read_excel(caminho_arquivo, sheet_name=sheet, header=header_row)
+        tabela = xls.tabela(sheet, header=header_row)
         tabela.columns = [str(col) for col in tabela.columns]
 
-        def first_col(predicate):
-            for col in tabela.columns:
-                nome = _norm(col)
-                if predicate(col, nome):
-                    return col
-            return None
-
-        col_mes = first_col(lambda col, nome: 'mes' in nome)
-        col_faturamento = first_col(lambda col, nome: 'fatur' in nome and 'capit' not in nome)
-        col_evento = first_col(lambda col, nome: 'evento' in nome and 'capit' not in nome and '%' not in nome)
-        col_perc_evento = first_col(lambda col, nome: ('%' in str(col) or '%' in nome or 'percent' in nome) and 'evento' in nome)
-        if col_evento and col_perc_evento and col_evento == col_perc_evento:
-            col_perc_evento = None
-        col_vidas = first_col(lambda col, nome: 'vida' in nome)
-        col_fat_capita = first_col(lambda col, nome: 'capit' in nome and 'fatur' in nome)
-        col_evt_capita = first_col(lambda col, nome: 'capit' in nome and 'evento' in nome)
-
-        def _is_total(value) -> bool:
-            texto = str(value).strip().lower()
-            return not texto or texto.startswith('total')
-
-        for _, row in tabela.iterrows():
-            mes_val = row.get(col_mes, '') if col_mes else ''
-            if _is_total(mes_val):
-                continue
-            competencia = _format_mes(mes_val)
-
-            registro = {
-                'competencia': competencia,
-                'faturamento': _to_str_br(row.get(col_faturamento, '')),
-                'evento': _to_str_br(row.get(col_evento, '')),
-                'perc_eventos': _to_str_br(row.get(col_perc_evento, ''), is_percent=True),
-                'numero_vidas': _to_str_br(row.get(col_vidas, '')),
-                'faturamento_per_capita': _to_str_br(row.get(col_fat_capita, '')),
-                'evento_per_capita': _to_str_br(row.get(col_evt_capita, '')),
-                'relatorio': 'Estatisticas de Sinistralidade',
-                'contrato': contrato,
-                'dtcompetde': periodo_de,
-                'dtcompetate': periodo_ate,
-                'periodo_referencia_de': periodo_de,
-                'periodo_referencia_ate': periodo_ate,
-            }
-            dados_out.append(registro)
-
-    return dados_out
+        if layout is not None and colunas_presentes(tabela, layout['colunas']):
+            colunas = layout['colunas']
+        else:
+            colunas = _mapear_colunas(tabela)
+            guardar_layout('sinistralidade', df_raw, header_row, colunas)
+
+        def coluna(col):
+            if col is None:
+                return pd.Series(np.nan, index=tabela.index, dtype=object)
+            return tabela[col]
+
+        meses = coluna(colunas['competencia'])
+        tabela = tabela[~linhas_de_total(meses).values]
+        if tabela.empty:
+            continue
+
+        def numeros(campo):
+            return converter_numeros(coluna(colunas[campo]), padrao_br=True)
+
+        registros_abas.append(pd.DataFrame({
+            'competencia': converter_datas(coluna(colunas['competencia']), mensal=True),
+            'faturamento': numeros('faturamento'),
+            'evento': numeros('evento'),
+            'perc_eventos': converter_porcentagens(coluna(colunas['perc_eventos']), escala=100, padrao_br=True),
+            'numero_vidas': converter_inteiros(coluna(colunas['numero_vidas']), padrao_br=True),
+            'faturamento_per_capita': numeros('faturamento_per_capita'),
+            'evento_per_capita': numeros('evento_per_capita'),
+            'relatorio': 'Estatisticas de Sinistralidade',
+            'contrato': contrato,
+            'dtcompetde': periodo_de,
+            'dtcompetate': periodo_ate,
+            'periodo_referencia_de': periodo_de,
+            'periodo_referencia_ate': periodo_ate,
+        }).reset_index(drop=True))
+
+    if not registros_abas:
+        return pd.DataFrame()
+    # Textos repetidos como category e inteiros em 32 bits (comum.memoria)
+    df = compactar(pd.concat(registros_abas, ignore_index=True))
+    return marcar_leitura(df, caminho_arquivo, inicio, len(registros_abas))
@@ -1,129 +1,156 @@
 import pandas as pd
 import os
+import time
+
+from comum.competencia import datas_do_periodo
+from comum.extracao import (coluna_ou_vazia, contrato_tipado, converter_numeros,
+                            converter_porcentagens, linhas_de_total, marcar_leitura)
+from comum.layouts import buscar_layout, colunas_presentes, guardar_layout
+from comum.memoria import compactar
+from comum.planilha import abrir_planilha
+
+# Linhas do topo da aba onde ficam os metadados e o cabeçalho da tabela
+LINHAS_BUSCA_CABECALHO = 40
+
+
+def _mapear_colunas(table: pd.DataFrame) -> dict:
+    """Coluna da tabela (nomes já em minúsculas) de onde sai cada campo; None se não localizada."""
+    col_grupo = next((c for c in table.columns if 'grupo' in str(c).lower()), None)
+    col_qtd = next((c for c in table.columns if 'qtd' in str(c).lower()), None)
+    col_perc_evt = next((c for c in table.columns if '%' in str(c) and 'sobre' in str(c).lower()), None)
+    col_val_liq = next((c for c in table.columns if 'valor liq' in str(c).lower() or 'líq' in str(c).lower() or 'liq' in str(c).lower()), None)
+    col_inss = next((c for c in table.columns if 'inss' in str(c).lower()), None)
+    col_val_tot = next((c for c in table.columns if 'valor total' in str(c).lower() or str(c).lower().startswith('valor total')), None)
+    col_perc_val = next((c for c in table.columns if '%' in str(c) and 'sobre total' in str(c).lower() and c != col_perc_evt), None)
+    col_custo_medio = next((c for c in table.columns if 'custo' in str(c).lower()), None)
+    col_part_ben = next((c for c in table.columns if 'partic' in str(c).lower() or 'benef' in str(c).lower()), None)
+
+    # Percentual associado ao beneficiário: tenta pegar a coluna % logo após 'parc. beneficiário'
+    col_perc_ben = None
+    possiveis_pct = [c for c in table.columns if '%' in str(c)]
+    if col_part_ben is not None:
+        cols_list = list(table.columns)
+        try:
+            i = cols_list.index(col_part_ben)
+            if i + 1 < len(cols_list) and cols_list[i + 1] in possiveis_pct:
+                col_perc_ben = cols_list[i + 1]
+        except Exception:
+            pass
+    if col_perc_ben is None and len(possiveis_pct) >= 3:
+        # fallback: terceira coluna de % (após eventos e valor)
+        restantes = [c for c in possiveis_pct if c not in [col_perc_evt, col_perc_val]]
+        if restantes:
+            col_perc_ben = restantes[0]
+    return {
+        'grupo': col_grupo,
+        'qtdeventos': col_qtd,
+        'sobretotal': col_perc_evt,
+        'valorliquido': col_val_liq,
+        'inss': col_inss,
+        'valortotal': col_val_tot,
+        'porctotal': col_perc_val,
+        'customedio': col_custo_medio,
+        'partibeneficiario': col_part_ben,
+        'porcsobretotal': col_perc_ben,
+    }
 
 
 def read_excel(caminho_arquivo: str):
     """
-    Lê o relatório ESTATISTICAS DE TERAPIAS (.xls/.xlsx) e retorna uma lista de
-    dicionários normalizados prontos para append no banco Excel.
+    Lê o relatório ESTATISTICAS DE TERAPIAS (.xls/.xlsx) e retorna um DataFrame
+    normalizado pronto para append no banco Excel.
 
     Estratégia (segue o padrão dos módulos Exames/Consultas):
     - Detecta automaticamente a linha do cabeçalho nas primeiras linhas.
     - Remove linhas de totais/subtotais (ex.: "TOTAL").
-    - Converte números/percentuais para strings no formato brasileiro; a
-      normalização para tipos numéricos é feita no módulo de append.
+    - Converte números para float64 e percentuais (0-100 no relatório) para
+      fração, coluna a coluna; o append grava esses tipos diretamente.
     - Extrai contrato e período (dtcompetde/dtcompetate) do cabeçalho superior.
+    - Registra o resumo da leitura (linhas, abas, tempo) em attrs['leitura'].
     """
-
-    def _to_str_br(value, is_percent=False):
-        if pd.isna(value) or str(value).strip().lower() == 'nan':
-            return ''
-        raw = str(value).strip().split()[0]
-        try:
-            num = float(raw.replace('.', '').replace(',', '.'))
-            if is_percent:
-                return f"{num:.2f}%".replace('.', ',')
-            return f"{num:.2f}".replace('.', ',')
-        except Exception:
-            return raw
+    inicio = time.perf_counter()
 
     if not os.path.exists(caminho_arquivo):
         print(f"Erro: arquivo não encontrado: {caminho_arquivo}")
-        return []
+        return pd.DataFrame()
 
-    xl = pd.ExcelFile(caminho_arquivo)
-    dados_out = []
+    xl = abrir_planilha(caminho_arquivo)
+    registros_abas = []
 
     for sheet in xl.sheet_names:
-        df_full = pd.read_excel(caminho_arquivo, sheet_name=sheet, header=None)
+        topo = xl.sonda(sheet, nrows=LINHAS_BUSCA_CABECALHO)
 
         # Metadados (mesmo padrão dos outros relatórios Bradesco)
         try:
-            contrato = df_full.iloc[2, 3]
+            contrato = topo.iloc[2, 3]
         except Exception:
             contrato = ''
         try:
-            periodo = df_full.iloc[8, 3] if not pd.isna(df_full.iloc[8, 3]) else df_full.iloc[9, 3]
+            periodo = topo.iloc[8, 3] if not pd.isna(topo.iloc[8, 3]) else topo.iloc[9, 3]
         except Exception:
             periodo = ''
 
-        dt_de, dt_ate = '', ''
-        if isinstance(periodo, str):
-            partes = periodo.split()
-            if len(partes) >= 3:
-                dt_de, dt_ate = partes[0], partes[2]
+        dt_de, dt_ate = datas_do_periodo(periodo)
+
+        # Layout já visto: linha do cabeçalho e colunas vêm do cache de layouts
+        layout = buscar_layout('terapias', topo)
 
         # Tenta localizar a linha do cabeçalho
-        header_row = None
-        for idx in range(min(40, len(df_full))):
-            linha = df_full.iloc[idx].astype(str).str.strip().str.lower().tolist()
+        header_row = None if layout is None else layout['linha']
+        for idx in (range(len(topo)) if layout is None else ()):
+            linha = topo.iloc[idx].astype(str).str.strip().str.lower().tolist()
             if any(('grupo' in c) or ('qtd' in c) or ('valor' in c) for c in linha):
                 header_row = idx
                 break
 
         if header_row is None:
-            table = pd.read_excel(caminho_arquivo, sheet_name=sheet, skiprows=12)
+            table = xl.tabela(sheet, header=12)
         else:
-            table = pd.read_excel(caminho_arquivo, sheet_name=sheet, header=header_row)
+            table = xl.tabela(sheet, header=header_row)
 
         # Normalização leve dos nomes
         cols_map = {c: str(c).strip().lower() for c in table.columns}
         table.rename(columns=cols_map, inplace=True)
 
-        # Heurísticas de mapeamento
-        col_grupo = next((c for c in table.columns if 'grupo' in str(c).lower()), None)
-        col_qtd = next((c for c in table.columns if 'qtd' in str(c).lower()), None)
-        col_perc_evt = next((c for c in table.columns if '%' in str(c) and 'sobre' in str(c).lower()), None)
-        col_val_liq = next((c for c in table.columns if 'valor liq' in str(c).lower() or 'líq' in str(c).lower() or 'liq' in str(c).lower()), None)
-        col_inss = next((c for c in table.columns if 'inss' in str(c).lower()), None)
-        col_val_tot = next((c for c in table.columns if 'valor total' in str(c).lower() or str(c).lower().startswith('valor total')), None)
-        col_perc_val = next((c for c in table.columns if '%' in str(c) and 'sobre total' in str(c).lower() and c != col_perc_evt), None)
-        col_custo_medio = next((c for c in table.columns if 'custo' in str(c).lower()), None)
-        col_part_ben = next((c for c in table.columns if 'partic' in str(c).lower() or 'benef' in str(c).lower()), None)
-
-        # Percentual associado ao beneficiário: tenta pegar a coluna % logo após 'parc. beneficiário'
-        col_perc_ben = None
-        possiveis_pct = [c for c in table.columns if '%' in str(c)]
-        if col_part_ben is not None:
-            cols_list = list(table.columns)
-            try:
-                i = cols_list.index(col_part_ben)
-                if i + 1 < len(cols_list) and cols_list[i + 1] in possiveis_pct:
-                    col_perc_ben = cols_list[i + 1]
-            except Exception:
-                pass
-        if col_perc_ben is None and len(possiveis_pct) >= 3:
-            # fallback: terceira coluna de % (após eventos e valor)
-            restantes = [c for c in possiveis_pct if c not in [col_perc_evt, col_perc_val]]
-            if restantes:
-                col_perc_ben = restantes[0]
-
-        def _is_total(texto):
-            t = str(texto).strip().upper()
-            return t.startswith('TOTAL') or t == '' or t == 'NAN'
-
-        for _, row in table.iterrows():
-            grupo = row.get(col_grupo, '') if col_grupo is not None else ''
-            if _is_total(grupo):
-                continue
-
-            linha_out = {
-                'grupo': str(grupo).strip(),
-                'qtdeventos': _to_str_br(row.get(col_qtd, '')),
-                'sobretotal': _to_str_br(row.get(col_perc_evt, ''), is_percent=True),
-                'valorliquido': _to_str_br(row.get(col_val_liq, '')),
-                'inss': _to_str_br(row.get(col_inss, '')),
-                'valortotal': _to_str_br(row.get(col_val_tot, '')),
-                'porctotal': _to_str_br(row.get(col_perc_val, ''), is_percent=True),
-                'customedio': _to_str_br(row.get(col_custo_medio, '')),
-                'partibeneficiario': _to_str_br(row.get(col_part_ben, '')),
-                'porcsobretotal': _to_str_br(row.get(col_perc_ben, ''), is_percent=True),
-                'relatorio': 'Estatísticas de Terapias',
-                'contrato': str(contrato).strip() if not pd.isna(contrato) else '',
-                'dtcompetde': dt_de,
-                'dtcompetate': dt_ate,
-            }
-            dados_out.append(linha_out)
-
-    return dados_out
+        if layout is not None and colunas_presentes(table, layout['colunas']):
+            colunas = layout['colunas']
+        else:
+            colunas = _mapear_colunas(table)
+            if header_row is not None:
+                guardar_layout('terapias', topo, header_row, colunas)
+
+        # Remove linhas de totais e vazias
+        grupo = coluna_ou_vazia(table, colunas['grupo'])
+        validas = ~linhas_de_total(grupo)
+        table = table[validas.values]
+
+        def _numeros(campo):
+            return converter_numeros(coluna_ou_vazia(table, colunas[campo]), padrao_br=True)
+
+        def _porcentagens(campo):
+            return converter_porcentagens(coluna_ou_vazia(table, colunas[campo]), escala=100, padrao_br=True)
+
+        registros = pd.DataFrame({
+            'grupo': grupo[validas.values].astype(str).str.strip(),
+            'qtdeventos': _numeros('qtdeventos'),
+            'sobretotal': _porcentagens('sobretotal'),
+            'valorliquido': _numeros('valorliquido'),
+            'inss': _numeros('inss'),
+            'valortotal': _numeros('valortotal'),
+            'porctotal': _porcentagens('porctotal'),
+            'customedio': _numeros('customedio'),
+            'partibeneficiario': _numeros('partibeneficiario'),
+            'porcsobretotal': _porcentagens('porcsobretotal'),
+        })
+        registros['relatorio'] = 'Estatísticas de Terapias'
+        registros['contrato'] = contrato_tipado(contrato)
+        registros['dtcompetde'] = dt_de
+        registros['dtcompetate'] = dt_ate
+        registros_abas.append(registros)
+
+    if not registros_abas:
+        return pd.DataFrame()
+    # Textos repetidos como category e inteiros em 32 bits (comum.memoria)
+    df = compactar(pd.concat(registros_abas, ignore_index=True))
+    return marcar_leitura(df, caminho_arquivo, inicio, len(registros_abas))
 
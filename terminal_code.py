@@ -11,6 +11,9 @@ try:
     from procedimentos.append_excel import append_to_excel_formatado as procedimentos_append
     from prestadores.ler_excel import read_excel as prestadores_read
     from prestadores.append_excel import append_to_excel_formatado as prestadores_append
+    from comum.planilha import LINHAS_METADADOS, abrir_planilha
+    from comum.lote import desfazer_ingestao, listar_ingestoes
+    from comum.registro import TIPOS_RELATORIO
     MODULOS_DISPONIVEL = True
 except ImportError as e:
     print(f"⚠️  Erro: Módulos de automação não encontrados: {e}")
@@ -36,6 +39,7 @@ def exibir_menu():
     print("1  Automação de Beneficiários")
     print("2  Automação de Prestadores")
     print("3  Automação de Procedimentos")
+    print("4  Desfazer uma Ingestão")
     print("9  Ajuda e Solução de Problemas")
     print("0  Sair do Sistema")
     print("-" * 30)
@@ -63,8 +67,10 @@ def validar_arquivo(caminho):
         return False
     
     # Tenta fazer uma leitura básica para verificar se é um Excel válido
+    # (só o topo da primeira aba; a leitura fica em cache e é reaproveitada
+    # pela automação em seguida)
     try:
-        pd.read_excel(caminho, nrows=0)  # Lê apenas o cabeçalho
+        abrir_planilha(caminho).sonda(0, nrows=LINHAS_METADADOS)
         return True
     except Exception as e:
         error_msg = str(e).lower()
@@ -110,7 +116,7 @@ def executar_automacao_beneficiarios(caminho_arquivo):
         print("📖 Lendo dados do arquivo...")
         dados = beneficiarios_read(caminho_arquivo)
         
-        if dados and len(dados) > 0:
+        if dados is not None and len(dados) > 0:
             print(f"📊 {len(dados)} registros encontrados no arquivo.")
             
             # Define o caminho da planilha de destino
@@ -118,24 +124,19 @@ def executar_automacao_beneficiarios(caminho_arquivo):
             
             print(f"💾 Salvando dados em: {caminho_destino}")
             
-            # Captura a saída da função append para verificar duplicatas
-            import io
-            import contextlib
-            
-            output_buffer = io.StringIO()
-            with contextlib.redirect_stdout(output_buffer):
-                beneficiarios_append(caminho_destino, dados)
-            
-            output = output_buffer.getvalue()
+            # O append devolve o resultado da gravação; as mensagens dele ficam
+            # guardadas para os detalhes das duplicatas
+            mensagens = []
+            resultado = beneficiarios_append(caminho_destino, dados, origem=caminho_arquivo, log=mensagens.append)
             
             # Verifica se houve duplicatas
-            if "já existentes" in output or "duplicações" in output:
+            if resultado['status'] == 'duplicado':
                 # print("⚠️  ATENÇÃO: Foram encontrados dados duplicados!")
-                print("📋 Detalhes:", output.strip())
+                print("📋 Detalhes:", "\n".join(mensagens))
             else:
                 print("✅ Automação de beneficiários concluída com sucesso!")
-                if "adicionados com sucesso" in output:
-                    print("📈 Novos dados foram adicionados à planilha.")
+                if resultado['linhas']:
+                    print(f"📈 {resultado['linhas']} novos registros foram adicionados à planilha.")
                     
         elif dados is not None and len(dados) == 0:
             print("⚠️  O arquivo foi lido mas não contém dados válidos.")
@@ -186,7 +187,7 @@ def executar_automacao_prestadores(caminho_arquivo):
         print("📖 Lendo dados do arquivo...")
         dados = prestadores_read(caminho_arquivo)
         
-        if dados and len(dados) > 0:
+        if dados is not None and len(dados) > 0:
             print(f"📊 {len(dados)} registros encontrados no arquivo.")
             
             # Define o caminho da planilha de destino
@@ -194,24 +195,19 @@ def executar_automacao_prestadores(caminho_arquivo):
             
             print(f"💾 Salvando dados em: {caminho_destino}")
             
-            # Captura a saída da função append para verificar duplicatas
-            import io
-            import contextlib
-            
-            output_buffer = io.StringIO()
-            with contextlib.redirect_stdout(output_buffer):
-                prestadores_append(caminho_destino, dados)
-            
-            output = output_buffer.getvalue()
+            # O append devolve o resultado da gravação; as mensagens dele ficam
+            # guardadas para os detalhes das duplicatas
+            mensagens = []
+            resultado = prestadores_append(caminho_destino, dados, origem=caminho_arquivo, log=mensagens.append)
             
             # Verifica se houve duplicatas
-            if "já existentes" in output or "duplicações" in output:
+            if resultado['status'] == 'duplicado':
                 print("⚠️  ATENÇÃO: Foram encontrados dados duplicados!")
-                print("📋 Detalhes:", output.strip())
+                print("📋 Detalhes:", "\n".join(mensagens))
             else:
                 print("✅ Automação de prestadores concluída com sucesso!")
-                if "adicionados com sucesso" in output:
-                    print("📈 Novos dados foram adicionados à planilha.")
+                if resultado['linhas']:
+                    print(f"📈 {resultado['linhas']} novos registros foram adicionados à planilha.")
                     
         elif dados is not None and len(dados) == 0:
             print("⚠️  O arquivo foi lido mas não contém dados válidos.")
@@ -262,7 +258,7 @@ def executar_automacao_procedimentos(caminho_arquivo):
         print("📖 Lendo dados do arquivo...")
         dados = procedimentos_read(caminho_arquivo)
         
-        if dados and len(dados) > 0:
+        if dados is not None and len(dados) > 0:
             print(f"📊 {len(dados)} registros encontrados no arquivo.")
             
             # Define o caminho da planilha de destino
@@ -270,24 +266,19 @@ def executar_automacao_procedimentos(caminho_arquivo):
             
             print(f"💾 Salvando dados em: {caminho_destino}")
             
-            # Captura a saída da função append para verificar duplicatas
-            import io
-            import contextlib
-            
-            output_buffer = io.StringIO()
-            with contextlib.redirect_stdout(output_buffer):
-                procedimentos_append(caminho_destino, dados)
-            
-            output = output_buffer.getvalue()
+            # O append devolve o resultado da gravação; as mensagens dele ficam
+            # guardadas para os detalhes das duplicatas
+            mensagens = []
+            resultado = procedimentos_append(caminho_destino, dados, origem=caminho_arquivo, log=mensagens.append)
             
             # Verifica se houve duplicatas
-            if "já existentes" in output or "duplicações" in output:
+            if resultado['status'] == 'duplicado':
                 print("⚠️  ATENÇÃO: Foram encontrados dados duplicados!")
-                print("📋 Detalhes:", output.strip())
+                print("📋 Detalhes:", "\n".join(mensagens))
             else:
                 print("✅ Automação de procedimentos concluída com sucesso!")
-                if "adicionados com sucesso" in output:
-                    print("📈 Novos dados foram adicionados à planilha.")
+                if resultado['linhas']:
+                    print(f"📈 {resultado['linhas']} novos registros foram adicionados à planilha.")
                     
         elif dados is not None and len(dados) == 0:
             print("⚠️  O arquivo foi lido mas não contém dados válidos.")
@@ -328,6 +319,40 @@ def executar_automacao_procedimentos(caminho_arquivo):
             print(f"📋 Detalhes: {str(e)}")
             print("💡 Verifique se o arquivo tem o formato correto para procedimentos.")
 
+def executar_desfazer_ingestao():
+    """Lista as ingestões de uma base e retira dela as linhas da ingestão escolhida"""
+    print("\n↩️  DESFAZER UMA INGESTÃO:")
+    print("-" * 30)
+    tipos = list(TIPOS_RELATORIO)
+    for numero, tipo in enumerate(tipos, start=1):
+        print(f"{numero}  {TIPOS_RELATORIO[tipo]['rotulo']}")
+    escolha = input("\n📊 Tipo de relatório da base: ").strip()
+    if not escolha.isdigit() or not 1 <= int(escolha) <= len(tipos):
+        print("❌ Opção inválida!")
+        return
+    tipo = tipos[int(escolha) - 1]
+
+    ingestoes = listar_ingestoes(tipo)
+    if not ingestoes:
+        print("⚠️  Nenhuma ingestão registrada nesta base.")
+        return
+    print(f"\n📋 Ingestões da base de {TIPOS_RELATORIO[tipo]['rotulo'].lower()}:")
+    for entrada in ingestoes:
+        situacao = f" (desfeita em {entrada['desfeita_em']})" if entrada.get('desfeita_em') else ""
+        print(
+            f"   {entrada['ingestao']:>4}  {entrada['registrado_em']}  "
+            f"{os.path.basename(entrada['arquivo'])}  {entrada['linhas']} registro(s){situacao}"
+        )
+    numero = input("\n🔢 Número da ingestão a desfazer: ").strip()
+    if not numero.isdigit() or int(numero) not in [entrada['ingestao'] for entrada in ingestoes]:
+        print("❌ Ingestão não encontrada!")
+        return
+    confirmar = input(f"🤔 Retirar da base as linhas da ingestão {numero}? (s/n): ").strip().lower()
+    if confirmar not in ['s', 'sim', 'y', 'yes']:
+        print("🚫 Operação cancelada pelo usuário.")
+        return
+    desfazer_ingestao(tipo, int(numero))
+
 def aguardar_enter():
     """Aguarda o usuário pressionar Enter para continuar"""
     input("\n⏸️  Pressione Enter para continuar...")
@@ -396,12 +421,16 @@ def main():
                 
                 aguardar_enter()
             
+            elif opcao == "4":
+                executar_desfazer_ingestao()
+                aguardar_enter()
+            
             elif opcao == "9":
                 exibir_ajuda_erros()
                 aguardar_enter()
             
             else:
-                print("❌ Opção inválida! Digite apenas 0, 1, 2, 3 ou 9.")
+                print("❌ Opção inválida! Digite apenas 0, 1, 2, 3, 4 ou 9.")
                 aguardar_enter()
                 
         except KeyboardInterrupt: